@@ -5,14 +5,16 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 from extensions import db
 from database.database import DATABASE_URL  
-from database.database_erp import ERP_DATABASE_URL
+from database.erp import ERP_DATABASE_URL
 import models.models as models
+from services.serializacion.json_rapido import JSONRapido
 
 
 load_dotenv()
 
 def create_app():
     app = Flask(__name__)
+    app.json = JSONRapido(app)  # orjson si está instalado; Decimal/fechas sin convertidores por endpoint
     app.config["SECRET_KEY"] = (
         os.getenv("SECRET_KEY")        
         or os.getenv("JWT_SECRET_KEY")       
@@ -21,6 +23,10 @@ def create_app():
     app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
     app.config["ERP_DATABASE_URL"] = ERP_DATABASE_URL
     app.config["COSTOS_SCHEMA"] = "consultas_cgo_ext" 
+    app.config["DASHBOARD_MODO"] = os.getenv("DASHBOARD_MODO", "python")  # "python" | "sql" | "rollup"
+    app.config["TFUERA_MOTOR"] = os.getenv("TFUERA_MOTOR", "sql")  # "sql" | "memoria"
+    # /endpoints/home/json, /compresion y /sesiones (gastan CPU y conexiones): apagados por defecto
+    app.config["DIAGNOSTICO_BENCHMARKS"] = os.getenv("DIAGNOSTICO_BENCHMARKS", "false").lower() in ("1", "true", "yes")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 
@@ -46,6 +52,7 @@ def create_app():
         from endpoints.query.proxmtto.proxmtto import proxmtto_bp 
         from endpoints.query.tiempofuera.tiempofuera import tfuera_bp
         from endpoints.query.actualizar.actualizar import actualizar_api
+        from endpoints.exports import exports_api
 
         app.register_blueprint(erp_query_api, url_prefix="/erp")
         app.register_blueprint(auth_web, url_prefix="") 
@@ -56,6 +63,16 @@ def create_app():
         app.register_blueprint(proxmtto_bp)
         app.register_blueprint(tfuera_bp)
         app.register_blueprint(actualizar_api)
+        app.register_blueprint(exports_api, url_prefix="/exports")
+
+        # after_request corre en orden inverso: la compresión (registrada antes) va al final
+        from services.compresion import compresion
+        compresion.iniciar(app)
+        from services.cache import etag
+        etag.iniciar(app)
+
+        from services.catalogo import catalogo
+        catalogo.iniciar(app)
 
         
     return app
@@ -24,6 +24,21 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# Lecturas: pool propio con las conexiones siempre en AUTOCOMMIT (sin BEGIN/COMMIT/
+# ROLLBACK alrededor de cada consulta). Solo para endpoints que no escriben.
+# No comparte el pool de `engine`: cambiar autocommit en cada checkout/checkin
+# hace que psycopg2 envíe un SET default_transaction_isolation extra por petición
+# (medido con /endpoints/home/sesiones).
+engine_lectura = create_engine(
+    DATABASE_URL,
+    isolation_level="AUTOCOMMIT",
+    pool_pre_ping=True,
+    pool_size=int(os.getenv("DB_POOL_LECTURA", "5")),
+    max_overflow=int(os.getenv("DB_POOL_LECTURA_OVERFLOW", "10")),
+    future=True,
+)
+SessionLectura = sessionmaker(bind=engine_lectura, autoflush=False)
+
 def get_db():
 
     db = SessionLocal()
@@ -35,3 +50,23 @@ def get_db():
         raise
     finally:
         db.close()
+
+def get_db_lectura():
+    """Sesión de solo lectura en autocommit: no hay transacción que confirmar."""
+    db = SessionLectura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_db_stream():
+    """
+    Sesión para lecturas en streaming (stream_results / yield_per). Los cursores
+    del lado del servidor de psycopg2 necesitan transacción, por eso no usa el
+    engine en autocommit; la transacción se descarta al cerrar.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
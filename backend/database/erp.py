@@ -0,0 +1,129 @@
+# backend/database/erp.py
+"""
+Acceso único al ERP (psycopg2 + pools con nombre por tipo de carga).
+
+- "interactivo": endpoints de consulta (solo lectura, timeout corto).
+- "reportes":    consultas pesadas / cargas en memoria (solo lectura, timeout largo).
+- "sync":        extracción del proceso de actualización (solo lectura, cursores tupla).
+
+Cada pool abre sus conexiones con su propio statement_timeout y
+application_name (visibles en pg_stat_activity del ERP). Los pools de lectura
+trabajan en autocommit: sin BEGIN/COMMIT alrededor de cada consulta.
+"""
+import os
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import uuid
+
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from database.pool import PoolPG, registrar
+
+# Carga .env explícitamente desde /backend
+ENV_PATH = Path(__file__).resolve().parents[1] / ".env"
+load_dotenv(dotenv_path=ENV_PATH)
+
+ERP_DB_HOST = os.getenv("ERP_DB_HOST")
+ERP_DB_PORT = os.getenv("ERP_DB_PORT", "5432")
+ERP_DB_NAME = os.getenv("ERP_DB_NAME")
+ERP_DB_USER = os.getenv("ERP_DB_USER")
+ERP_DB_PASSWORD = os.getenv("ERP_DB_PASSWORD")
+ERP_DB_SSLMODE = os.getenv("ERP_DB_SSLMODE", "disable")
+
+missing = [k for k,v in {
+    "ERP_DB_HOST": ERP_DB_HOST,
+    "ERP_DB_NAME": ERP_DB_NAME,
+    "ERP_DB_USER": ERP_DB_USER,
+    "ERP_DB_PASSWORD": ERP_DB_PASSWORD,
+}.items() if not v]
+if missing:
+    raise RuntimeError(f"Faltan variables ERP en .env: {', '.join(missing)}")
+
+ERP_DATABASE_URL = (
+    f"postgresql+psycopg2://{ERP_DB_USER}:{ERP_DB_PASSWORD}"
+    f"@{ERP_DB_HOST}:{ERP_DB_PORT}/{ERP_DB_NAME}?sslmode={ERP_DB_SSLMODE}"
+)
+
+ERP_DSN = (
+    f"dbname={ERP_DB_NAME} user={ERP_DB_USER} password={ERP_DB_PASSWORD} "
+    f"host={ERP_DB_HOST} port={ERP_DB_PORT} sslmode={ERP_DB_SSLMODE}"
+)
+
+
+def _cfg(nombre: str, clave: str, default: str) -> str:
+    # p.ej. ERP_POOL_REPORTES_MAX
+    return os.getenv(f"ERP_POOL_{nombre.upper()}_{clave}", default)
+
+
+# nombre -> (min, max, statement_timeout ms, cursor por defecto, autocommit)
+POOLS = {
+    "interactivo": (1, 10, 60_000, psycopg2.extras.RealDictCursor, True),
+    "reportes":    (0, 4, 300_000, psycopg2.extras.RealDictCursor, True),
+    "sync":        (0, 2, 600_000, None, False),
+}
+
+_pools: dict[str, PoolPG] = {}
+_lock = threading.Lock()
+
+
+def pool(nombre: str = "interactivo") -> PoolPG:
+    p = _pools.get(nombre)
+    if p is not None:
+        return p
+    if nombre not in POOLS:
+        raise KeyError(f"Pool ERP desconocido: {nombre}")
+    with _lock:
+        p = _pools.get(nombre)
+        if p is None:
+            minconn, maxconn, timeout_ms, cursor_factory, autocommit = POOLS[nombre]
+            timeout_ms = int(_cfg(nombre, "STATEMENT_TIMEOUT_MS", str(timeout_ms)))
+            kwargs = {
+                "application_name": f"caps2-{nombre}",
+                "options": f"-c statement_timeout={timeout_ms} -c default_transaction_read_only=on",
+            }
+            if cursor_factory is not None:
+                kwargs["cursor_factory"] = cursor_factory
+            p = _pools[nombre] = registrar(PoolPG(
+                f"erp.{nombre}", ERP_DSN,
+                minconn=int(_cfg(nombre, "MIN", str(minconn))),
+                maxconn=int(_cfg(nombre, "MAX", str(maxconn))),
+                timeout_seg=float(_cfg(nombre, "TIMEOUT", "15")),
+                idle_check_seg=float(_cfg(nombre, "IDLE_CHECK", "30")),
+                max_vida_seg=float(_cfg(nombre, "MAX_VIDA", "1800")),
+                autocommit=autocommit,
+                **kwargs,
+            ))
+        return p
+
+
+@contextmanager
+def conexion(nombre: str = "interactivo"):
+    """
+    with conexion("reportes") as conn: ...
+    La conexión vuelve al pool al salir. En los pools autocommit usar
+    `with conn.cursor() as cur:` (`with conn` abriría una transacción en psycopg2 >= 2.9).
+    """
+    with pool(nombre).conexion() as conn:
+        yield conn
+
+
+def filas_servidor(sql: str, params: dict | None = None, nombre: str = "reportes", lote: int = 2000):
+    """
+    Generador de filas (dicts) con un cursor con nombre (server-side): el ERP
+    entrega de a `lote` filas y la memoria no crece con el resultado. La conexión
+    queda tomada mientras se consume el generador.
+    """
+    with conexion(nombre) as conn:
+        autocommit = conn.autocommit
+        conn.autocommit = False  # los cursores con nombre requieren transacción
+        try:
+            with conn.cursor(name=f"exp_{uuid.uuid4().hex[:12]}", cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.itersize = lote
+                cur.execute(sql, params or {})
+                for fila in cur:
+                    yield fila
+        finally:
+            conn.rollback()
+            conn.autocommit = autocommit
@@ -0,0 +1,242 @@
+# backend/database/pool.py
+"""
+Pool de conexiones psycopg2 acotado y thread-safe.
+
+- min/max de conexiones; al llegar al máximo, el checkout espera hasta `timeout_seg`.
+- Conexiones ociosas más de `idle_check_seg` se validan con SELECT 1 antes de entregarse.
+- Conexiones con más de `max_vida_seg` (o rotas) se reciclan.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+
+# Estado asociado a cada conexión abierta por un pool (p.ej. sentencias preparadas).
+# Vive lo mismo que la conexión: se crea al conectar y se borra al descartarla.
+_extras: dict[int, dict] = {}
+_extras_lock = threading.Lock()
+
+
+def extras(conn) -> dict | None:
+    """Dict por conexión; None si la conexión no salió de un PoolPG."""
+    with _extras_lock:
+        return _extras.get(id(conn))
+
+
+class PoolAgotado(RuntimeError):
+    """No se obtuvo conexión dentro del timeout de checkout."""
+
+
+class PoolPG:
+    def __init__(self, nombre: str, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 timeout_seg: float = 15.0, idle_check_seg: float = 30.0, max_vida_seg: float = 1800.0,
+                 autocommit: bool = False, **connect_kwargs):
+        self.nombre = nombre
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout_seg = timeout_seg
+        self.idle_check_seg = idle_check_seg
+        self.max_vida_seg = max_vida_seg
+        self.autocommit = autocommit
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._libres: deque = deque()   # (conn, creada_ts, devuelta_ts)
+        self._creadas: dict[int, float] = {}  # id(conn) -> creada_ts (libres + en uso)
+        self._en_uso = 0
+        self._reservadas = 0
+        self._esperando = 0
+        self._iniciado = False
+
+        self.creadas = 0
+        self.recicladas = 0
+        self.checkouts = 0
+        self.timeouts = 0
+
+    # ---- ciclo de vida de conexiones ----
+    def _conectar(self, reservada: bool = False):
+        try:
+            conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        except Exception:
+            if reservada:
+                with self._cond:
+                    self._reservadas -= 1
+            raise
+        conn.autocommit = self.autocommit
+        with self._cond:
+            if reservada:
+                self._reservadas -= 1
+            self._creadas[id(conn)] = time.time()
+            self.creadas += 1
+        with _extras_lock:
+            _extras[id(conn)] = {}
+        return conn
+
+    def _descartar(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with _extras_lock:
+            _extras.pop(id(conn), None)
+        with self._cond:
+            self._creadas.pop(id(conn), None)
+            self.recicladas += 1
+            self._cond.notify()
+
+    def _sana(self, conn, creada: float, devuelta: float) -> bool:
+        if conn.closed:
+            return False
+        ahora = time.time()
+        if ahora - creada > self.max_vida_seg:
+            return False
+        if ahora - devuelta > self.idle_check_seg:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _iniciar(self) -> None:
+        # Precarga el mínimo una sola vez (fuera del lock, cada conexión es un handshake)
+        with self._cond:
+            if self._iniciado:
+                return
+            self._iniciado = True
+            faltan = max(self.minconn - self._abiertas(), 0)
+        for _ in range(faltan):
+            try:
+                conn = self._conectar()
+            except Exception:
+                break
+            with self._cond:
+                self._libres.append((conn, self._creadas[id(conn)], time.time()))
+                self._cond.notify()
+
+    # ---- checkout / checkin ----
+    def _abiertas(self) -> int:
+        return len(self._creadas) + self._reservadas
+
+    def obtener(self):
+        if not self._iniciado:
+            self._iniciar()
+        limite = time.time() + self.timeout_seg
+        while True:
+            with self._cond:
+                while not self._libres and self._abiertas() >= self.maxconn:
+                    restante = limite - time.time()
+                    if restante <= 0:
+                        self.timeouts += 1
+                        raise PoolAgotado(
+                            f"Pool '{self.nombre}' sin conexiones libres tras {self.timeout_seg}s "
+                            f"({self._en_uso}/{self.maxconn} en uso)"
+                        )
+                    self._esperando += 1
+                    try:
+                        self._cond.wait(restante)
+                    finally:
+                        self._esperando -= 1
+                if self._libres:
+                    conn, creada, devuelta = self._libres.pop()  # LIFO: la más recién usada
+                else:
+                    conn = None
+                    self._reservadas += 1  # cupo reservado; se conecta fuera del lock
+                self._en_uso += 1
+
+            if conn is None:
+                try:
+                    conn = self._conectar(reservada=True)
+                except Exception:
+                    with self._cond:
+                        self._en_uso -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._sana(conn, creada, devuelta):
+                with self._cond:
+                    self._en_uso -= 1
+                self._descartar(conn)
+                continue
+
+            with self._cond:
+                self.checkouts += 1
+            return conn
+
+    def devolver(self, conn, descartar: bool = False) -> None:
+        with self._cond:
+            self._en_uso -= 1
+        if not descartar and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+        else:
+            descartar = True
+        if descartar:
+            self._descartar(conn)
+            return
+        with self._cond:
+            self._libres.append((conn, self._creadas.get(id(conn), time.time()), time.time()))
+            self._cond.notify()
+
+    @contextmanager
+    def conexion(self):
+        """with pool.conexion() as conn: ... (se devuelve al pool al salir)."""
+        conn = self.obtener()
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            self.devolver(conn, descartar=True)
+            raise
+        except BaseException:
+            self.devolver(conn)
+            raise
+        else:
+            self.devolver(conn)
+
+    def cerrar(self) -> None:
+        with self._cond:
+            libres, self._libres = list(self._libres), deque()
+        for conn, _, _ in libres:
+            self._descartar(conn)
+
+    def estadisticas(self) -> dict:
+        with self._cond:
+            return {
+                "nombre": self.nombre,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "abiertas": self._abiertas(),
+                "libres": len(self._libres),
+                "en_uso": self._en_uso,
+                "esperando": self._esperando,
+                "creadas": self.creadas,
+                "recicladas": self.recicladas,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+            }
+
+
+# ---- registro de pools ----
+_pools: dict[str, PoolPG] = {}
+_pools_lock = threading.Lock()
+
+
+def registrar(pool: PoolPG) -> PoolPG:
+    """Agrega el pool al registro (diagnóstico)."""
+    with _pools_lock:
+        _pools[pool.nombre] = pool
+    return pool
+
+
+def pools() -> list[PoolPG]:
+    with _pools_lock:
+        return list(_pools.values())
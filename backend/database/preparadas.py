@@ -0,0 +1,112 @@
+# backend/database/preparadas.py
+"""
+Sentencias preparadas del lado del servidor (PREPARE / EXECUTE) sobre las
+conexiones de los pools ERP.
+
+Cada SQL (estilo psycopg2, %(nombre)s) se compila una sola vez en proceso:
+los placeholders pasan a $1..$n y se fija el orden de los parámetros. En cada
+conexión la sentencia se prepara la primera vez que se usa; las siguientes
+ejecuciones mandan solo `EXECUTE nombre(...)` y el ERP se salta el parseo y
+el análisis (y, tras unas ejecuciones, puede reutilizar un plan genérico).
+
+No sirve para cursores con nombre (DECLARE ... CURSOR no acepta EXECUTE): las
+exportaciones siguen usando la SQL en texto.
+"""
+from __future__ import annotations
+import hashlib
+import re
+import threading
+
+import psycopg2.errors
+
+from database.pool import extras
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%%")
+
+_registro: dict[str, "Preparada"] = {}
+_registro_lock = threading.Lock()
+
+
+class Preparada:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.nombre = "caps2_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+        self.orden: list[str] = []
+
+        def reemplazar(m):
+            if m.group(0) == "%%":
+                return "%"
+            if m.group(1) not in self.orden:
+                self.orden.append(m.group(1))
+            return f"${self.orden.index(m.group(1)) + 1}"
+
+        cuerpo = _PLACEHOLDER.sub(reemplazar, sql).strip().rstrip(";")
+        self.sql_prepare = f"PREPARE {self.nombre} AS {cuerpo}"
+        placeholders = ", ".join(["%s"] * len(self.orden))
+        self.sql_execute = f"EXECUTE {self.nombre} ({placeholders})" if self.orden else f"EXECUTE {self.nombre}"
+
+        self.prepares = 0
+        self.ejecuciones = 0
+        self._lock = threading.Lock()
+
+    def valores(self, params: dict | None) -> list:
+        params = params or {}
+        return [params[n] for n in self.orden]
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "nombre": self.nombre,
+                "parametros": list(self.orden),
+                "bytes_sql": len(self.sql),
+                "prepares": self.prepares,
+                "ejecuciones": self.ejecuciones,
+                # ejecuciones que no mandaron el texto completo ni se volvieron a parsear
+                "reutilizadas": self.ejecuciones - self.prepares,
+            }
+
+
+def preparar(sql: str) -> Preparada:
+    """Preparada (memoizada por texto) para `sql`; llamarla al importar para compilar de antemano."""
+    p = _registro.get(sql)
+    if p is None:
+        with _registro_lock:
+            p = _registro.get(sql)
+            if p is None:
+                p = _registro[sql] = Preparada(sql)
+    return p
+
+
+def asegurar(cur, p: Preparada) -> None:
+    """PREPARE en la conexión del cursor si todavía no se hizo (sin ejecutar)."""
+    hechas: set = extras(cur.connection).setdefault("preparadas", set())
+    if p.nombre not in hechas:
+        cur.execute(p.sql_prepare)
+        hechas.add(p.nombre)
+        with p._lock:
+            p.prepares += 1
+
+
+def ejecutar(cur, sql: str | Preparada, params: dict | None = None) -> None:
+    """cur.execute() vía PREPARE/EXECUTE en la conexión del cursor (que debe ser de un pool en autocommit)."""
+    p = sql if isinstance(sql, Preparada) else preparar(sql)
+    estado = extras(cur.connection)
+    if estado is None:
+        cur.execute(p.sql, params)  # conexión fuera de los pools: sin preparar
+        return
+    asegurar(cur, p)
+    try:
+        cur.execute(p.sql_execute, p.valores(params))
+    except psycopg2.errors.InvalidSqlStatementName:
+        # la sesión perdió la sentencia (p.ej. DISCARD ALL): se vuelve a preparar una vez
+        cur.execute(p.sql_prepare)
+        with p._lock:
+            p.prepares += 1
+        cur.execute(p.sql_execute, p.valores(params))
+    with p._lock:
+        p.ejecuciones += 1
+
+
+def preparadas() -> list[Preparada]:
+    with _registro_lock:
+        return list(_registro.values())
@@ -1,28 +1,104 @@
+import os
+from typing import Iterable, Mapping
+
 from flask import Blueprint, jsonify, request
-from sqlalchemy import text
-from database.database_erp import get_erp_db
-from decimal import Decimal
-from datetime import datetime, date
+from database import erp, preparadas
+from services.cache.cache import FALTA, CacheTTL
+from services.cache.singleflight import SingleFlight
+from services.exportar.trabajos import registrar_fuente
+from services.serializacion import columnar
+from services.proyeccion import proyeccion
 
 erp_query_api = Blueprint('erp_query_api', __name__)
 
-def _jsonify_row(row: dict) -> dict:
-    out = {}
-    for k, v in row.items():
-        if isinstance(v, Decimal):
-            out[k] = float(v)
-        elif isinstance(v, (datetime, date)):
-            out[k] = v.isoformat()
-        else:
-            out[k] = v
-    return out
+_vuelo = SingleFlight("erp_query")
 
-@erp_query_api.route('/extraer_programa_otm', methods=['GET'])
-def extraer_programa_otm():
-    id_programa = request.args.get('id', type=int) or 294
+MAX_IDS_LOTE = int(os.getenv("ERP_MAX_IDS_LOTE", "500"))
+
+# Filas por id_programa_otm; se invalida sola al terminar cada sync (registro de cachés)
+_cache_programas = CacheTTL(
+    "programa_otm",
+    ttl_seg=float(os.getenv("ERP_PROGRAMA_CACHE_TTL", "600")),
+    max_entradas=int(os.getenv("ERP_PROGRAMA_CACHE_MAX", "2000")),
+    max_bytes=int(os.getenv("ERP_PROGRAMA_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+
+# Columnas de extraer_programa_otm (expresión SQL, alias): el alias es el nombre
+# en la respuesta y la lista blanca de ?fields=.
+COLUMNAS_PROGRAMA_OTM = (
+    ("pro.id_programa_otm", "id_programa_otm"),
+    ("pro.equipo", "equipo"),
+    ("pro.codigo_tarea", "codigo_tarea"),
+    ("pro.horometro_referencia", "horometro_referencia"),
+    ("pro.descripcion", "descripcion"),
+    ("pro.disponibilidad_insumos", "disponibilidad_insumos"),
+    ("pro.instrucciones_especiales", "instrucciones_especiales"),
+    ("pro.fecha_limite", "fecha_limite"),
+    ("pro.cantidad_reprogramaciones", "cantidad_reprogramaciones_programa"),
+    ("pro.usuario_programacion", "usuario_programacion"),
+    ("pro.estado_programa", "estado_programa"),
+    ("pro.otm", "otm"),
+    ("pro.nombre_prioridad_otm", "nombre_prioridad_otm"),
+    ("pro.fecha_ejecucion_otm", "fecha_ejecucion_otm"),
+    ("pro.horometro_planificacion", "horometro_planificacion"),
+    ("pro.ultimo_horometro", "ultimo_horometro"),
+    ("pro.fecha_ultimo_horometro", "fecha_ultimo_horometro"),
+    ("pro.usuario_ultimo_horometro", "usuario_ultimo_horometro"),
+    ("pro.fecha_log", "fecha_log"),
+    ("pro.fecha_hora_inicio", "fecha_hora_inicio"),
+    ("pro.fecha_hora_fin", "fecha_hora_fin"),
+
+    ("eq.equipo_codigo", "equipo_codigo"),
+    ("eq.tipo_equipo", "tipo_equipo"),
+    ("eq.marca", "marca"),
+    ("eq.modelo", "modelo"),
+
+    ("rotm.id_otm", "id_otm"),
+    ("rotm.fecha_inicio", "fecha_inicio"),
+    ("rotm.anio", "anio"),
+    ("rotm.nombre_faena", "nombre_faena"),
+    ("rotm.codigo_interno", "codigo_interno"),
+    ("rotm.actividad", "actividad"),
+    ("rotm.tipo_actividad", "tipo_actividad"),
+    ("rotm.estado_actividad", "estado_actividad"),
+    ("rotm.motivo_no_cumplimiento", "motivo_no_cumplimiento"),
+    ("rotm.numero_otm", "numero_otm"),
+    ("rotm.fecha_original", "fecha_original"),
+    ("rotm.cantidad_reprogramaciones", "cantidad_reprogramaciones_otm"),
+
+    ("otm.numero_solicitud", "numero_solicitud"),
+    ("otm.fecha_solicitud", "fecha_solicitud"),
+    ("otm.ot", "ot"),
+    ("otm.tipo_solicitud", "tipo_solicitud"),
+    ("otm.equipo", "equipo_mantencion"),
+    ("otm.solicitante", "solicitante"),
+    ("otm.estado_solicitud", "estado_solicitud"),
+    ("otm.faena", "faena"),
+    ("otm.cuenta_contable", "cuenta_contable"),
+    ("otm.centro_costos", "centro_costos"),
+    ("otm.proveedor_seleccionado", "proveedor_seleccionado"),
+    ("otm.fecha_cotizacion", "fecha_cotizacion"),
+    ("otm.condicion_pago", "condicion_pago"),
+    ("otm.monto_neto", "monto_neto"),
+    ("otm.valor_total", "valor_total"),
+    ("otm.plazo_entrega", "plazo_entrega"),
+    ("otm.motivo_compra", "motivo_compra"),
+    ("otm.orden_compra", "orden_compra"),
+    ("otm.fecha_orden_compra", "fecha_orden_compra"),
+    ("otm.fecha_emision_factura", "fecha_emision_factura"),
+    ("otm.monto_total_factura", "monto_total_factura"),
+    ("otm.item_material_o_servicio", "item_material_o_servicio"),
+    ("otm.item_cantidad", "item_cantidad"),
+    ("otm.item_unidad", "item_unidad"),
+    ("otm.item_monto_total", "item_monto_total"),
+    ("otm.estado_recepcion", "estado_recepcion"),
+    ("otm.fecha_aceptado", "fecha_aceptado"),
+    ("otm.fecha_aceptado_gerencia", "fecha_aceptado_gerencia"),
+    ("otm.validador", "validador"),
+    ("otm.validador_gerencia", "validador_gerencia"),
+)
 
-    db = next(get_erp_db())
-    query = text("""
+_CTE_PROGRAMA_OTM = """
 WITH programa AS (
     SELECT
         id_programa_otm,
@@ -98,7 +174,11 @@ ot_mantenimiento AS (
         validador,
         validador_gerencia
     FROM CONSULTAS_CGO_EXT.V_SOL_ITEMS_OTM_OTR
-),
+)"""
+
+# CTE de las nueve vistas de registro diario. Va siempre, aunque ?fields= no pida
+# columnas eq.*: un código repetido en varias vistas multiplica las filas.
+_CTE_EQUIPO = """,
 equipo AS (
     SELECT DISTINCT
         equipo_codigo,
@@ -163,93 +243,143 @@ equipo AS (
         SPLIT_PART(equipo, ' - ', 3) AS modelo
     FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_SPOT_EXPORT
 )
-SELECT
-    pro.id_programa_otm,
-    pro.equipo,
-    pro.codigo_tarea,
-    pro.horometro_referencia,
-    pro.descripcion,
-    pro.disponibilidad_insumos,
-    pro.instrucciones_especiales,
-    pro.fecha_limite,
-    pro.cantidad_reprogramaciones AS cantidad_reprogramaciones_programa,
-    pro.usuario_programacion,
-    pro.estado_programa,
-    pro.otm,
-    pro.nombre_prioridad_otm,
-    pro.fecha_ejecucion_otm,
-    pro.horometro_planificacion,
-    pro.ultimo_horometro,
-    pro.fecha_ultimo_horometro,
-    pro.usuario_ultimo_horometro,
-    pro.fecha_log,
-    pro.fecha_hora_inicio,
-    pro.fecha_hora_fin,
-
-    eq.equipo_codigo,
-    eq.tipo_equipo,
-    eq.marca,
-    eq.modelo,
-
-    rotm.id_otm,
-    rotm.fecha_inicio,
-    rotm.anio,
-    rotm.nombre_faena,
-    rotm.codigo_interno,
-    rotm.actividad,
-    rotm.tipo_actividad,
-    rotm.estado_actividad,
-    rotm.motivo_no_cumplimiento,
-    rotm.numero_otm,
-    rotm.fecha_original,
-    rotm.cantidad_reprogramaciones AS cantidad_reprogramaciones_otm,
-
-    otm.numero_solicitud,
-    otm.fecha_solicitud,
-    otm.ot,
-    otm.tipo_solicitud,
-    otm.equipo AS equipo_mantencion,
-    otm.solicitante,
-    otm.estado_solicitud,
-    otm.faena,
-    otm.cuenta_contable,
-    otm.centro_costos,
-    otm.proveedor_seleccionado,
-    otm.fecha_cotizacion,
-    otm.condicion_pago,
-    otm.monto_neto,
-    otm.valor_total,
-    otm.plazo_entrega,
-    otm.motivo_compra,
-    otm.orden_compra,
-    otm.fecha_orden_compra,
-    otm.fecha_emision_factura,
-    otm.monto_total_factura,
-    otm.item_material_o_servicio,
-    otm.item_cantidad,
-    otm.item_unidad,
-    otm.item_monto_total,
-    otm.estado_recepcion,
-    otm.fecha_aceptado,
-    otm.fecha_aceptado_gerencia,
-    otm.validador,
-    otm.validador_gerencia
-FROM programa pro
-LEFT JOIN equipo eq
-    ON eq.equipo_codigo = pro.equipo
-LEFT JOIN reg_otm rotm
+"""
+
+
+def sql_programa_otm(campos: tuple[str, ...] | None = None) -> str:
+    """
+    Consulta base (sin WHERE); `campos` es la proyección de ?fields= (None = todas).
+    Los JOIN van siempre: la proyección solo quita columnas, no cambia las filas.
+    """
+    sql = _CTE_PROGRAMA_OTM + _CTE_EQUIPO
+    sql += "SELECT\n    " + proyeccion.select(COLUMNAS_PROGRAMA_OTM, campos) + "\n"
+    sql += "FROM programa pro\n"
+    sql += "LEFT JOIN equipo eq\n    ON eq.equipo_codigo = pro.equipo\n"
+    return sql + """LEFT JOIN reg_otm rotm
     ON pro.otm = rotm.numero_otm
 LEFT JOIN ot_mantenimiento otm
     ON rotm.numero_otm = otm.ot
-WHERE pro.id_programa_otm = :id_programa
-""")
+"""
+
+
+# Consulta base de extraer_programa_otm (sin WHERE): se completa con el filtro de cada uso.
+SQL_PROGRAMA_OTM = sql_programa_otm()
+
+
+def filas_export(params: Mapping) -> Iterable[dict]:
+    """Dataset completo (todos los programas) con cursor del lado del servidor; `id` opcional."""
+    id_programa = params.get("id")
+    if id_programa not in (None, ""):
+        try:
+            id_programa = int(id_programa)
+        except (TypeError, ValueError):
+            raise ValueError(f"Parámetro 'id' inválido: {id_programa!r}")
+        sql = SQL_PROGRAMA_OTM + "WHERE pro.id_programa_otm = %(id_programa)s\n"
+        return erp.filas_servidor(sql, {"id_programa": id_programa}, "reportes")
+    return erp.filas_servidor(SQL_PROGRAMA_OTM + "ORDER BY pro.id_programa_otm\n", {}, "reportes")
+
+
+registrar_fuente("programa_otm", filas_export)
+
+
+_WHERE_IDS = "WHERE pro.id_programa_otm = ANY(%(ids)s)\nORDER BY pro.id_programa_otm\n"
+
+# Sentencia preparada por conexión: el ERP no vuelve a parsear el CTE en cada consulta
+_PREP_IDS = preparadas.preparar(SQL_PROGRAMA_OTM + _WHERE_IDS)
+
+
+def _ids_solicitados() -> list[int] | None:
+    """
+    Ids pedidos en lote: ?ids=1,2,3, ?ids=1&ids=2 o body JSON {"ids": [...]} (POST).
+    None si no se pidió lote (se usa ?id= como antes). ValueError si hay ids inválidos.
+    """
+    crudos: list = []
+    for valor in request.args.getlist("ids"):
+        crudos.extend(valor.split(","))
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        ids_body = body.get("ids") or []
+        if not isinstance(ids_body, list):
+            raise ValueError("'ids' debe ser una lista.")
+        crudos.extend(ids_body)
+    crudos = [c.strip() if isinstance(c, str) else c for c in crudos]
+    crudos = [c for c in crudos if c not in ("", None)]
+    if not crudos:
+        return None
+    try:
+        ids = sorted({int(c) for c in crudos})
+    except (TypeError, ValueError):
+        raise ValueError("Todos los 'ids' deben ser enteros.")
+    if len(ids) > MAX_IDS_LOTE:
+        raise ValueError(f"Máximo {MAX_IDS_LOTE} ids por consulta (se pidieron {len(ids)}).")
+    return ids
+
+
+def _consultar_ids(ids: list[int], campos: tuple[str, ...] | None = None) -> dict[int, list]:
+    """Una sola ejecución para todos los ids; filas agrupadas por id_programa_otm."""
+    agrupadas: dict[int, list] = {i: [] for i in ids}
+    with erp.conexion("interactivo") as conn:
+        with conn.cursor() as cur:
+            if campos is None:
+                preparadas.ejecutar(cur, _PREP_IDS, {"ids": list(ids)})
+            else:
+                # proyecciones (?fields=): combinaciones abiertas, no se preparan por conexión
+                cur.execute(sql_programa_otm(campos) + _WHERE_IDS, {"ids": list(ids)})
+            for r in cur.fetchall():
+                agrupadas.setdefault(r["id_programa_otm"], []).append(r)
+    return agrupadas
+
+
+def _programas(ids: list[int], campos: tuple[str, ...] | None = None) -> dict[int, list]:
+    """
+    Read-through por id de programa (y proyección): los ids en caché no van al ERP
+    y los que faltan se piden en una sola consulta (compartida entre peticiones
+    concurrentes).
+    """
+    clave = (lambda i: i) if campos is None else (lambda i: (i, campos))
+    resultado: dict[int, list] = {}
+    faltan = []
+    for i in ids:
+        filas = _cache_programas.obtener(clave(i))
+        if filas is FALTA:
+            faltan.append(i)
+        else:
+            resultado[i] = filas
+    if faltan:
+        generacion = _cache_programas.generacion
+        nuevos = _vuelo.ejecutar(
+            ("programa_otm", tuple(faltan), campos), lambda: _consultar_ids(faltan, campos)
+        )
+        for i in faltan:
+            filas = nuevos.get(i, [])
+            _cache_programas.guardar(clave(i), filas, generacion)
+            resultado[i] = filas
+    return {i: resultado[i] for i in ids}
+
+
+@erp_query_api.route('/extraer_programa_otm', methods=['GET', 'POST'])
+def extraer_programa_otm():
+    try:
+        ids = _ids_solicitados()
+        # ?fields=: solo esas columnas (id_programa_otm siempre, agrupa el lote)
+        campos = proyeccion.campos(COLUMNAS_PROGRAMA_OTM, ["id_programa_otm"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if ids is not None:
+        # Lote: una consulta con = ANY(ids) en vez de N ejecuciones del CTE completo
+        try:
+            grupos = _programas(ids, campos)
+            if columnar.pedido():
+                return jsonify({str(i): columnar.desde_dicts(filas) for i, filas in grupos.items()}), 200
+            return jsonify({str(i): filas for i, filas in grupos.items()}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    id_programa = request.args.get('id', type=int) or 294
 
     try:
-        result = db.execute(query, {"id_programa": id_programa})
-        rows = result.mappings().all()
-        data = [_jsonify_row(r) for r in rows]
-        return jsonify(data), 200
+        data = _programas([id_programa], campos)[id_programa]
+        return jsonify(columnar.desde_dicts(data) if columnar.pedido() else data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        db.close()
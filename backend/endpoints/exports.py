@@ -0,0 +1,69 @@
+from flask import Blueprint, jsonify, request, send_file, url_for
+
+from services.exportar import trabajos
+
+exports_api = Blueprint("exports_api", __name__)
+
+
+def _err(msg, code=400):
+    return jsonify({"ok": False, "error": msg}), code
+
+
+def _con_links(t: trabajos.Trabajo) -> dict:
+    estado = t.estado()
+    estado["links"] = {"estado": url_for("exports_api.estado_export", id_trabajo=t.id)}
+    if t.status == "completado":
+        estado["links"]["archivo"] = url_for("exports_api.archivo_export", id_trabajo=t.id)
+    return estado
+
+
+@exports_api.post("")
+def crear_export():
+    """
+    Body JSON: {"fuente": "costos", "params": {"faena": ..., "equipo": ...}, "formato": "csv" | "parquet"}
+    Devuelve 202 con el id del trabajo; el avance se consulta en GET /exports/<id>.
+    """
+    body = request.get_json(silent=True) or {}
+    fuente = (body.get("fuente") or "").strip()
+    formato = (body.get("formato") or "csv").strip().lower()
+    params = body.get("params") or {}
+    if not fuente:
+        return _err(f"Falta 'fuente' (disponibles: {', '.join(trabajos.fuentes())}).")
+    if not isinstance(params, dict):
+        return _err("'params' debe ser un objeto.")
+    try:
+        t = trabajos.crear(fuente, params, formato)
+    except ValueError as e:
+        return _err(str(e))
+    return jsonify({"ok": True, "trabajo": _con_links(t)}), 202
+
+
+@exports_api.get("")
+def listar_exports():
+    return jsonify({
+        "ok": True,
+        "fuentes": trabajos.fuentes(),
+        "formatos": trabajos.formatos(),
+        "trabajos": [_con_links(t) for t in trabajos.listar()],
+    }), 200
+
+
+@exports_api.get("/<id_trabajo>")
+def estado_export(id_trabajo):
+    t = trabajos.obtener(id_trabajo)
+    if t is None:
+        return _err("Trabajo no encontrado (o vencido).", 404)
+    return jsonify({"ok": True, "trabajo": _con_links(t)}), 200
+
+
+@exports_api.get("/<id_trabajo>/file")
+def archivo_export(id_trabajo):
+    t = trabajos.obtener(id_trabajo)
+    if t is None:
+        return _err("Trabajo no encontrado (o vencido).", 404)
+    if t.status != "completado":
+        return _err(f"El trabajo está '{t.status}'.", 409)
+    if not t.archivo.is_file():
+        return _err("El archivo ya no está disponible.", 410)
+    mimetype = "application/gzip" if t.formato == "csv" else "application/vnd.apache.parquet"
+    return send_file(t.archivo, mimetype=mimetype, as_attachment=True, download_name=t.nombre_archivo)
@@ -4,7 +4,7 @@ import time
 import traceback
 from datetime import datetime
 from typing import Any, Dict
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify
 
 from services.actualizar.actualizar import ejecutar_proceso
 
@@ -55,12 +55,14 @@ def reportar(paso: str | None = None, progreso: int | None = None):
         data["progreso"] = max(0, min(100, int(progreso)))
     _set(**data)
 
-def _worker():
+def _worker(app):
     start = time.time()
     _set(status="ejecutando", mensaje="Proceso en curso", ultimo_inicio=_now(),
          progreso=0, paso="Inicializando", heartbeat=_now())
     try:
-        resultado = ejecutar_proceso(callback=reportar)
+        # app context para la etapa de calentamiento (config y test_client de la app)
+        with app.app_context():
+            resultado = ejecutar_proceso(callback=reportar)
         _set(status="completado", mensaje="OK", resultado=resultado, ultimo_fin=_now(),
              duracion_seg=round(time.time() - start, 3), progreso=100, paso="Finalizado")
     except Exception as e:
@@ -76,7 +78,7 @@ def iniciar_actualizacion():
             return jsonify({"ok": True, "mensaje": "Proceso ya en curso", "estado": dict(_estado)}), 202
     _en_ejecucion.set()
     _reset()
-    hilo = threading.Thread(target=_worker, daemon=True)
+    hilo = threading.Thread(target=_worker, args=(current_app._get_current_object(),), daemon=True)
     hilo.start()
     with _estado_lock:
         return jsonify({"ok": True, "mensaje": "Proceso iniciado", "estado": dict(_estado)}), 202
@@ -1,27 +1,30 @@
-from flask import Blueprint, request, jsonify, current_app
-import psycopg2
-import psycopg2.extras
+from typing import Iterable, Mapping
 
-costos_bp = Blueprint("costos_api", __name__, url_prefix="/query/costos")
+import psycopg2.extensions
+from flask import Blueprint, request, jsonify
+from database import erp, preparadas
+from services.cache.cache import con_encabezados
+from services.catalogo import catalogo
+from services.cache.singleflight import SingleFlight, clave_sql
+from services.filtros.arbol import arbol
+from services.exportar.stream import formato_valido, respuesta_stream
+from services.exportar.trabajos import registrar_fuente
+from services.paginacion import cursor as cursor_pag
+from services.serializacion import columnar
+from services.proyeccion import proyeccion
 
+costos_bp = Blueprint("costos_api", __name__, url_prefix="/query/costos")
 
-def _get_conn():
-    dsn = (
-        current_app.config.get("ERP_DATABASE_URL")
-        or current_app.config.get("PG_DSN")
-        or current_app.config.get("SQLALCHEMY_DATABASE_URI")
-    )
-    if not dsn:
-        raise RuntimeError("No hay DSN (ERP_DATABASE_URL / PG_DSN / SQLALCHEMY_DATABASE_URI) en config")
+_vuelo = SingleFlight("costos")
 
-    if dsn.startswith("postgresql+psycopg2://"):
-        dsn = dsn.replace("postgresql+psycopg2://", "postgresql://", 1)
 
-    return psycopg2.connect(dsn, cursor_factory=psycopg2.extras.RealDictCursor)
+def _get_conn():
+    """Conexión del pool ERP interactivo: `with _get_conn() as conn:` la devuelve al salir."""
+    return erp.conexion("interactivo")
 
 
-def _ok(data):
-    return jsonify({"ok": True, "data": data})
+def _ok(data, **extra):
+    return jsonify({"ok": True, "data": data, **extra})
 
 
 def _err(msg, code=400):
@@ -33,30 +36,100 @@ def _err(msg, code=400):
 
 @costos_bp.get("/filters/faenas")
 def filtros_faenas():
+    data, edad, estado = catalogo.obtener("costos", "faenas")
+    return con_encabezados(_ok(data), edad, estado)
+
+
+@costos_bp.get("/filters/tipos")
+def filtros_tipos():
+    faena = request.args.get("faena", "").strip()
+    if not faena:
+        return _err("Falta parámetro 'faena'.")
+    data, edad, estado = catalogo.obtener("costos", "tipos", faena)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+@costos_bp.get("/filters/equipos")
+def filtros_equipos():
+    faena = request.args.get("faena", "").strip()
+    tipo = request.args.get("tipo", "").strip()
+    if not faena or not tipo:
+        return _err("Faltan parámetros 'faena' y/o 'tipo'.")
+    data, edad, estado = catalogo.obtener("costos", "equipos", faena, tipo)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+# Vistas de registro diario de donde sale el equipo (tipo, marca y modelo)
+_VISTAS_REGISTRO = (
+    "v_registro_diario_anglo_export",
+    "v_registro_diario_cgo_andina_export",
+    "v_registro_diario_cgo_cumet_ventanas_export",
+    "v_registro_diario_cucons_export",
+    "v_registro_diario_eteo_export",
+    "v_registro_diario_kdm_export",
+    "v_registro_diario_tc_export",
+    "v_registro_diario_catodo_export",
+    "v_registro_diario_spot_export",
+)
+
+_TIPO_EQUIPO = "TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))"
+
+
+def _cte_equipo(columnas: list[tuple[str, str]]) -> str:
+    """CTE `equipo`: UNION ALL de `columnas` (expresión, alias) sobre _VISTAS_REGISTRO."""
+    partes = [
+        "\n        SELECT DISTINCT\n            " + proyeccion.select(columnas, None, " " * 12)
+        + f"\n        FROM consultas_cgo_ext.{vista}"
+        for vista in _VISTAS_REGISTRO
+    ]
+    return "\n    equipo AS (" + "\n        UNION ALL".join(partes) + "\n    )\n"
+
+
+# Mapa equipo_codigo -> tipo de equipo
+_CTE_EQUIPO_TIPO = _cte_equipo([("equipo_codigo", "equipo_codigo"), (_TIPO_EQUIPO, "tipo_equipo")])
+
+
+@costos_bp.get("/filters/tree")
+def filtros_arbol():
+    """Jerarquía completa {faena: {tipo: [equipos]}} en una sola respuesta (para filtrar en el cliente)."""
+    data, edad, estado = catalogo.obtener("costos", "tree")
+    return con_encabezados(_ok(data), edad, estado)
+
 
+def _arbol() -> dict:
     sql = """
-        SELECT DISTINCT faena
+    WITH ot_mantenimiento AS (
+        SELECT DISTINCT TRIM(equipo) AS equipo, faena
         FROM consultas_cgo_ext.v_sol_items_otm_otr
         WHERE faena IS NOT NULL AND TRIM(faena) <> ''
-        ORDER BY 1;
+    ),""" + _CTE_EQUIPO_TIPO + """
+    SELECT DISTINCT otm.faena, e.tipo_equipo, otm.equipo AS equipo_codigo
+    FROM ot_mantenimiento otm
+    LEFT JOIN equipo e
+        ON otm.equipo = TRIM(e.equipo_codigo)
+       AND e.tipo_equipo IS NOT NULL AND e.tipo_equipo <> ''
+    ORDER BY 1, 2, 3;
     """
-    conn = _get_conn()
-    try:
-        with conn, conn.cursor() as cur:
+    with _get_conn() as conn:
+        with conn.cursor() as cur:
             cur.execute(sql)
-            rows = [r["faena"] for r in cur.fetchall()]
-        return _ok(rows)
-    finally:
-        conn.close()
+            return arbol((r["faena"], r["tipo_equipo"], r["equipo_codigo"]) for r in cur.fetchall())
 
 
-@costos_bp.get("/filters/tipos")
-def filtros_tipos():
+def _faenas() -> list:
+    sql = """
+        SELECT DISTINCT faena
+        FROM consultas_cgo_ext.v_sol_items_otm_otr
+        WHERE faena IS NOT NULL AND TRIM(faena) <> ''
+        ORDER BY 1;
+    """
+    with _get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            return [r["faena"] for r in cur.fetchall()]
 
-    faena = request.args.get("faena", "").strip()
-    if not faena:
-        return _err("Falta parámetro 'faena'.")
 
+def _tipos(faena: str) -> list:
     sql = """
     WITH ot_mantenimiento AS (
         SELECT DISTINCT
@@ -64,164 +137,107 @@ def filtros_tipos():
             faena
         FROM consultas_cgo_ext.v_sol_items_otm_otr
         WHERE faena = %(faena)s
-    ),
-    equipo AS (
-        SELECT DISTINCT
-            equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')) AS tipo_equipo
-        FROM consultas_cgo_ext.v_registro_diario_anglo_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_cgo_andina_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_cgo_cumet_ventanas_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_cucons_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_eteo_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_kdm_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_tc_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_catodo_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_spot_export
-    )
+    ),""" + _CTE_EQUIPO_TIPO + """
     SELECT DISTINCT e.tipo_equipo
     FROM ot_mantenimiento otm
     JOIN equipo e ON TRIM(otm.equipo) = TRIM(e.equipo_codigo)
     WHERE e.tipo_equipo IS NOT NULL AND e.tipo_equipo <> ''
     ORDER BY 1;
     """
-    conn = _get_conn()
-    try:
-        with conn, conn.cursor() as cur:
+    with _get_conn() as conn:
+        with conn.cursor() as cur:
             cur.execute(sql, {"faena": faena})
-            rows = [r["tipo_equipo"] for r in cur.fetchall()]
-        return _ok(rows)
-    finally:
-        conn.close()
+            return [r["tipo_equipo"] for r in cur.fetchall()]
 
 
-@costos_bp.get("/filters/equipos")
-def filtros_equipos():
-
-    faena = request.args.get("faena", "").strip()
-    tipo = request.args.get("tipo", "").strip()
-    if not faena or not tipo:
-        return _err("Faltan parámetros 'faena' y/o 'tipo'.")
-
+def _equipos(faena: str, tipo: str) -> list:
     sql = """
     WITH ot_mantenimiento AS (
         SELECT DISTINCT equipo, faena
         FROM consultas_cgo_ext.v_sol_items_otm_otr
         WHERE faena = %(faena)s
-    ),
-    equipo AS (
-        SELECT DISTINCT
-            equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')) AS tipo_equipo
-        FROM consultas_cgo_ext.v_registro_diario_anglo_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_cgo_andina_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_cgo_cumet_ventanas_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_cucons_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_eteo_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_kdm_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_tc_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_catodo_export
-        UNION ALL
-        SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', ''))
-        FROM consultas_cgo_ext.v_registro_diario_spot_export
-    )
+    ),""" + _CTE_EQUIPO_TIPO + """
     SELECT DISTINCT TRIM(otm.equipo) AS equipo_codigo
     FROM ot_mantenimiento otm
     JOIN equipo e ON TRIM(otm.equipo) = TRIM(e.equipo_codigo)
     WHERE e.tipo_equipo = %(tipo)s
     ORDER BY 1;
     """
-    conn = _get_conn()
-    try:
-        with conn, conn.cursor() as cur:
+    with _get_conn() as conn:
+        with conn.cursor() as cur:
             cur.execute(sql, {"faena": faena, "tipo": tipo})
-            rows = [r["equipo_codigo"] for r in cur.fetchall()]
-        return _ok(rows)
-    finally:
-        conn.close()
+            return [r["equipo_codigo"] for r in cur.fetchall()]
+
+
+catalogo.registrar("costos", "faenas", _faenas, calentar=lambda: [()])
+catalogo.registrar("costos", "tipos", _tipos)
+catalogo.registrar("costos", "equipos", _equipos)
+catalogo.registrar("costos", "tree", _arbol, calentar=lambda: [()])
 
 
 # === Data main ===
 
-@costos_bp.get("")
-def get_costos():
+# Clave de orden de get_costos(): (expresión SQL, columna en la respuesta).
+# Las vistas no traen un id por fila; fila_id (md5 de la fila del DISTINCT) es
+# el desempate único que necesita el cursor. No viaja en la respuesta salvo que
+# ?fields= lo pida.
+_CLAVES = (
+    ("c.id_programa_otm", "id_programa_otm"),
+    ("c.otm_numero", "otm_numero"),
+    ("c.compra_fecha_solicitud", "compra_fecha_solicitud"),
+    ("c.fila_id", "fila_id"),
+)
 
-    faena = request.args.get("faena", "").strip()
-    equipo = request.args.get("equipo", "").strip()
-    limit = int(request.args.get("limit", 1000))
-    offset = int(request.args.get("offset", 0))
 
-    if not faena or not equipo:
-        return _err("Faltan parámetros 'faena' y/o 'equipo'.")
+# Columnas de get_costos() (expresión SQL, alias): el alias es el nombre en la
+# respuesta y la lista blanca de ?fields=.
+_COLUMNAS = (
+    # Identificación
+    ("p.id_programa_otm", "id_programa_otm"),
+    ("p.numero_otm", "otm_numero"),
 
-    sql = """
+    # Equipo
+    ("p.equipo", "equipo_codigo"),
+    ("e.tipo_equipo", "equipo_tipo"),
+    ("e.marca_equipo", "equipo_marca"),
+    ("e.modelo_equipo", "equipo_modelo"),
+    ("p.horometro_planificacion", "equipo_horometro_planificacion"),
+
+    # Compras / Insumos
+    ("otm.numero_solicitud", "compra_numero_solicitud"),
+    ("otm.fecha_solicitud", "compra_fecha_solicitud"),
+    ("otm.proveedor_rut", "rut_proveedor"),
+    ("otm.proveedor_nombre", "nombre_proveedor"),
+    ("otm.motivo_compra", "motivo_compra"),
+    ("otm.item_material_o_servicio", "compra_item"),
+    ("otm.item_cantidad", "compra_cantidad"),
+    ("otm.item_unidad", "compra_unidad"),
+    ("otm.item_monto_total", "compra_monto_item"),
+    ("otm.monto_neto", "compra_monto_neto"),
+    ("otm.valor_total", "compra_valor_total"),
+    ("otm.monto_total_factura", "compra_monto_total_factura"),
+    ("otm.fecha_emision_factura", "compra_fecha_factura"),
+    ("otm.orden_compra", "compra_orden"),
+    ("otm.estado_solicitud", "compra_estado"),
+    ("otm.condicion_pago", "compra_condicion_pago"),
+    ("otm.id_cuenta", "id_cuenta"),
+    ("otm.descripcion_cuenta", "descripcion_cuenta"),
+    ("otm.centro_costos", "compra_centro_costos"),
+
+    ("p.estado_programa", "estado_programa"),
+)
+
+# Lista blanca de ?fields=: las columnas más el desempate del cursor
+_CAMPOS = _COLUMNAS + (("c.fila_id", "fila_id"),)
+
+# Solo las columnas que usan _COLUMNAS y los JOIN (el DISTINCT no ve otras)
+_CTE_COSTOS = """
     WITH programa AS (
         SELECT
             id_programa_otm,
             otm AS numero_otm,
             equipo,
-            codigo_tarea,
-            horometro_referencia,
-            disponibilidad_insumos,
-            instrucciones_especiales,
-            fecha_limite,
-            cantidad_reprogramaciones,
-            usuario_programacion,
-            nombre_prioridad_otm,
-            fecha_ejecucion_otm,
             horometro_planificacion,
-            ultimo_horometro,
-            fecha_ultimo_horometro,
-            usuario_ultimo_horometro,
-            fecha_log,
-            fecha_hora_inicio,
-            fecha_hora_fin,
             estado_programa
         FROM consultas_cgo_ext.v_programa_otm
     ),
@@ -230,9 +246,6 @@ def get_costos():
             numero_solicitud,
             fecha_solicitud,
             ot,
-            tipo_solicitud,
-            equipo,
-            solicitante,
             estado_solicitud,
             faena,
             SPLIT_PART(cuenta_contable, ':', 1) AS id_cuenta,
@@ -240,129 +253,166 @@ def get_costos():
             centro_costos,
             SPLIT_PART(proveedor_seleccionado, ' - ', 1) AS proveedor_rut,
             SPLIT_PART(proveedor_seleccionado, ' - ', 2) AS proveedor_nombre,
-            fecha_cotizacion,
             condicion_pago,
             monto_neto,
             valor_total,
-            plazo_entrega,
             motivo_compra,
             orden_compra,
-            fecha_orden_compra,
             fecha_emision_factura,
             monto_total_factura,
             item_material_o_servicio,
             item_cantidad,
             SPLIT_PART(item_unidad, ' - ', 2) AS item_unidad,
-            item_monto_total,
-            estado_recepcion,
-            fecha_aceptado,
-            fecha_aceptado_gerencia,
-            validador,
-            validador_gerencia
+            item_monto_total
         FROM consultas_cgo_ext.v_sol_items_otm_otr
         WHERE faena = %(faena)s
-    ),
-    equipo AS (
-        SELECT DISTINCT
-            equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')) AS tipo_equipo,
-            SPLIT_PART(equipo, ' - ', 2) AS marca_equipo,
-            SPLIT_PART(equipo, ' - ', 3) AS modelo_equipo
-        FROM consultas_cgo_ext.v_registro_diario_anglo_export
-        UNION ALL SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
-            SPLIT_PART(equipo, ' - ', 2),
-            SPLIT_PART(equipo, ' - ', 3)
-        FROM consultas_cgo_ext.v_registro_diario_cgo_andina_export
-        UNION ALL SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
-            SPLIT_PART(equipo, ' - ', 2),
-            SPLIT_PART(equipo, ' - ', 3)
-        FROM consultas_cgo_ext.v_registro_diario_cgo_cumet_ventanas_export
-        UNION ALL SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
-            SPLIT_PART(equipo, ' - ', 2),
-            SPLIT_PART(equipo, ' - ', 3)
-        FROM consultas_cgo_ext.v_registro_diario_cucons_export
-        UNION ALL SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
-            SPLIT_PART(equipo, ' - ', 2),
-            SPLIT_PART(equipo, ' - ', 3)
-        FROM consultas_cgo_ext.v_registro_diario_eteo_export
-        UNION ALL SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
-            SPLIT_PART(equipo, ' - ', 2),
-            SPLIT_PART(equipo, ' - ', 3)
-        FROM consultas_cgo_ext.v_registro_diario_kdm_export
-        UNION ALL SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
-            SPLIT_PART(equipo, ' - ', 2),
-            SPLIT_PART(equipo, ' - ', 3)
-        FROM consultas_cgo_ext.v_registro_diario_tc_export
-        UNION ALL SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
-            SPLIT_PART(equipo, ' - ', 2),
-            SPLIT_PART(equipo, ' - ', 3)
-        FROM consultas_cgo_ext.v_registro_diario_catodo_export
-        UNION ALL SELECT DISTINCT equipo_codigo,
-            TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
-            SPLIT_PART(equipo, ' - ', 2),
-            SPLIT_PART(equipo, ' - ', 3)
-        FROM consultas_cgo_ext.v_registro_diario_spot_export
-    )
-    SELECT DISTINCT
-        -- Identificación
-        p.id_programa_otm                         AS id_programa_otm,
-        p.numero_otm                              AS otm_numero,
-
-        -- Equipo
-        p.equipo                                  AS equipo_codigo,
-        e.tipo_equipo                             AS equipo_tipo,
-        e.marca_equipo                            AS equipo_marca,
-        e.modelo_equipo                           AS equipo_modelo,
-        p.horometro_planificacion                 AS equipo_horometro_planificacion,
-
-        -- Compras / Insumos
-        otm.numero_solicitud                      AS compra_numero_solicitud,
-        otm.fecha_solicitud                       AS compra_fecha_solicitud,
-        otm.proveedor_rut                         AS rut_proveedor,
-        otm.proveedor_nombre                      AS nombre_proveedor,
-        otm.motivo_compra                         AS motivo_compra,
-        otm.item_material_o_servicio              AS compra_item,
-        otm.item_cantidad                         AS compra_cantidad,
-        otm.item_unidad                           AS compra_unidad,
-        otm.item_monto_total                      AS compra_monto_item,
-        otm.monto_neto                            AS compra_monto_neto,
-        otm.valor_total                           AS compra_valor_total,
-        otm.monto_total_factura                   AS compra_monto_total_factura,
-        otm.fecha_emision_factura                 AS compra_fecha_factura,
-        otm.orden_compra                          AS compra_orden,
-        otm.estado_solicitud                      AS compra_estado,
-        otm.condicion_pago                        AS compra_condicion_pago,
-        otm.id_cuenta                             AS id_cuenta,
-        otm.descripcion_cuenta                    AS descripcion_cuenta,
-        otm.centro_costos                         AS compra_centro_costos,
-
-        p.estado_programa                         AS estado_programa
-    FROM programa p
-    LEFT JOIN ot_mantenimiento otm ON p.numero_otm = otm.ot
-    LEFT JOIN equipo e ON TRIM(p.equipo) = TRIM(e.equipo_codigo)
-    WHERE otm.faena = %(faena)s
-      AND TRIM(p.equipo) = %(equipo)s
-    ORDER BY p.id_programa_otm, p.numero_otm, otm.fecha_solicitud
-    LIMIT %(limit)s OFFSET %(offset)s;
+    )"""
+
+# CTE de las vistas de registro diario. Va siempre, aunque ?fields= no pida
+# columnas e.*: un código repetido en varias vistas multiplica las filas.
+_CTE_EQUIPO = "," + _cte_equipo([
+    ("equipo_codigo", "equipo_codigo"),
+    (_TIPO_EQUIPO, "tipo_equipo"),
+    ("SPLIT_PART(equipo, ' - ', 2)", "marca_equipo"),
+    ("SPLIT_PART(equipo, ' - ', 3)", "modelo_equipo"),
+])
+
+
+def _sql_costos(keyset: str = "", campos: tuple[str, ...] | None = None, fila_id: bool = True) -> str:
+    """
+    Consulta base de costos (sin LIMIT). `keyset` es el predicado del cursor o "";
+    `campos` la proyección de ?fields= (None = todas las columnas). Con
+    `fila_id=False` (exportaciones, que no paginan) no se calcula el desempate.
+
+    El DISTINCT y los JOIN se arman siempre con la fila completa y la proyección
+    se aplica afuera: ?fields= solo quita columnas, nunca junta ni descarta filas
+    (los conteos por página y el offset no cambian). El ERP hace el mismo
+    trabajo con o sin ?fields=; se ahorra el envío de columnas y el JSON.
     """
+    sql = _CTE_COSTOS + _CTE_EQUIPO + ",\n"
+    sql += "    costos AS (\n"
+    sql += "        SELECT f.*" + (", md5(f::text) AS fila_id" if fila_id else "") + "\n"
+    sql += "        FROM (\n"
+    sql += "            SELECT DISTINCT\n                " + proyeccion.select(_COLUMNAS, None, " " * 16) + "\n"
+    sql += "            FROM programa p\n"
+    sql += "            LEFT JOIN ot_mantenimiento otm ON p.numero_otm = otm.ot\n"
+    sql += "            LEFT JOIN equipo e ON TRIM(p.equipo) = TRIM(e.equipo_codigo)\n"
+    sql += """            WHERE otm.faena = %(faena)s
+              AND TRIM(p.equipo) = %(equipo)s
+        ) f
+    )
+"""
+    if campos is None:
+        sql += "    SELECT c.*\n"
+    else:
+        salida = [(f"c.{alias}", alias) for _, alias in _CAMPOS]
+        sql += "    SELECT\n        " + proyeccion.select(salida, campos + ("fila_id",), " " * 8) + "\n"
+    orden = ", ".join(expr for expr, alias in _CLAVES if fila_id or alias != "fila_id")
+    return sql + f"""    FROM costos c
+    WHERE TRUE
+      {keyset}
+    ORDER BY {orden}
+"""
+
+
+def _sql_pagina(keyset: str, campos: tuple[str, ...] | None = None) -> str:
+    return _sql_costos(keyset, campos) + "    LIMIT %(limit)s OFFSET %(offset)s;\n"
 
-    conn = _get_conn()
+
+# Primera página (sin cursor): compilada al importar; las variantes con cursor se compilan al primer uso
+preparadas.preparar(_sql_pagina(""))
+
+
+@costos_bp.get("")
+def get_costos():
+
+    faena = request.args.get("faena", "").strip()
+    equipo = request.args.get("equipo", "").strip()
+    limit = int(request.args.get("limit", 1000))
+    offset = int(request.args.get("offset", 0))
+    token = request.args.get("cursor", "").strip()
+
+    if not faena or not equipo:
+        return _err("Faltan parámetros 'faena' y/o 'equipo'.")
+
+    # ?fields=: solo esas columnas (+ las claves de orden, que necesita el cursor)
+    try:
+        campos = proyeccion.campos(_CAMPOS, [col for _, col in _CLAVES if col != "fila_id"])
+    except ValueError as e:
+        return _err(str(e))
+
+    # Keyset: con ?cursor= se continúa desde la última clave entregada (offset se ignora)
     try:
-        with conn, conn.cursor() as cur:
-            cur.execute(sql, {
-                "faena": faena,
-                "equipo": equipo,
-                "limit": limit,
-                "offset": offset
-            })
-            rows = cur.fetchall()
-        return _ok(rows)
-    finally:
-        conn.close()
+        pred, params_cursor, anterior = cursor_pag.desde_token(
+            token, [expr for expr, _ in _CLAVES], [False] * len(_CLAVES), lambda n: f"%({n})s"
+        )
+    except cursor_pag.CursorInvalido as e:
+        return _err(str(e))
+    keyset = f"AND {pred}" if pred else ""
+    if anterior:
+        offset = anterior[1]
+
+    sql = _sql_pagina(keyset, campos)
+
+    params = {
+        "faena": faena,
+        "equipo": equipo,
+        "limit": limit,
+        "offset": offset,
+        **params_cursor,
+    }
+    # ?format=columnar: {"columns", "rows"} leído con cursor de tuplas
+    como_tabla = columnar.pedido()
+
+    # Peticiones idénticas concurrentes comparten una sola ejecución
+    rows = _vuelo.ejecutar(
+        (clave_sql(sql, params), como_tabla),
+        lambda: _consultar(sql, params, como_tabla, preparar=campos is None),
+    )
+    if como_tabla:
+        claves = columnar.claves(rows, [col for _, col in _CLAVES])
+    else:
+        claves = [tuple(r[col] for _, col in _CLAVES) for r in rows]
+    if campos is None or "fila_id" not in campos:
+        # fila_id solo hacía falta para el cursor (copia: `rows` se comparte entre peticiones)
+        rows = columnar.sin(rows, ["fila_id"]) if como_tabla else [
+            {k: v for k, v in r.items() if k != "fila_id"} for r in rows
+        ]
+    return _ok(rows, next_cursor=cursor_pag.siguiente(claves, limit, anterior))
+
+
+def filas_export(params: Mapping) -> Iterable[dict]:
+    """Filas completas (sin paginar) con cursor del lado del servidor; ValueError si faltan filtros."""
+    faena = (params.get("faena") or "").strip()
+    equipo = (params.get("equipo") or "").strip()
+    if not faena or not equipo:
+        raise ValueError("Faltan parámetros 'faena' y/o 'equipo'.")
+    return erp.filas_servidor(_sql_costos(fila_id=False), {"faena": faena, "equipo": equipo}, "reportes")
+
+
+registrar_fuente("costos", filas_export)
+
+
+@costos_bp.get("/export")
+def export_costos():
+    """Resultado completo en NDJSON/CSV (?format=) leído con un cursor del lado del servidor."""
+    formato = formato_valido(request.args.get("format"))
+    if formato is None:
+        return _err("Parámetro 'format' inválido (ndjson | csv).")
+    try:
+        filas = filas_export(request.args)
+    except ValueError as e:
+        return _err(str(e))
+    return respuesta_stream(filas, formato, f"costos_{request.args.get('equipo', '').strip()}")
+
+
+def _consultar(sql: str, params: dict, como_tabla: bool = False, preparar: bool = True):
+    fabrica = psycopg2.extensions.cursor if como_tabla else None  # None: RealDictCursor del pool
+    with _get_conn() as conn:
+        with conn.cursor(cursor_factory=fabrica) as cur:
+            if preparar:
+                preparadas.ejecutar(cur, sql, params)
+            else:
+                # proyecciones (?fields=): combinaciones abiertas, no se preparan por conexión
+                cur.execute(sql, params)
+            return columnar.desde_cursor(cur) if como_tabla else cur.fetchall()
@@ -1,21 +1,23 @@
 # backend/endpoints/query/proxmtto/proxmtto.py
+from typing import Iterable, Mapping
+
 from flask import Blueprint, request, jsonify
 from sqlalchemy import text
-from database.database import get_db
-from decimal import Decimal
-from datetime import datetime, date
+from database.database import get_db_lectura, get_db_stream
+from services.cache.cache import con_encabezados
+from services.catalogo import catalogo
+from services.filtros.arbol import arbol
+from services.exportar.stream import formato_valido, respuesta_stream
+from services.exportar.trabajos import registrar_fuente
+from services.paginacion import cursor as cursor_pag
+from services.serializacion import columnar
 
 proxmtto_bp = Blueprint("proxmtto_api", __name__, url_prefix="/query/proxmtto")
 
-def _to_json(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    return obj
+_LOTE_EXPORT = 2000
 
-def _ok(data):
-    return jsonify({"ok": True, "data": data})
+def _ok(data, **extra):
+    return jsonify({"ok": True, "data": data, **extra})
 
 def _err(msg, code=400):
     resp = jsonify({"ok": False, "error": msg})
@@ -26,7 +28,69 @@ def _err(msg, code=400):
 # ========= Filtros =========
 @proxmtto_bp.get("/filters/faenas", strict_slashes=False)
 def filtros_faenas():
-    db = next(get_db())
+    try:
+        data, edad, estado = catalogo.obtener("proxmtto", "faenas")
+    except Exception as e:
+        return _err(str(e), 500)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+@proxmtto_bp.get("/filters/tipos", strict_slashes=False)
+def filtros_tipos():
+    faena = request.args.get("faena", "").strip()
+    if not faena:
+        return _err("Falta parámetro 'faena'.")
+    try:
+        data, edad, estado = catalogo.obtener("proxmtto", "tipos", faena)
+    except Exception as e:
+        return _err(str(e), 500)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+@proxmtto_bp.get("/filters/equipos", strict_slashes=False)
+def filtros_equipos():
+    faena = request.args.get("faena", "").strip()
+    tipo = request.args.get("tipo", "").strip()
+    
+    if not faena:
+        return _err("Falta parámetro 'faena'.")
+    try:
+        data, edad, estado = catalogo.obtener("proxmtto", "equipos", faena, tipo)
+    except Exception as e:
+        return _err(str(e), 500)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+@proxmtto_bp.get("/filters/tree", strict_slashes=False)
+def filtros_arbol():
+    """Jerarquía completa {faena: {tipo: [equipos]}} en una sola respuesta (para filtrar en el cliente)."""
+    try:
+        data, edad, estado = catalogo.obtener("proxmtto", "tree")
+    except Exception as e:
+        return _err(str(e), 500)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+def _arbol() -> dict:
+    db = next(get_db_lectura())
+    try:
+        sql = text("""
+            SELECT DISTINCT f.faena_desc, te.tipo_equipo_desc, e.equipo_desc
+            FROM proximo_mantenimiento pm
+            JOIN equipo e ON e.equipo_id = pm.equipo_id
+            LEFT JOIN tipo_equipo te ON te.tipo_equipo_id = e.tipo_equipo_id
+            JOIN programa p ON p.equipo_id = e.equipo_id
+            JOIN faena f ON f.faena_id = p.faena_id
+            ORDER BY 1, 2, 3
+        """)
+        
+        return arbol(tuple(r) for r in db.execute(sql).fetchall())
+    finally:
+        db.close()
+
+
+def _faenas() -> list:
+    db = next(get_db_lectura())
     try:
         sql = text("""
             SELECT DISTINCT f.faena_desc
@@ -38,21 +102,16 @@ def filtros_faenas():
         """)
         
         rows = db.execute(sql).fetchall()
-        return _ok([r[0] for r in rows])
-    except Exception as e:
+        return [r[0] for r in rows]
+    except Exception:
         db.rollback()
-        return _err(str(e), 500)
+        raise
     finally:
         db.close()
 
 
-@proxmtto_bp.get("/filters/tipos", strict_slashes=False)
-def filtros_tipos():
-    faena = request.args.get("faena", "").strip()
-    if not faena:
-        return _err("Falta parámetro 'faena'.")
-    
-    db = next(get_db())
+def _tipos(faena: str) -> list:
+    db = next(get_db_lectura())
     try:
         sql = text("""
             SELECT DISTINCT te.tipo_equipo_desc
@@ -66,23 +125,16 @@ def filtros_tipos():
         """)
         
         rows = db.execute(sql, {"faena": faena}).fetchall()
-        return _ok([r[0] for r in rows])
-    except Exception as e:
+        return [r[0] for r in rows]
+    except Exception:
         db.rollback()
-        return _err(str(e), 500)
+        raise
     finally:
         db.close()
 
 
-@proxmtto_bp.get("/filters/equipos", strict_slashes=False)
-def filtros_equipos():
-    faena = request.args.get("faena", "").strip()
-    tipo = request.args.get("tipo", "").strip()
-    
-    if not faena:
-        return _err("Falta parámetro 'faena'.")
-    
-    db = next(get_db())
+def _equipos(faena: str, tipo: str) -> list:
+    db = next(get_db_lectura())
     try:
         sql_str = """
             SELECT DISTINCT e.equipo_desc
@@ -102,15 +154,82 @@ def filtros_equipos():
         sql_str += " ORDER BY e.equipo_desc"
         
         rows = db.execute(text(sql_str), params).fetchall()
-        return _ok([r[0] for r in rows])
-    except Exception as e:
+        return [r[0] for r in rows]
+    except Exception:
         db.rollback()
-        return _err(str(e), 500)
+        raise
     finally:
         db.close()
 
 
+catalogo.registrar("proxmtto", "faenas", _faenas, calentar=lambda: [()], base_local=True)
+catalogo.registrar("proxmtto", "tipos", _tipos, base_local=True)
+catalogo.registrar("proxmtto", "equipos", _equipos, base_local=True)
+catalogo.registrar("proxmtto", "tree", _arbol, calentar=lambda: [()], base_local=True)
+
+
 # ========= Data Principal =========
+def _sql_proxmtto(faena: str, tipo: str, equipo: str) -> tuple[str, dict]:
+    """SELECT base con los filtros aplicados (sin ORDER BY ni LIMIT)."""
+    sql_str = """
+        SELECT 
+            e.equipo_desc,
+            f.faena_desc,
+            pm.ultimo_horometro_otm,
+            pm.fec_ultima_otm,
+            pm.prom_horas_entre_otm,
+            pm.prom_horas_trabajadas_diarias,
+            pm.dias_restantes,
+            pm.fecha_prox_otm,
+            pm.horometro_prox_otm,
+            pm.equipo_id
+        FROM proximo_mantenimiento pm
+        JOIN equipo e ON e.equipo_id = pm.equipo_id
+        LEFT JOIN tipo_equipo te ON te.tipo_equipo_id = e.tipo_equipo_id
+        LEFT JOIN (
+            SELECT DISTINCT ON (equipo_id) 
+                equipo_id, faena_id
+            FROM programa
+            ORDER BY equipo_id, programa_id DESC
+        ) p ON p.equipo_id = e.equipo_id
+        LEFT JOIN faena f ON f.faena_id = p.faena_id
+        WHERE 1=1
+    """
+    params = {}
+    
+    if faena:
+        sql_str += " AND f.faena_desc = :faena"
+        params["faena"] = faena
+    
+    if tipo:
+        sql_str += " AND te.tipo_equipo_desc = :tipo"
+        params["tipo"] = tipo
+    
+    if equipo:
+        sql_str += " AND e.equipo_desc = :equipo"
+        params["equipo"] = equipo
+    
+    return sql_str, params
+
+
+# Columnas de la respuesta, en el orden del SELECT (la 10ª, equipo_id, solo desempata el cursor)
+_COLUMNAS = (
+    "equipo_codigo",
+    "faena",
+    "horometro_ultimo_mantenimiento",
+    "fecha_ultimo_mantenimiento",
+    "promedio_horas_entre_mantenimientos",
+    "promedio_horas_trabajadas_diarias",
+    "dias_restantes_aprox",
+    "fecha_proximo_mantenimiento",
+    "horometro_estimado_proximo_mantenimiento",
+)
+
+
+def _fila(r) -> dict:
+    return dict(zip(_COLUMNAS, r))
+
+
 @proxmtto_bp.get("", strict_slashes=False)
 def get_proximo_mantenimiento():
     faena = request.args.get("faena", "").strip()
@@ -118,71 +237,76 @@ def get_proximo_mantenimiento():
     equipo_param = request.args.get("equipo", "").strip()
     limit = int(request.args.get("limit", 500))
     offset = int(request.args.get("offset", 0))
+    token = request.args.get("cursor", "").strip()
+
+    # Keyset sobre (dias_restantes ASC NULLS LAST, equipo_id); con cursor, offset se ignora
+    try:
+        pred, params_cursor, anterior = cursor_pag.desde_token(
+            token, ("pm.dias_restantes", "pm.equipo_id"), (False, False), lambda n: f":{n}"
+        )
+    except cursor_pag.CursorInvalido as e:
+        return _err(str(e))
+    if anterior:
+        offset = anterior[1]
     
-    db = next(get_db())
+    db = next(get_db_lectura())
     try:
-        sql_str = """
-            SELECT 
-                e.equipo_desc,
-                f.faena_desc,
-                pm.ultimo_horometro_otm,
-                pm.fec_ultima_otm,
-                pm.prom_horas_entre_otm,
-                pm.prom_horas_trabajadas_diarias,
-                pm.dias_restantes,
-                pm.fecha_prox_otm,
-                pm.horometro_prox_otm
-            FROM proximo_mantenimiento pm
-            JOIN equipo e ON e.equipo_id = pm.equipo_id
-            LEFT JOIN tipo_equipo te ON te.tipo_equipo_id = e.tipo_equipo_id
-            LEFT JOIN (
-                SELECT DISTINCT ON (equipo_id) 
-                    equipo_id, faena_id
-                FROM programa
-                ORDER BY equipo_id, programa_id DESC
-            ) p ON p.equipo_id = e.equipo_id
-            LEFT JOIN faena f ON f.faena_id = p.faena_id
-            WHERE 1=1
-        """
-        
-        params = {}
+        sql_str, params = _sql_proxmtto(faena, tipo, equipo_param)
         
-        if faena:
-            sql_str += " AND f.faena_desc = :faena"
-            params["faena"] = faena
+        if pred:
+            sql_str += f" AND {pred}"
+            params.update(params_cursor)
         
-        if tipo:
-            sql_str += " AND te.tipo_equipo_desc = :tipo"
-            params["tipo"] = tipo
-        
-        if equipo_param:
-            sql_str += " AND e.equipo_desc = :equipo"
-            params["equipo"] = equipo_param
-        
-        sql_str += " ORDER BY pm.dias_restantes ASC NULLS LAST LIMIT :limit OFFSET :offset"
+        # equipo_id desempata para que el orden (y el cursor) sea total
+        sql_str += " ORDER BY pm.dias_restantes ASC NULLS LAST, pm.equipo_id LIMIT :limit OFFSET :offset"
         params["limit"] = limit
         params["offset"] = offset
         
         rows = db.execute(text(sql_str), params).fetchall()
+        if columnar.pedido():
+            data = columnar.tabla(_COLUMNAS, (tuple(r[:len(_COLUMNAS)]) for r in rows))
+        else:
+            data = [_fila(r) for r in rows]
         
-        data = []
-        for r in rows:
-            data.append({
-                "equipo_codigo": r[0], 
-                "faena": r[1],
-                "horometro_ultimo_mantenimiento": _to_json(r[2]),  
-                "fecha_ultimo_mantenimiento": _to_json(r[3]),  
-                "promedio_horas_entre_mantenimientos": _to_json(r[4]),  
-                "promedio_horas_trabajadas_diarias": _to_json(r[5]),  
-                "dias_restantes_aprox": _to_json(r[6]),  
-                "fecha_proximo_mantenimiento": _to_json(r[7]), 
-                "horometro_estimado_proximo_mantenimiento": _to_json(r[8]),  
-            })
-        
-        return _ok(data)
+        siguiente = cursor_pag.siguiente([(r[6], r[9]) for r in rows], limit, anterior)
+        return _ok(data, next_cursor=siguiente)
     
     except Exception as e:
         db.rollback()
         return _err(str(e), 500)
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def filas_export(params: Mapping) -> Iterable[dict]:
+    """Resultado completo (sin paginar) leído con stream_results / yield_per."""
+    sql_str, p = _sql_proxmtto(
+        (params.get("faena") or "").strip(),
+        (params.get("tipo") or "").strip(),
+        (params.get("equipo") or "").strip(),
+    )
+    sql_str += " ORDER BY pm.dias_restantes ASC NULLS LAST, pm.equipo_id"
+
+    def filas():
+        db = next(get_db_stream())
+        try:
+            result = db.execute(text(sql_str), p, execution_options={"stream_results": True})
+            for r in result.yield_per(_LOTE_EXPORT):
+                yield _fila(r)
+        finally:
+            db.close()
+
+    return filas()
+
+
+registrar_fuente("proxmtto", filas_export)
+
+
+@proxmtto_bp.get("/export", strict_slashes=False)
+def export_proximo_mantenimiento():
+    """Resultado completo en NDJSON/CSV (?format=) con cursor del lado del servidor."""
+    formato = formato_valido(request.args.get("format"))
+    if formato is None:
+        return _err("Parámetro 'format' inválido (ndjson | csv).")
+    nombre = f"proxmtto_{request.args.get('faena', '').strip() or 'todas'}"
+    return respuesta_stream(filas_export(request.args), formato, nombre)
@@ -4,11 +4,18 @@ from __future__ import annotations
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from datetime import datetime, timedelta
+from typing import Iterable, Mapping
 from sqlalchemy import func, or_, literal
 from sqlalchemy.orm import aliased
 
 
-from database.database import get_db
+from database.database import get_db_lectura, get_db_stream
+from services.cache.cache import con_encabezados
+from services.catalogo import catalogo
+from services.exportar.stream import formato_valido, respuesta_stream
+from services.exportar.trabajos import registrar_fuente
+from services.paginacion import cursor as cursor_pag
+from services.serializacion import columnar
 from models.models import (
     Faena, Equipo, TipoEquipo, Marca, Modelo,
     Programa, OrdenMan,
@@ -21,6 +28,8 @@ reprogramaciones_api = Blueprint(
     url_prefix="/query/reprogramaciones",
 )
 
+_LOTE_EXPORT = 2000
+
 # ----------------------- Utils -----------------------
 def _parse_date(s: str | None):
     if not s:
@@ -39,7 +48,107 @@ def _parse_date(s: str | None):
 @reprogramaciones_api.get("/filters/faenas", strict_slashes=False)
 @cross_origin()
 def filtros_faenas():
-    db = next(get_db())
+    data, edad, estado = catalogo.obtener("reprogramaciones", "faenas")
+    return con_encabezados(jsonify({"ok": True, "data": data}), edad, estado)
+
+
+@reprogramaciones_api.get("/filters/tipos", strict_slashes=False)
+@cross_origin()
+def filtros_tipos():
+    faena_id = request.args.get("faena_id", type=int)
+    if not faena_id:
+        return jsonify({"ok": False, "error": "faena_id es requerido"}), 400
+
+    try:
+        data, edad, estado = catalogo.obtener("reprogramaciones", "tipos", faena_id)
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return con_encabezados(jsonify({"ok": True, "data": data}), edad, estado)
+
+
+@reprogramaciones_api.get("/filters/equipos", strict_slashes=False)
+@cross_origin()
+def filtros_equipos():
+    faena_id = request.args.get("faena_id", type=int)
+    tipo_ids_csv = request.args.get("tipo_ids", default="", type=str)
+    tipo_ids_list = request.args.getlist("tipo_ids", type=int)
+    if not tipo_ids_list and tipo_ids_csv:
+        tipo_ids_list = [int(x) for x in tipo_ids_csv.split(",") if x.strip().isdigit()]
+
+    if not faena_id:
+        return jsonify({"ok": False, "error": "faena_id es requerido"}), 400
+
+    tipo_ids = tuple(sorted(set(tipo_ids_list)))
+    try:
+        data, edad, estado = catalogo.obtener("reprogramaciones", "equipos", faena_id, tipo_ids)
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return con_encabezados(jsonify({"ok": True, "data": data}), edad, estado)
+
+
+@reprogramaciones_api.get("/filters/tree", strict_slashes=False)
+@cross_origin()
+def filtros_arbol():
+    """
+    Jerarquía completa en una respuesta, con la misma forma que los filtros en cascada:
+    [{id, desc, tipos: [{desc, ids, equipos_count, equipos: [{id, desc}]}]}]
+    """
+    try:
+        data, edad, estado = catalogo.obtener("reprogramaciones", "tree")
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return con_encabezados(jsonify({"ok": True, "data": data}), edad, estado)
+
+
+def _arbol() -> list:
+    db = next(get_db_lectura())
+    try:
+        rows = (
+            db.query(
+                Faena.faena_id, Faena.faena_desc,
+                TipoEquipo.tipo_equipo_id, TipoEquipo.tipo_equipo_desc,
+                Equipo.equipo_id, Equipo.equipo_desc,
+            )
+            .join(Programa, Programa.faena_id == Faena.faena_id)
+            .join(Equipo, Equipo.equipo_id == Programa.equipo_id)
+            .outerjoin(TipoEquipo, TipoEquipo.tipo_equipo_id == Equipo.tipo_equipo_id)
+            .distinct()
+            .order_by(Faena.faena_desc.asc(), TipoEquipo.tipo_equipo_desc.asc(), Equipo.equipo_desc.asc())
+            .all()
+        )
+    finally:
+        db.close()
+
+    faenas: dict[int, dict] = {}
+    for r in rows:
+        faena = faenas.setdefault(r.faena_id, {"id": r.faena_id, "desc": r.faena_desc, "tipos": {}})
+        if r.tipo_equipo_desc is None:
+            continue
+        # tipos agrupados por descripción (varios tipo_equipo_id pueden compartirla)
+        tipo = faena["tipos"].setdefault(r.tipo_equipo_desc, {"desc": r.tipo_equipo_desc, "ids": set(), "equipos": {}})
+        tipo["ids"].add(int(r.tipo_equipo_id))
+        tipo["equipos"].setdefault(r.equipo_id, {"id": r.equipo_id, "desc": r.equipo_desc})
+
+    return [
+        {
+            "id": f["id"],
+            "desc": f["desc"],
+            "tipos": [
+                {
+                    "desc": t["desc"],
+                    "ids": sorted(t["ids"]),
+                    "equipos_count": len(t["equipos"]),
+                    "equipos": list(t["equipos"].values()),
+                }
+                for t in f["tipos"].values()
+            ],
+        }
+        for f in faenas.values()
+    ]
+
+
+def _faenas() -> list:
+    db = next(get_db_lectura())
     try:
         rows = (
             db.query(Faena.faena_id.label("id"), Faena.faena_desc.label("desc"))
@@ -49,19 +158,13 @@ def filtros_faenas():
               .order_by(Faena.faena_desc.asc())
               .all()
         )
-        return jsonify({"ok": True, "data": [{"id": r.id, "desc": r.desc} for r in rows]})
+        return [{"id": r.id, "desc": r.desc} for r in rows]
     finally:
         db.close()
 
 
-@reprogramaciones_api.get("/filters/tipos", strict_slashes=False)
-@cross_origin()
-def filtros_tipos():
-    faena_id = request.args.get("faena_id", type=int)
-    if not faena_id:
-        return jsonify({"ok": False, "error": "faena_id es requerido"}), 400
-
-    db = next(get_db())
+def _tipos(faena_id: int) -> list:
+    db = next(get_db_lectura())
     try:
         rows = (
             db.query(
@@ -77,28 +180,16 @@ def filtros_tipos():
             .all()
         )
 
-        data = [{"desc": r.desc, "ids": [int(i) for i in r.ids], "equipos_count": int(r.equipos_count)} for r in rows]
-        return jsonify({"ok": True, "data": data})
-    except Exception as e:
+        return [{"desc": r.desc, "ids": [int(i) for i in r.ids], "equipos_count": int(r.equipos_count)} for r in rows]
+    except Exception:
         db.rollback()
-        return jsonify({"ok": False, "error": str(e)}), 500
+        raise
     finally:
         db.close()
 
 
-@reprogramaciones_api.get("/filters/equipos", strict_slashes=False)
-@cross_origin()
-def filtros_equipos():
-    faena_id = request.args.get("faena_id", type=int)
-    tipo_ids_csv = request.args.get("tipo_ids", default="", type=str)
-    tipo_ids_list = request.args.getlist("tipo_ids", type=int)
-    if not tipo_ids_list and tipo_ids_csv:
-        tipo_ids_list = [int(x) for x in tipo_ids_csv.split(",") if x.strip().isdigit()]
-
-    if not faena_id:
-        return jsonify({"ok": False, "error": "faena_id es requerido"}), 400
-
-    db = next(get_db())
+def _equipos(faena_id: int, tipo_ids_list: list[int]) -> list:
+    db = next(get_db_lectura())
     try:
         q = (
             db.query(Equipo.equipo_id.label("id"), Equipo.equipo_desc.label("desc"))
@@ -109,15 +200,137 @@ def filtros_equipos():
             q = q.filter(Equipo.tipo_equipo_id.in_(tipo_ids_list))
 
         rows = q.distinct().order_by(Equipo.equipo_desc.asc()).all()
-        return jsonify({"ok": True, "data": [{"id": r.id, "desc": r.desc} for r in rows]})
-    except Exception as e:
+        return [{"id": r.id, "desc": r.desc} for r in rows]
+    except Exception:
         db.rollback()
-        return jsonify({"ok": False, "error": str(e)}), 500
+        raise
     finally:
         db.close()
 
 
+catalogo.registrar("reprogramaciones", "faenas", _faenas, calentar=lambda: [()], base_local=True)
+catalogo.registrar("reprogramaciones", "tipos", _tipos, base_local=True)
+catalogo.registrar("reprogramaciones", "equipos", lambda faena_id, tipo_ids: _equipos(faena_id, list(tipo_ids)), base_local=True)
+catalogo.registrar("reprogramaciones", "tree", _arbol, calentar=lambda: [()], base_local=True)
+
+
 # ----------------------- Listado principal -----------------------
+def _consulta(db, faena_id, tipo_id, equipo_id, desde_ts, hasta_ts):
+    """Query del listado con filtros aplicados (sin orden ni límites) y la subconsulta r_sub."""
+    Eq = aliased(Equipo)
+    Te = aliased(TipoEquipo)
+    Ma = aliased(Marca)
+    Mo = aliased(Modelo)
+
+    r_sub = (
+        db.query(
+            ReprogramacionOtm.otm_id.label("otm_id"),
+            func.count(ReprogramacionOtm.n_reprogramacion).label("reprogramaciones_cantidad"),
+            func.min(ReprogramacionOtm.fecha_inicio).label("reg_fecha_programada_original"),
+            func.max(ReprogramacionOtm.fecha_inicio).label("reg_fecha_inicio_real"),
+            func.max(MotivoReprogramacion.motivo_reprogramacion_desc).label("reprogramaciones_motivo"),
+        )
+        .outerjoin(
+            MotivoReprogramacion,
+            ReprogramacionOtm.motivo_reprogramacion_id == MotivoReprogramacion.motivo_reprogramacion_id
+        )
+        .group_by(ReprogramacionOtm.otm_id)
+        .subquery()
+    )
+
+    q = (
+        db.query(
+            OrdenMan.otm_id.label("id_programa_otm"),
+            OrdenMan.otm_id.label("otm_numero"),
+            OrdenMan.otm_desc.label("actividad_nombre"),
+            Programa.estado_otm.label("actividad_estado"),
+            literal("MANTENIMIENTO").label("actividad_tipo"),
+            Programa.usuario_programacion.label("otm_usuario_programador"),
+            Programa.disponibilidad_insumos.label("otm_disponibilidad_insumos"),
+
+            r_sub.c.reg_fecha_inicio_real,
+            r_sub.c.reg_fecha_programada_original,
+            r_sub.c.reprogramaciones_cantidad,
+            r_sub.c.reprogramaciones_motivo,
+
+            Eq.equipo_desc.label("equipo_codigo"),
+            Te.tipo_equipo_desc.label("equipo_tipo"),
+            Ma.marca_desc.label("equipo_marca"),
+            Mo.modelo_desc.label("equipo_modelo"),
+
+            Faena.faena_desc.label("faena_nombre"),
+            Eq.equipo_desc.label("faena_codigo_interno"),
+        )
+        .select_from(OrdenMan)
+        .join(Programa, OrdenMan.programa_id == Programa.programa_id)
+        .join(Eq, Eq.equipo_id == Programa.equipo_id)
+        .join(Te, Te.tipo_equipo_id == Eq.tipo_equipo_id)
+        .join(Ma, Ma.marca_id == Te.marca_id)
+        .join(Mo, Mo.modelo_id == Ma.modelo_id)
+        .join(Faena, Faena.faena_id == Programa.faena_id)
+        .outerjoin(r_sub, r_sub.c.otm_id == OrdenMan.otm_id)
+    )
+
+    if faena_id:
+        q = q.filter(Programa.faena_id == faena_id)
+    if tipo_id:
+        q = q.filter(Eq.tipo_equipo_id == tipo_id)
+    if equipo_id:
+        q = q.filter(Eq.equipo_id == equipo_id)
+
+    if desde_ts or hasta_ts:
+        if desde_ts and hasta_ts:
+            q = q.filter(
+                or_(
+                    r_sub.c.reg_fecha_inicio_real.between(desde_ts, hasta_ts),
+                    r_sub.c.reg_fecha_inicio_real.is_(None)
+                )
+            )
+        elif desde_ts:
+            q = q.filter(
+                or_(
+                    r_sub.c.reg_fecha_inicio_real >= desde_ts,
+                    r_sub.c.reg_fecha_inicio_real.is_(None)
+                )
+            )
+        elif hasta_ts:
+            q = q.filter(
+                or_(
+                    r_sub.c.reg_fecha_inicio_real <= hasta_ts,
+                    r_sub.c.reg_fecha_inicio_real.is_(None)
+                )
+            )
+
+    return q, r_sub
+
+
+def _orden(q, r_sub):
+    # otm_id desempata para que el orden (y el cursor) sea total
+    return q.order_by(r_sub.c.reprogramaciones_cantidad.desc().nullslast(), OrdenMan.otm_id.asc())
+
+
+def _fila(r) -> dict:
+    return {
+        "id_programa_otm": r.id_programa_otm,
+        "otm_numero": r.otm_numero,
+        "actividad_nombre": r.actividad_nombre,
+        "actividad_estado": r.actividad_estado,
+        "actividad_tipo": r.actividad_tipo,
+        "otm_usuario_programador": r.otm_usuario_programador,
+        "otm_disponibilidad_insumos": r.otm_disponibilidad_insumos,
+        "reg_fecha_inicio_real": r.reg_fecha_inicio_real,
+        "reg_fecha_programada_original": r.reg_fecha_programada_original,
+        "reprogramaciones_cantidad": int(r.reprogramaciones_cantidad) if r.reprogramaciones_cantidad else 0,
+        "reprogramaciones_motivo": r.reprogramaciones_motivo,
+        "equipo_codigo": r.equipo_codigo,
+        "equipo_tipo": r.equipo_tipo,
+        "equipo_marca": r.equipo_marca,
+        "equipo_modelo": r.equipo_modelo,
+        "faena_nombre": r.faena_nombre,
+        "faena_codigo_interno": r.faena_codigo_interno,
+    }
+
+
 @reprogramaciones_api.get("/", strict_slashes=False)
 @cross_origin()
 def listar_reprogramaciones():
@@ -132,124 +345,88 @@ def listar_reprogramaciones():
 
     limit  = request.args.get("limit",  default=100, type=int)
     offset = request.args.get("offset", default=0,   type=int)
+    token  = request.args.get("cursor", default="", type=str).strip()
 
-    db = next(get_db())
-    try:
-        Eq = aliased(Equipo)
-        Te = aliased(TipoEquipo)
-        Ma = aliased(Marca)
-        Mo = aliased(Modelo)
-
-        r_sub = (
-            db.query(
-                ReprogramacionOtm.otm_id.label("otm_id"),
-                func.count(ReprogramacionOtm.n_reprogramacion).label("reprogramaciones_cantidad"),
-                func.min(ReprogramacionOtm.fecha_inicio).label("reg_fecha_programada_original"),
-                func.max(ReprogramacionOtm.fecha_inicio).label("reg_fecha_inicio_real"),
-                func.max(MotivoReprogramacion.motivo_reprogramacion_desc).label("reprogramaciones_motivo"),
-            )
-            .outerjoin(
-                MotivoReprogramacion,
-                ReprogramacionOtm.motivo_reprogramacion_id == MotivoReprogramacion.motivo_reprogramacion_id
-            )
-            .group_by(ReprogramacionOtm.otm_id)
-            .subquery()
-        )
+    # Keyset sobre (reprogramaciones_cantidad DESC NULLS LAST, otm_id); con cursor, offset se ignora
+    anterior = None
+    if token:
+        try:
+            anterior = cursor_pag.decodificar(token, 2)
+        except cursor_pag.CursorInvalido as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+        offset = anterior[1]
 
-        q = (
-            db.query(
-                OrdenMan.otm_id.label("id_programa_otm"),
-                OrdenMan.otm_id.label("otm_numero"),
-                OrdenMan.otm_desc.label("actividad_nombre"),
-                Programa.estado_otm.label("actividad_estado"),
-                literal("MANTENIMIENTO").label("actividad_tipo"),
-                Programa.usuario_programacion.label("otm_usuario_programador"),
-                Programa.disponibilidad_insumos.label("otm_disponibilidad_insumos"),
-
-                r_sub.c.reg_fecha_inicio_real,
-                r_sub.c.reg_fecha_programada_original,
-                r_sub.c.reprogramaciones_cantidad,
-                r_sub.c.reprogramaciones_motivo,
-
-                Eq.equipo_desc.label("equipo_codigo"),
-                Te.tipo_equipo_desc.label("equipo_tipo"),
-                Ma.marca_desc.label("equipo_marca"),
-                Mo.modelo_desc.label("equipo_modelo"),
-
-                Faena.faena_desc.label("faena_nombre"),
-                Eq.equipo_desc.label("faena_codigo_interno"),
-            )
-            .select_from(OrdenMan)
-            .join(Programa, OrdenMan.programa_id == Programa.programa_id)
-            .join(Eq, Eq.equipo_id == Programa.equipo_id)
-            .join(Te, Te.tipo_equipo_id == Eq.tipo_equipo_id)
-            .join(Ma, Ma.marca_id == Te.marca_id)
-            .join(Mo, Mo.modelo_id == Ma.modelo_id)
-            .join(Faena, Faena.faena_id == Programa.faena_id)
-            .outerjoin(r_sub, r_sub.c.otm_id == OrdenMan.otm_id)
-        )
+    db = next(get_db_lectura())
+    try:
+        q, r_sub = _consulta(db, faena_id, tipo_id, equipo_id, desde_ts, hasta_ts)
 
-        if faena_id:
-            q = q.filter(Programa.faena_id == faena_id)
-        if tipo_id:
-            q = q.filter(Eq.tipo_equipo_id == tipo_id)
-        if equipo_id:
-            q = q.filter(Eq.equipo_id == equipo_id)
-
-        if desde_ts or hasta_ts:
-            if desde_ts and hasta_ts:
-                q = q.filter(
-                    or_(
-                        r_sub.c.reg_fecha_inicio_real.between(desde_ts, hasta_ts),
-                        r_sub.c.reg_fecha_inicio_real.is_(None)
-                    )
-                )
-            elif desde_ts:
-                q = q.filter(
-                    or_(
-                        r_sub.c.reg_fecha_inicio_real >= desde_ts,
-                        r_sub.c.reg_fecha_inicio_real.is_(None)
-                    )
-                )
-            elif hasta_ts:
-                q = q.filter(
-                    or_(
-                        r_sub.c.reg_fecha_inicio_real <= hasta_ts,
-                        r_sub.c.reg_fecha_inicio_real.is_(None)
-                    )
-                )
+        if anterior:
+            q = q.filter(cursor_pag.predicado_orm(
+                [r_sub.c.reprogramaciones_cantidad, OrdenMan.otm_id], [True, False], anterior[0]
+            ))
 
-        q = q.order_by(r_sub.c.reprogramaciones_cantidad.desc().nullslast())
-        q = q.limit(limit).offset(offset)
+        q = _orden(q, r_sub).limit(limit).offset(offset)
 
         rows = q.all()
 
-        data = []
-        for r in rows:
-            data.append({
-                "id_programa_otm": r.id_programa_otm,
-                "otm_numero": r.otm_numero,
-                "actividad_nombre": r.actividad_nombre,
-                "actividad_estado": r.actividad_estado,
-                "actividad_tipo": r.actividad_tipo,
-                "otm_usuario_programador": r.otm_usuario_programador,
-                "otm_disponibilidad_insumos": r.otm_disponibilidad_insumos,
-                "reg_fecha_inicio_real": r.reg_fecha_inicio_real.isoformat() if r.reg_fecha_inicio_real else None,
-                "reg_fecha_programada_original": r.reg_fecha_programada_original.isoformat() if r.reg_fecha_programada_original else None,
-                "reprogramaciones_cantidad": int(r.reprogramaciones_cantidad) if r.reprogramaciones_cantidad else 0,
-                "reprogramaciones_motivo": r.reprogramaciones_motivo,
-                "equipo_codigo": r.equipo_codigo,
-                "equipo_tipo": r.equipo_tipo,
-                "equipo_marca": r.equipo_marca,
-                "equipo_modelo": r.equipo_modelo,
-                "faena_nombre": r.faena_nombre,
-                "faena_codigo_interno": r.faena_codigo_interno,
-            })
-
-        return jsonify({"ok": True, "data": data})
+        data = [_fila(r) for r in rows]
+        if columnar.pedido():
+            data = columnar.desde_dicts(data)
+
+        siguiente = cursor_pag.siguiente(
+            [(r.reprogramaciones_cantidad, r.id_programa_otm) for r in rows], limit, anterior
+        )
+        return jsonify({"ok": True, "data": data, "next_cursor": siguiente})
 
     except Exception as e:
         db.rollback()
         return jsonify({"ok": False, "error": str(e)}), 500
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def _entero(v) -> int | None:
+    try:
+        return int(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        raise ValueError(f"Valor entero inválido: {v!r}")
+
+
+def filas_export(params: Mapping) -> Iterable[dict]:
+    """Listado completo (sin paginar) leído con yield_per (cursor del lado del servidor)."""
+    faena_id  = _entero(params.get("faena_id"))
+    tipo_id   = _entero(params.get("tipo_id"))
+    equipo_id = _entero(params.get("equipo_id"))
+
+    desde_ts = _parse_date(params.get("desde"))
+    hasta_ts = _parse_date(params.get("hasta"))
+    if hasta_ts:
+        hasta_ts = hasta_ts + timedelta(days=1)
+
+    def filas():
+        db = next(get_db_stream())
+        try:
+            q, r_sub = _consulta(db, faena_id, tipo_id, equipo_id, desde_ts, hasta_ts)
+            for r in _orden(q, r_sub).yield_per(_LOTE_EXPORT):
+                yield _fila(r)
+        finally:
+            db.close()
+
+    return filas()
+
+
+registrar_fuente("reprogramaciones", filas_export)
+
+
+@reprogramaciones_api.get("/export", strict_slashes=False)
+@cross_origin()
+def exportar_reprogramaciones():
+    """Listado completo en NDJSON/CSV (?format=), mismos filtros que el listado."""
+    formato = formato_valido(request.args.get("format"))
+    if formato is None:
+        return jsonify({"ok": False, "error": "Parámetro 'format' inválido (ndjson | csv)."}), 400
+    try:
+        filas = filas_export(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return respuesta_stream(filas, formato, "reprogramaciones")
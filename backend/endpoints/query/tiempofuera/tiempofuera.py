@@ -1,24 +1,31 @@
+from typing import Iterable, Mapping
+
+import psycopg2.extensions
 from flask import Blueprint, request, jsonify, current_app
-import psycopg2, psycopg2.extras
+from database import erp, preparadas
+from services.tiempofuera import motor as motor_tf
+from services.tiempofuera import indice as indice_tf
+from services.cache.cache import con_encabezados
+from services.catalogo import catalogo
+from services.cache.singleflight import SingleFlight, clave_sql
+from services.filtros.arbol import arbol
+from services.exportar.stream import formato_valido, respuesta_stream
+from services.exportar.trabajos import registrar_fuente
+from services.paginacion import cursor as cursor_pag
+from services.serializacion import columnar
 
 tfuera_bp = Blueprint("tfuera_api", __name__, url_prefix="/query/tiempo-fuera")
 
+_vuelo = SingleFlight("tiempo-fuera")
+
 def _schema() -> str:
     return current_app.config.get("COSTOS_SCHEMA", "consultas_cgo_ext")
 
-def _get_conn():
-    dsn = (
-        current_app.config.get("ERP_DATABASE_URL")
-        or current_app.config.get("PG_DSN")
-        or current_app.config.get("SQLALCHEMY_DATABASE_URI")
-    )
-    if not dsn:
-        raise RuntimeError("No hay DSN (ERP_DATABASE_URL/PG_DSN/SQLALCHEMY_DATABASE_URI) en config")
-    if dsn.startswith("postgresql+psycopg2://"):
-        dsn = dsn.replace("postgresql+psycopg2://", "postgresql://", 1)
-    return psycopg2.connect(dsn, cursor_factory=psycopg2.extras.RealDictCursor)
+def _get_conn(pool: str = "interactivo"):
+    """Conexión de un pool ERP: `with _get_conn() as conn:` la devuelve al salir."""
+    return erp.conexion(pool)
 
-def _ok(data): return jsonify({"ok": True, "data": data})
+def _ok(data, **extra): return jsonify({"ok": True, "data": data, **extra})
 def _err(msg, code=400):
     r = jsonify({"ok": False, "error": msg}); r.status_code = code; return r
 
@@ -27,6 +34,64 @@ def _err(msg, code=400):
 @tfuera_bp.get("/filters/faenas")
 def filtros_faenas():
     s = _schema()
+    data, edad, estado = catalogo.obtener("tiempo-fuera", "faenas", s)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+@tfuera_bp.get("/filters/tipos")
+def filtros_tipos():
+    faena = request.args.get("faena", "").strip()
+    if not faena: return _err("Falta parámetro 'faena'.")
+    s = _schema()
+    data, edad, estado = catalogo.obtener("tiempo-fuera", "tipos", s, faena)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+@tfuera_bp.get("/filters/equipos")
+def filtros_equipos():
+    faena = request.args.get("faena", "").strip()
+    tipo  = request.args.get("tipo", "").strip()
+    if not faena or not tipo: return _err("Faltan parámetros 'faena' y/o 'tipo'.")
+    s = _schema()
+    data, edad, estado = catalogo.obtener("tiempo-fuera", "equipos", s, faena, tipo)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+@tfuera_bp.get("/filters/tree")
+def filtros_arbol():
+    """Jerarquía completa {faena: {tipo: [equipos]}} en una sola respuesta (para filtrar en el cliente)."""
+    s = _schema()
+    data, edad, estado = catalogo.obtener("tiempo-fuera", "tree", s)
+    return con_encabezados(_ok(data), edad, estado)
+
+
+def _arbol(s: str) -> dict:
+    sql = f"""
+    WITH u AS (
+        SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_anglo_export
+        UNION ALL SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_catodo_export
+        UNION ALL SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_cgo_andina_export
+        UNION ALL SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_cgo_cumet_ventanas_export
+        UNION ALL SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_cucons_export
+        UNION ALL SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_eteo_export
+        UNION ALL SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_kdm_export
+        UNION ALL SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_spot_export
+    )
+    SELECT DISTINCT
+        TRIM(distrito) AS faena,
+        NULLIF(TRIM(REGEXP_REPLACE(SPLIT_PART(equipo,' - ',1),'^[A-Z0-9-]+ ','')), '') AS tipo_equipo,
+        TRIM(equipo_codigo) AS equipo_codigo
+    FROM u
+    WHERE distrito IS NOT NULL AND TRIM(distrito) <> ''
+    ORDER BY 1, 2, 3;
+    """
+    with _get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            return arbol((r["faena"], r["tipo_equipo"], r["equipo_codigo"]) for r in cur.fetchall())
+
+
+def _faenas(s: str) -> list:
     sql = f"""
     WITH union_rd AS (
         SELECT distrito FROM {s}.v_registro_diario_anglo_export
@@ -43,21 +108,13 @@ def filtros_faenas():
     WHERE distrito IS NOT NULL AND TRIM(distrito) <> ''
     ORDER BY 1;
     """
-    conn = _get_conn()
-    try:
-        with conn, conn.cursor() as cur:
+    with _get_conn() as conn:
+        with conn.cursor() as cur:
             cur.execute(sql)
-            return _ok([r["faena"] for r in cur.fetchall()])
-    finally:
-        conn.close()
+            return [r["faena"] for r in cur.fetchall()]
 
 
-@tfuera_bp.get("/filters/tipos")
-def filtros_tipos():
-    faena = request.args.get("faena", "").strip()
-    if not faena: return _err("Falta parámetro 'faena'.")
-
-    s = _schema()
+def _tipos(s: str, faena: str) -> list:
     sql = f"""
     WITH equipos AS (
         SELECT equipo FROM {s}.v_registro_diario_anglo_export            WHERE distrito = %(faena)s
@@ -75,22 +132,13 @@ def filtros_tipos():
     WHERE equipo IS NOT NULL
     ORDER BY 1;
     """
-    conn = _get_conn()
-    try:
-        with conn, conn.cursor() as cur:
+    with _get_conn() as conn:
+        with conn.cursor() as cur:
             cur.execute(sql, {"faena": faena})
-            return _ok([r["tipo_equipo"] for r in cur.fetchall() if r["tipo_equipo"]])
-    finally:
-        conn.close()
+            return [r["tipo_equipo"] for r in cur.fetchall() if r["tipo_equipo"]]
 
 
-@tfuera_bp.get("/filters/equipos")
-def filtros_equipos():
-    faena = request.args.get("faena", "").strip()
-    tipo  = request.args.get("tipo", "").strip()
-    if not faena or not tipo: return _err("Faltan parámetros 'faena' y/o 'tipo'.")
-
-    s = _schema()
+def _equipos(s: str, faena: str, tipo: str) -> list:
     sql = f"""
     WITH u AS (
         SELECT equipo_codigo, equipo, distrito FROM {s}.v_registro_diario_anglo_export
@@ -110,34 +158,27 @@ def filtros_equipos():
       AND equipo_codigo IS NOT NULL
     ORDER BY 1;
     """
-    conn = _get_conn()
-    try:
-        with conn, conn.cursor() as cur:
+    with _get_conn() as conn:
+        with conn.cursor() as cur:
             cur.execute(sql, {"faena": faena, "tipo": tipo})
-            return _ok([r["equipo_codigo"] for r in cur.fetchall()])
-    finally:
-        conn.close()
+            return [r["equipo_codigo"] for r in cur.fetchall()]
+
+
+catalogo.registrar("tiempo-fuera", "faenas", _faenas, calentar=lambda: [(_schema(),)])
+catalogo.registrar("tiempo-fuera", "tipos", _tipos)
+catalogo.registrar("tiempo-fuera", "equipos", _equipos)
+catalogo.registrar("tiempo-fuera", "tree", _arbol, calentar=lambda: [(_schema(),)])
 
 
 # --------- Data principal ----------
-@tfuera_bp.get("")
-def get_tiempo_fuera():
-    """
-    Tiempo fuera de servicio por equipo:
-      - cuenta de períodos fuera
-      - promedio de días fuera
-    Filtros: faena (oblig/opt), tipo (opt), equipo (opt).
-    Optimizado con ventana (MIN() FILTER) para evitar subconsultas costosas.
-    """
-    faena  = request.args.get("faena", "").strip()
-    tipo   = request.args.get("tipo", "").strip()
-    equipo = request.args.get("equipo", "").strip()
-    limit  = int(request.args.get("limit", 500))
-    offset = int(request.args.get("offset", 0))
+_CLAVES = ("promedio_dias_fuera_servicio", "equipo_codigo")
+_CLAVES_DESC = (True, False)
 
-    s = _schema()
+def _clave(r): return (r["promedio_dias_fuera_servicio"], r["equipo_codigo"])
 
-    sql = f"""
+def _sql_tiempo_fuera(s: str, keyset: str = "") -> str:
+    """Consulta base (sin LIMIT) sobre el esquema `s`; `keyset` es el WHERE del cursor o ""."""
+    return f"""
     -- 1) Turnos (filtrados por faena desde el origen para recortar el set)
     WITH turnos AS (
         SELECT equipo_codigo, fecha_inicio::timestamp AS fecha, distrito
@@ -172,20 +213,15 @@ def get_tiempo_fuera():
         FROM {s}.v_registro_diario_spot_export
         WHERE (%(faena)s = '' OR distrito = %(faena)s)
     ),
-    -- 2) Notificaciones de falla (solo de equipos que existen en la faena filtrada)
+    -- 2) Notificaciones de falla (solo de equipos que existen en la faena filtrada;
+    --    el conjunto viene precalculado desde el índice faena -> equipos)
     notif AS (
         SELECT
           n.codigo_interno::text AS equipo_codigo,
           n.fecha::timestamp     AS fecha
         FROM {s}.v_notificacion_reporte n
         WHERE n.motivo = 'FALLA - DAÑO'
-          AND (
-                %(faena)s = ''
-            OR  EXISTS (
-                  SELECT 1 FROM turnos t
-                  WHERE t.equipo_codigo = n.codigo_interno::text
-                )
-          )
+          AND (%(faena)s = '' OR n.codigo_interno::text = ANY(%(equipos_faena)s::text[]))
     ),
     -- 3) Unimos eventos y calculamos el próximo turno con ventana
     eventos AS (
@@ -230,29 +266,121 @@ def get_tiempo_fuera():
             UNION ALL SELECT equipo_codigo, equipo FROM {s}.v_registro_diario_spot_export
         ) r
         WHERE r.equipo_codigo IS NOT NULL AND r.equipo IS NOT NULL
+    ),
+    resumen AS (
+        SELECT
+          d.equipo_codigo,
+          COUNT(*)                                   AS total_periodos_fuera_servicio,
+          ROUND(AVG(d.dias_fuera)::numeric, 2)       AS promedio_dias_fuera_servicio
+        FROM difs d
+        LEFT JOIN equipos_tipo et ON et.equipo_codigo = d.equipo_codigo
+        WHERE (%(equipo)s = '' OR d.equipo_codigo = %(equipo)s)
+          AND (%(tipo)s   = '' OR et.tipo_equipo = %(tipo)s)
+        GROUP BY d.equipo_codigo
     )
-    SELECT
-      d.equipo_codigo,
-      COUNT(*)                                   AS total_periodos_fuera_servicio,
-      ROUND(AVG(d.dias_fuera)::numeric, 2)       AS promedio_dias_fuera_servicio
-    FROM difs d
-    LEFT JOIN equipos_tipo et ON et.equipo_codigo = d.equipo_codigo
-    WHERE (%(equipo)s = '' OR d.equipo_codigo = %(equipo)s)
-      AND (%(tipo)s   = '' OR et.tipo_equipo = %(tipo)s)
-    GROUP BY d.equipo_codigo
-    ORDER BY promedio_dias_fuera_servicio DESC NULLS LAST, d.equipo_codigo
-    LIMIT %(limit)s OFFSET %(offset)s;
+    SELECT *
+    FROM resumen
+    {keyset}
+    ORDER BY promedio_dias_fuera_servicio DESC NULLS LAST, equipo_codigo
+"""
+
+
+@tfuera_bp.get("")
+def get_tiempo_fuera():
     """
+    Tiempo fuera de servicio por equipo:
+      - cuenta de períodos fuera
+      - promedio de días fuera
+    Filtros: faena (oblig/opt), tipo (opt), equipo (opt).
+    Optimizado con ventana (MIN() FILTER) para evitar subconsultas costosas.
+    Con motor=memoria (o TFUERA_MOTOR) se calcula con el motor en memoria.
+    """
+    faena  = request.args.get("faena", "").strip()
+    tipo   = request.args.get("tipo", "").strip()
+    equipo = request.args.get("equipo", "").strip()
+    limit  = int(request.args.get("limit", 500))
+    offset = int(request.args.get("offset", 0))
+    token  = request.args.get("cursor", "").strip()
 
-    params = {"faena": faena, "tipo": tipo, "equipo": equipo, "limit": limit, "offset": offset}
+    s = _schema()
 
-    conn = _get_conn()
+    # Keyset sobre (promedio DESC NULLS LAST, equipo_codigo); con cursor, offset se ignora
     try:
-        with conn, conn.cursor() as cur:
-            # si quieres, sube un poco el timeout local (p.ej. 90s)
-            cur.execute("SET LOCAL statement_timeout = '90s';")
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-        return _ok(rows)
-    finally:
-        conn.close()
\ No newline at end of file
+        pred, params_cursor, anterior = cursor_pag.desde_token(
+            token, _CLAVES, _CLAVES_DESC, lambda n: f"%({n})s"
+        )
+    except cursor_pag.CursorInvalido as e:
+        return _err(str(e))
+    keyset = f"WHERE {pred}" if pred else ""
+
+    # ?format=columnar: {"columns", "rows"} (SQL con cursor de tuplas)
+    como_tabla = columnar.pedido()
+
+    motor = (request.args.get("motor") or current_app.config.get("TFUERA_MOTOR") or "sql").strip().lower()
+    if motor == "memoria":
+        rows = motor_tf.calcular_tiempo_fuera(s, faena=faena, tipo=tipo, equipo=equipo)
+        if anterior:
+            rows = cursor_pag.desde_en_memoria(rows, _clave, _CLAVES_DESC, *anterior)[:limit]
+        else:
+            rows = rows[offset:offset + limit]
+        siguiente = cursor_pag.siguiente([_clave(r) for r in rows], limit, anterior)
+        return _ok(columnar.desde_dicts(rows) if como_tabla else rows, next_cursor=siguiente)
+
+    if anterior:
+        offset = anterior[1]
+
+    sql = _sql_tiempo_fuera(s, keyset) + "    LIMIT %(limit)s OFFSET %(offset)s;\n"
+
+    equipos_faena = indice_tf.equipos_de_faena(s, faena) if faena else []
+    params = {"faena": faena, "tipo": tipo, "equipo": equipo, "limit": limit, "offset": offset,
+              "equipos_faena": equipos_faena, **params_cursor}
+
+    # Peticiones idénticas concurrentes comparten una sola ejecución
+    rows = _vuelo.ejecutar(
+        (clave_sql(sql, params), como_tabla), lambda: _consultar(sql, params, como_tabla)
+    )
+    claves = columnar.claves(rows, _CLAVES) if como_tabla else [_clave(r) for r in rows]
+    return _ok(rows, next_cursor=cursor_pag.siguiente(claves, limit, anterior))
+
+
+def filas_export(params: Mapping) -> Iterable[dict]:
+    """Resultado completo (sin paginar) con los mismos filtros del listado."""
+    faena  = (params.get("faena") or "").strip()
+    tipo   = (params.get("tipo") or "").strip()
+    equipo = (params.get("equipo") or "").strip()
+    s = _schema()
+    motor = (params.get("motor") or current_app.config.get("TFUERA_MOTOR") or "sql").strip().lower()
+
+    if motor == "memoria":
+        # el motor en memoria entrega el resultado ya agregado (una fila por equipo)
+        def filas():
+            yield from motor_tf.calcular_tiempo_fuera(s, faena=faena, tipo=tipo, equipo=equipo)
+        return filas()
+
+    def filas():
+        equipos_faena = indice_tf.equipos_de_faena(s, faena) if faena else []
+        p = {"faena": faena, "tipo": tipo, "equipo": equipo, "equipos_faena": equipos_faena}
+        yield from erp.filas_servidor(_sql_tiempo_fuera(s), p, "reportes")
+    return filas()
+
+
+registrar_fuente("tiempo-fuera", filas_export)
+
+
+@tfuera_bp.get("/export")
+def export_tiempo_fuera():
+    """Resultado completo en NDJSON/CSV (?format=); mismos filtros que el listado, sin paginar."""
+    formato = formato_valido(request.args.get("format"))
+    if formato is None:
+        return _err("Parámetro 'format' inválido (ndjson | csv).")
+    nombre = f"tiempo_fuera_{request.args.get('faena', '').strip() or 'todas'}"
+    return respuesta_stream(filas_export(request.args), formato, nombre)
+
+
+def _consultar(sql: str, params: dict, como_tabla: bool = False):
+    # Consulta pesada: pool "reportes" (statement_timeout propio, no compite con los filtros)
+    fabrica = psycopg2.extensions.cursor if como_tabla else None  # None: RealDictCursor del pool
+    with _get_conn("reportes") as conn:
+        with conn.cursor(cursor_factory=fabrica) as cur:
+            preparadas.ejecutar(cur, sql, params)
+            return columnar.desde_cursor(cur) if como_tabla else cur.fetchall()
@@ -1,5 +1,5 @@
 # backend/models/models.py
-from sqlalchemy import Column, Integer, String, Numeric, Date, Boolean, ForeignKey, DateTime, BigInteger, CheckConstraint, Text
+from sqlalchemy import Column, Integer, String, Numeric, Date, Boolean, ForeignKey, DateTime, BigInteger, CheckConstraint, Text, Float, CHAR, Index
 from sqlalchemy.orm import relationship
 from extensions import db
 
@@ -185,4 +185,51 @@ class ProximoMantenimiento(db.Model):
     dias_restantes = Column(Numeric(15, 2))
     fecha_prox_otm = Column(Date)
     horometro_prox_otm = Column(Numeric(15, 2))
-    equipo = relationship('Equipo', back_populates='proximo_mantenimiento')
\ No newline at end of file
+    equipo = relationship('Equipo', back_populates='proximo_mantenimiento')
+
+# Rollup del dashboard (modo "rollup"): se reconstruyen completas en cada sync
+# (services/actualizar/actualizar.py, ejecutar_proceso_dashboard)
+class DashboardEvento(db.Model):
+    __tablename__ = 'dashboard_evento'
+    dashboard_evento_id = Column(BigInteger, primary_key=True)
+    fecha_evento = Column(Date, nullable=False)
+    fecha_orden = Column(DateTime)
+    faena = Column(String(200))
+    maquina = Column(String(200))
+    con_equipo = Column(Boolean, nullable=False)
+    causa = Column(String(500), nullable=False)
+    mes = Column(CHAR(7))
+    costo = Column(Float(53), nullable=False)
+    horas = Column(Float(53), nullable=False)
+    es_otr = Column(Boolean, nullable=False)
+    cerrada = Column(Boolean, nullable=False)
+    # campos ya formateados para la tabla de recientes
+    ot = Column(String(200))
+    fecha = Column(String(40))
+    maquina_txt = Column(String(200))
+    causa_txt = Column(String(500))
+    estado = Column(String(200))
+
+Index('ix_dashboard_evento_fecha', DashboardEvento.fecha_evento)
+Index('ix_dashboard_evento_orden', DashboardEvento.fecha_orden.desc().nulls_last())
+# recientes filtrados por máquina (ORDER BY fecha_orden DESC LIMIT N)
+Index('ix_dashboard_evento_maquina', DashboardEvento.maquina, DashboardEvento.fecha_orden.desc().nulls_last())
+
+class DashboardDiario(db.Model):
+    __tablename__ = 'dashboard_diario'
+    dashboard_diario_id = Column(BigInteger, primary_key=True)
+    dia = Column(Date, nullable=False)
+    faena = Column(String(200))
+    maquina = Column(String(200))
+    con_equipo = Column(Boolean, nullable=False)
+    causa = Column(String(500), nullable=False)
+    mes = Column(CHAR(7))
+    filas = Column(Integer, nullable=False)
+    costo = Column(Float(53), nullable=False)
+    horas = Column(Float(53), nullable=False)
+    mttr_horas = Column(Float(53), nullable=False)
+    mttr_n = Column(Integer, nullable=False)
+    otr_n = Column(Integer, nullable=False)
+    cerradas = Column(Integer, nullable=False)
+
+Index('ix_dashboard_diario_dia', DashboardDiario.dia, DashboardDiario.faena, DashboardDiario.maquina)
@@ -1,22 +1,51 @@
 # backend/routes/home/diagnostics.py
-from flask import Blueprint, jsonify, request
-from sqlalchemy import text
-from database.database_erp import get_erp_db
+from flask import Blueprint, current_app, jsonify, request
+import time
+import json
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+import psycopg2.extensions
+from sqlalchemy import event, text
+from database import erp, preparadas
+from database.database import engine, engine_lectura, get_db, get_db_lectura, get_db_stream
 from datetime import datetime, timedelta
+from services.cache.cache import caches
+from services.cache.singleflight import vuelos
+from services.catalogo import catalogo
+from services.calentamiento import calentamiento
+from database.pool import pools
+from services.dashboard.consultas import SQL_AGREGADOS, filtros_dashboard
+from services.serializacion import json_rapido
+from services.compresion import compresion
 
 home_diag_bp = Blueprint("home_diag_bp", __name__)
 
+# Rutas que /compresion puede pedir contra la propia app (sin query params arbitrarios)
+RUTAS_COMPRESION = (
+    "/endpoints/home/dashboard",
+    "/query/costos/filters/tree",
+    "/query/tiempo-fuera/filters/tree",
+    "/query/proxmtto/filters/tree",
+)
+
+
+def _sin_benchmarks():
+    """404 salvo que DIAGNOSTICO_BENCHMARKS esté activo (los benchmarks no llevan autenticación)."""
+    if current_app.config.get("DIAGNOSTICO_BENCHMARKS"):
+        return None
+    return jsonify({"ok": False, "error": "Benchmarks deshabilitados (DIAGNOSTICO_BENCHMARKS)."}), 404
+
 @home_diag_bp.get("/ping")
 def ping_basic():
     """Sanity check: conexión al ERP"""
-    db = next(get_erp_db())
     try:
-        db.execute(text("SELECT 1"))
+        with erp.conexion("interactivo") as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
         return jsonify(ok=True), 200
     except Exception as e:
         return jsonify(ok=False, error=str(e)), 500
-    finally:
-        db.close()
 
 @home_diag_bp.get("/ping/vista")
 def ping_views():
@@ -28,20 +57,269 @@ def ping_views():
         # alguna de las tablas de 'equipo' (usa cualquiera que tengas permiso)
         "V_REGISTRO_DIARIO_SPOT_EXPORT": "SELECT 1 FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_SPOT_EXPORT LIMIT 1",
     }
-    db = next(get_erp_db())
     out = {}
     code = 200
-    try:
+    with erp.conexion("interactivo") as conn:
         for name, q in checks.items():
             try:
-                db.execute(text(q))
+                # autocommit: un error no invalida los chequeos siguientes
+                with conn.cursor() as cur:
+                    cur.execute(q)
                 out[name] = "ok"
             except Exception as e:
                 out[name] = f"error: {e}"
                 code = 500
-        return jsonify(out), code
+    return jsonify(out), code
+
+@home_diag_bp.get("/cache")
+def cache_stats():
+    """
+    Estado de las cachés en memoria (entradas, bytes aprox., hits/misses, evictions)
+    y del coalescing de consultas (ejecuciones reales vs. ahorradas).
+    """
+    return jsonify({
+        "caches": [c.estadisticas() for c in caches()],
+        "singleflight": [v.estadisticas() for v in vuelos()],
+        "catalogo": catalogo.ultimo_calentamiento(),
+        "calentamiento_sync": calentamiento.ultimo(),
+    }), 200
+
+@home_diag_bp.get("/pool")
+def pool_stats():
+    """Pools de conexiones psycopg2 (en uso, esperando, creadas, recicladas...)."""
+    return jsonify({"pools": [p.estadisticas() for p in pools()]}), 200
+
+@home_diag_bp.get("/preparadas")
+def preparadas_stats():
+    """Sentencias preparadas: cuántas veces se preparó cada una vs. cuántas se reutilizó."""
+    return jsonify({"preparadas": [p.estadisticas() for p in preparadas.preparadas()]}), 200
+
+@home_diag_bp.get("/preparadas/planificacion")
+def preparadas_planificacion():
+    """
+    Mide (con EXPLAIN, sin ejecutar) la consulta de agregados del dashboard
+    como texto vs. como EXECUTE de la sentencia preparada, `n` veces cada una.
+    planning_ms es el "Planning Time" del ERP; total_ms incluye envío y parseo.
+    """
+    bloqueo = _sin_benchmarks()
+    if bloqueo is not None:
+        return bloqueo
+    n = max(1, min(request.args.get("n", default=5, type=int), 50))
+    date_to = datetime.now()
+    date_from = date_to - timedelta(days=90)
+    where_clause, params = filtros_dashboard(date_from, date_to, None, None)
+    prep = preparadas.preparar(SQL_AGREGADOS.format(where_clause=where_clause))
+
+    def medir(cur, sql, args):
+        planning, total = [], []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            cur.execute("EXPLAIN (SUMMARY ON, FORMAT JSON) " + sql, args)
+            plan = cur.fetchone()[0]
+            total.append((time.perf_counter() - t0) * 1000)
+            planning.append(float(plan[0].get("Planning Time", 0.0)))
+        return {"planning_ms": round(sum(planning) / n, 3), "total_ms": round(sum(total) / n, 3)}
+
+    try:
+        with erp.conexion("interactivo") as conn:
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                texto = medir(cur, prep.sql, params)
+                preparadas.asegurar(cur, prep)
+                preparada = medir(cur, prep.sql_execute, prep.valores(params))
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+    return jsonify({
+        "ok": True,
+        "repeticiones": n,
+        "texto": texto,
+        "preparada": preparada,
+        "ahorro_planning_ms": round(texto["planning_ms"] - preparada["planning_ms"], 3),
+        "ahorro_total_ms": round(texto["total_ms"] - preparada["total_ms"], 3),
+    }), 200
+
+# ---- idas y vueltas a la base local (para /sesiones; solo cuenta el hilo que mide) ----
+_conteo = threading.local()
+
+def _sumar(n: int = 1) -> None:
+    if getattr(_conteo, "idas", None) is not None:
+        _conteo.idas += n
+
+def _en_transaccion(dbapi_conn) -> bool:
+    return dbapi_conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+def _idas_consulta(conn, cursor, statement, parameters, context, executemany):
+    dbapi_conn = conn.connection.dbapi_connection
+    # fuera de autocommit psycopg2 manda un BEGIN aparte antes de la primera consulta
+    _sumar(1 if dbapi_conn.autocommit or _en_transaccion(dbapi_conn) else 2)
+
+def _idas_fin(conn):
+    if _en_transaccion(conn.connection.dbapi_connection):
+        _sumar()  # COMMIT / ROLLBACK
+
+def _idas_checkout(dbapi_conn, registro, proxy):
+    _sumar()  # pool_pre_ping: SELECT 1 al sacar la conexión del pool
+
+def _idas_reset(dbapi_conn, registro, estado):
+    if _en_transaccion(dbapi_conn):
+        _sumar()  # ROLLBACK al devolverla
+
+def _escuchas():
+    for e in (engine, engine_lectura):
+        yield e, "before_cursor_execute", _idas_consulta
+        yield e, "commit", _idas_fin
+        yield e, "rollback", _idas_fin
+        yield e.pool, "checkout", _idas_checkout
+        yield e.pool, "reset", _idas_reset
+
+_midiendo = 0  # mediciones de /sesiones en curso
+_midiendo_lock = threading.Lock()
+
+@contextmanager
+def _contando_idas():
+    """Engancha los listeners solo mientras dura una medición: fuera de /sesiones las consultas no los pagan."""
+    global _midiendo
+    with _midiendo_lock:
+        if _midiendo == 0:
+            for objetivo, evento, fn in _escuchas():
+                event.listen(objetivo, evento, fn)
+        _midiendo += 1
+    try:
+        yield
     finally:
-        db.close()
+        with _midiendo_lock:
+            _midiendo -= 1
+            if _midiendo == 0:
+                for objetivo, evento, fn in _escuchas():
+                    event.remove(objetivo, evento, fn)
+
+@home_diag_bp.get("/sesiones")
+def sesiones_benchmark():
+    """
+    Simula `n` peticiones de lectura contra la base local (una consulta corta
+    cada una) con cada tipo de sesión: get_db() (transacción + commit),
+    get_db_lectura() (autocommit) y get_db_stream() (transacción descartada).
+    Devuelve peticiones/s e idas y vueltas al servidor por petición (pre-ping,
+    BEGIN, consulta, COMMIT/ROLLBACK).
+    """
+    bloqueo = _sin_benchmarks()
+    if bloqueo is not None:
+        return bloqueo
+    n = max(1, min(request.args.get("n", default=200, type=int), 500))
+    consulta = text("SELECT 1")
+
+    def medir(fabrica):
+        _conteo.idas = 0
+        try:
+            t0 = time.perf_counter()
+            for _ in range(n):
+                gen = fabrica()
+                next(gen).execute(consulta).scalar()
+                next(gen, None)  # fin de la petición: commit/cierre de la dependencia
+            seg = time.perf_counter() - t0
+            idas = _conteo.idas
+        finally:
+            _conteo.idas = None
+        return {
+            "peticiones_seg": round(n / seg, 1) if seg else None,
+            "ms_por_peticion": round(seg * 1000 / n, 3),
+            "idas_por_peticion": round(idas / n, 2),
+        }
+
+    try:
+        with _contando_idas():
+            resultados = {
+                "get_db": medir(get_db),
+                "get_db_lectura": medir(get_db_lectura),
+                "get_db_stream": medir(get_db_stream),
+            }
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify({"ok": True, "peticiones": n, **resultados}), 200
+
+@home_diag_bp.get("/json")
+def json_benchmark():
+    """
+    Serializa `filas` filas sintéticas (tipos como los del ERP: Decimal, fechas,
+    texto, NULL) con el proveedor JSON de la app vs. json de la stdlib con el
+    mismo default. Promedio de `n` repeticiones, en ms.
+    """
+    bloqueo = _sin_benchmarks()
+    if bloqueo is not None:
+        return bloqueo
+    filas = max(1, min(request.args.get("filas", default=20000, type=int), 50000))
+    n = max(1, min(request.args.get("n", default=3, type=int), 5))
+    base = datetime(2024, 1, 1, 8, 30)
+    data = [{
+        "id": i,
+        "equipo": f"EQ-{i % 400:04d}",
+        "faena": f"Faena {i % 12}",
+        "costo": Decimal(i) / Decimal(7),
+        "horas": i * 0.25,
+        "fecha": base + timedelta(hours=i),
+        "dia": (base + timedelta(days=i % 365)).date(),
+        "motivo": None if i % 5 else "Cambio de filtro",
+    } for i in range(filas)]
+
+    def medir(fn):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            tam = len(fn(data))
+        return {"ms": round((time.perf_counter() - t0) * 1000 / n, 2), "bytes": tam}
+
+    app_json = medir(json_rapido.dumps_bytes)
+    stdlib = medir(lambda d: json.dumps(d, default=json_rapido._default, ensure_ascii=False).encode())
+    return jsonify({
+        "filas": filas,
+        "repeticiones": n,
+        "motor": json_rapido.motor(),
+        "proveedor": app_json,
+        "stdlib": stdlib,
+        "aceleracion": round(stdlib["ms"] / app_json["ms"], 1) if app_json["ms"] else None,
+    }), 200
+
+@home_diag_bp.get("/compresion")
+def compresion_benchmark():
+    """
+    Pide `ruta` (GET de la propia app, sin comprimir; una de RUTAS_COMPRESION) y
+    mide cada codificación y nivel sobre ese payload real: bytes resultantes,
+    % ahorrado y ms de CPU (promedio de `n` repeticiones).
+    """
+    bloqueo = _sin_benchmarks()
+    if bloqueo is not None:
+        return bloqueo
+    ruta = request.args.get("ruta") or RUTAS_COMPRESION[0]
+    if ruta not in RUTAS_COMPRESION:
+        return jsonify({"ok": False, "error": f"Ruta no permitida (disponibles: {', '.join(RUTAS_COMPRESION)})."}), 400
+    n = max(1, min(request.args.get("n", default=5, type=int), 10))
+    resp = current_app.test_client().get(ruta)
+    datos = resp.get_data()
+    niveles = {"gzip": [1, 6, 9]}
+    if "br" in compresion.codificaciones():
+        niveles["br"] = [1, 4, 6, 11]
+
+    resultados = []
+    for codificacion, lista in niveles.items():
+        for nivel in lista:
+            t0 = time.perf_counter()
+            for _ in range(n):
+                salida = compresion.comprimir(datos, codificacion, nivel)
+            ms = (time.perf_counter() - t0) * 1000 / n
+            resultados.append({
+                "codificacion": codificacion,
+                "nivel": nivel,
+                "bytes": len(salida),
+                "ahorro_pct": round(100 * (1 - len(salida) / len(datos)), 1) if datos else 0.0,
+                "ms": round(ms, 3),
+            })
+    return jsonify({
+        "ruta": ruta,
+        "status": resp.status_code,
+        "bytes_original": len(datos),
+        "umbral_bytes": compresion.COMPRESION_MIN_BYTES,
+        "por_defecto": {"gzip": compresion.COMPRESION_NIVEL_GZIP, "br": compresion.COMPRESION_CALIDAD_BR},
+        "resultados": resultados,
+    }), 200
 
 @home_diag_bp.get("/sample")
 def sample_query():
@@ -63,15 +341,15 @@ def sample_query():
         date_from = datetime.now() - timedelta(days=90)
         date_to = datetime.now()
 
-    conds = ["COALESCE(rotm.fecha_inicio, pro.fecha_log, otm.fecha_solicitud::timestamp) BETWEEN :dfrom AND :dto"]
+    conds = ["COALESCE(rotm.fecha_inicio, pro.fecha_log, otm.fecha_solicitud::timestamp) BETWEEN %(dfrom)s AND %(dto)s"]
     params = {"dfrom": date_from, "dto": date_to}
 
     if site and site.upper() != "TODOS":
-        conds.append("rotm.nombre_faena = :site")
+        conds.append("rotm.nombre_faena = %(site)s")
         params["site"] = site
 
     if machine and machine.upper() != "TODAS":
-        conds.append("eq.equipo_codigo = :machine")
+        conds.append("eq.equipo_codigo = %(machine)s")
         params["machine"] = machine
 
     where_clause = " AND ".join(conds)
@@ -127,17 +405,12 @@ WHERE {where_clause}
 ORDER BY COALESCE(otm.fecha_solicitud, rotm.fecha_inicio, pro.fecha_log) DESC
 LIMIT 5
 """
-    db = next(get_erp_db())
     try:
-        rows = db.execute(text(sql), params).mappings().all()
-        # serializar seguro
-        def conv(v):
-            from decimal import Decimal
-            if v is None: return None
-            if hasattr(v, "isoformat"): return v.isoformat()
-            if isinstance(v, Decimal): return float(v)
-            return v
-        data = [{k: conv(v) for k, v in r.items()} for r in rows]
+        with erp.conexion("interactivo") as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+        data = rows
         return jsonify({"count": len(data), "rows": data, "filters": {
             "from": date_from.isoformat(), "to": date_to.isoformat(),
             "site": site, "machine": machine
@@ -146,5 +419,3 @@ LIMIT 5
         # devolvemos el error para verlo desde el front
         import traceback
         return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
-    finally:
-        db.close()
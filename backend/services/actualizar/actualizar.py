@@ -10,6 +10,11 @@ import pandas as pd
 from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
+from database import erp
+from services.calentamiento import calentamiento
+from services.dashboard.agregacion import fila_reciente
+from services.dashboard.consultas import SQL_EVENTOS, SQL_ROLLUP_DIARIO, ddl_rollup
+
 warnings.filterwarnings("ignore", category=UserWarning, module="pandas.io.sql")
 
 # ============================================================
@@ -18,13 +23,6 @@ warnings.filterwarnings("ignore", category=UserWarning, module="pandas.io.sql")
 ENV_PATH = Path(__file__).resolve().parents[2] / ".env"
 load_dotenv(dotenv_path=ENV_PATH)
 
-ERP_DB_HOST = os.getenv("ERP_DB_HOST")
-ERP_DB_PORT = os.getenv("ERP_DB_PORT", "5432")
-ERP_DB_NAME = os.getenv("ERP_DB_NAME")
-ERP_DB_USER = os.getenv("ERP_DB_USER")
-ERP_DB_PASSWORD = os.getenv("ERP_DB_PASSWORD")
-ERP_DB_SSLMODE = os.getenv("ERP_DB_SSLMODE", "disable")
-
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME")
@@ -32,10 +30,6 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_SSLMODE = os.getenv("DB_SSLMODE", "disable")
 
-DB_ORIGEN = (
-    f"dbname={ERP_DB_NAME} user={ERP_DB_USER} password={ERP_DB_PASSWORD} "
-    f"host={ERP_DB_HOST} port={ERP_DB_PORT} sslmode={ERP_DB_SSLMODE}"
-)
 DB_DESTINO = (
     f"dbname={DB_NAME} user={DB_USER} password={DB_PASSWORD} "
     f"host={DB_HOST} port={DB_PORT} sslmode={DB_SSLMODE}"
@@ -406,9 +400,25 @@ def ejecutar_proceso_compras(conn_src, conn_dst, callback=None):
     }
 
 # ============================================================
-# PROCESO COMPLETO
+# PROCESO ROLLUP DASHBOARD
 # ============================================================
-def ejecutar_proceso(callback: Optional[Callable[..., None]] = None) -> dict:
+COLUMNAS_EVENTO = (
+    "fecha_evento", "fecha_orden", "faena", "maquina", "con_equipo", "causa", "mes",
+    "costo", "horas", "es_otr", "cerrada",
+    "ot", "fecha", "maquina_txt", "causa_txt", "estado",
+)
+LOTE_EVENTOS = int(os.getenv("DASHBOARD_LOTE_EVENTOS", "5000"))
+
+def _registro_evento(r: dict) -> tuple:
+    rec = fila_reciente(r, r["costo"])
+    return (
+        r["fecha_evento"], r["fecha_orden"], r["faena"], r["maquina"], r["con_equipo"], r["causa"], r["mes"],
+        r["costo"], r["horas"], r["es_otr"], r["cerrada"],
+        rec["ot"], rec["fecha"], rec["maquina"], rec["causa"], rec["estado"],
+    )
+
+def ejecutar_proceso_dashboard(conn_src, conn_dst, callback=None):
+    """Materializa eventos del dashboard y su rollup diario (día × faena × equipo × causa)."""
     def _ping(paso: str, p: int | None = None):
         if callback:
             try:
@@ -416,36 +426,168 @@ def ejecutar_proceso(callback: Optional[Callable[..., None]] = None) -> dict:
             except Exception:
                 pass
 
-    _ping("Conectando a bases de datos", 1)
-    with psycopg2.connect(DB_ORIGEN) as conn_src, psycopg2.connect(DB_DESTINO) as conn_dst:
-        conn_src.set_session(readonly=True, autocommit=False)
-        conn_dst.set_session(autocommit=False)
+    # Cursor con nombre (server-side) en el ERP: los eventos llegan de a
+    # LOTE_EVENTOS y se insertan a medida que llegan, sin tenerlos todos en memoria.
+    # DELETE (no TRUNCATE) dentro de una sola transacción: las lecturas siguen
+    # viendo el rollup anterior hasta el commit.
+    _ping("Extrayendo eventos dashboard", 91)
+    eventos = 0
+    with conn_src.cursor(name="dashboard_eventos") as src, conn_dst.cursor() as cur:
+        src.itersize = LOTE_EVENTOS
+        src.execute(SQL_EVENTOS)
+        for sentencia in ddl_rollup():
+            cur.execute(sentencia)
+        cur.execute("DELETE FROM public.dashboard_evento;")
+        cur.execute("DELETE FROM public.dashboard_diario;")
+        while True:
+            filas = src.fetchmany(LOTE_EVENTOS)
+            if not filas:
+                break
+            nombres = [d[0] for d in src.description]
+            execute_values(
+                cur,
+                f"INSERT INTO public.dashboard_evento ({', '.join(COLUMNAS_EVENTO)}) VALUES %s;",
+                [_registro_evento(dict(zip(nombres, fila))) for fila in filas],
+                page_size=LOTE_EVENTOS,
+            )
+            eventos += len(filas)
 
-        with conn_src.cursor() as c:
-            c.execute("SET LOCAL statement_timeout = '10min';")
+        _ping("Actualizando rollup dashboard", 93)
+        cur.execute(SQL_ROLLUP_DIARIO)
+        dias = cur.rowcount
+        cur.execute("ANALYZE public.dashboard_evento;")
+        cur.execute("ANALYZE public.dashboard_diario;")
+    conn_dst.commit()
 
-        # Insertar catálogos desde remoto
-        _ping("Insertando catálogos desde remoto", 2)
-        with conn_dst.cursor() as cur:
-            cur.execute("CALL public.insertar_modelos_desde_remoto();")
-            cur.execute("CALL public.insertar_marcas_desde_remoto();")
-            cur.execute("CALL public.insertar_tipos_equipo_desde_remoto();")
-            cur.execute("CALL public.insertar_equipos_desde_remoto();")
-            cur.execute("CALL public.insertar_proximo_mantenimiento_desde_remoto();")
-            cur.execute("CALL public.insertar_programas_desde_remoto();")
-            cur.execute("CALL public.insertar_orden_man_desde_remoto();")
-        conn_dst.commit()
+    return {
+        "eventos_insertados": eventos,
+        "filas_rollup": int(dias),
+    }
+
+# ============================================================
+# POST-SYNC
+# ============================================================
+_post_sync: list[Callable[[], Optional[dict]]] = []
+
+def registrar_post_sync(fn: Callable[[], Optional[dict]]):
+    """Registra una función que se ejecuta al terminar ejecutar_proceso() (también
+    si falla después de haber confirmado datos en la base local).
+
+    Se usa para refrescar estructuras en memoria derivadas del ERP. Puede
+    devolver un dict que se agrega al resultado del proceso.
+    """
+    if fn not in _post_sync:
+        _post_sync.append(fn)
+    return fn
+
+def _ejecutar(funciones: list[Callable[[], Optional[dict]]]) -> dict:
+    resultados = {}
+    for fn in list(funciones):
+        nombre = f"{fn.__module__}.{fn.__name__}"
+        try:
+            resultados[nombre] = fn() or "ok"
+        except Exception as e:
+            resultados[nombre] = f"error: {e}"
+    return resultados
+
+def ejecutar_post_sync() -> dict:
+    return _ejecutar(_post_sync)
+
+_fin_sync: list[Callable[[], Optional[dict]]] = []
+
+def registrar_fin_sync(fn: Callable[[], Optional[dict]]):
+    """Como registrar_post_sync(), pero se ejecuta después del calentamiento
+    (cuando las cachés que el sync no vacía ya tienen los datos nuevos)."""
+    if fn not in _fin_sync:
+        _fin_sync.append(fn)
+    return fn
+
+def ejecutar_fin_sync() -> dict:
+    return _ejecutar(_fin_sync)
+
+def refrescar_tras_sync(callback: Optional[Callable[..., None]] = None) -> dict:
+    """Post-sync, calentamiento (requiere app context) y fin-sync, en ese orden."""
+    def _ping(paso: str, p: int | None = None):
+        if callback:
+            try:
+                callback(paso=paso, progreso=p)
+            except Exception:
+                pass
+
+    _ping("Refrescando datos en memoria", 95)
+    post_sync = ejecutar_post_sync()
+
+    # Etapa 4: precalcular dashboard por faena y catálogo de filtros
+    _ping("Calentando cachés", 97)
+    resultado_calentamiento = calentamiento.ejecutar()
 
-        # Pipeline 1: Reprogramaciones
-        resultado_reprog = ejecutar_proceso_reprogramacion(conn_src, conn_dst, callback)
+    return {
+        "post_sync": post_sync,
+        "calentamiento": resultado_calentamiento,
+        "fin_sync": ejecutar_fin_sync(),
+    }
+
+# ============================================================
+# PROCESO COMPLETO
+# ============================================================
+def ejecutar_proceso(callback: Optional[Callable[..., None]] = None) -> dict:
+    def _ping(paso: str, p: int | None = None):
+        if callback:
+            try:
+                callback(paso=paso, progreso=p)
+            except Exception:
+                pass
 
-        # Pipeline 2: Compras
-        resultado_compras = ejecutar_proceso_compras(conn_src, conn_dst, callback)
+    _ping("Conectando a bases de datos", 1)
+    confirmado = False  # algún paso ya escribió en la base local
+    try:
+        # Origen: pool ERP "sync" (solo lectura, statement_timeout y application_name propios)
+        with erp.conexion("sync") as conn_src, psycopg2.connect(DB_DESTINO) as conn_dst:
+            conn_dst.set_session(autocommit=False)
+
+            # Insertar catálogos desde remoto
+            _ping("Insertando catálogos desde remoto", 2)
+            with conn_dst.cursor() as cur:
+                cur.execute("CALL public.insertar_modelos_desde_remoto();")
+                cur.execute("CALL public.insertar_marcas_desde_remoto();")
+                cur.execute("CALL public.insertar_tipos_equipo_desde_remoto();")
+                cur.execute("CALL public.insertar_equipos_desde_remoto();")
+                cur.execute("CALL public.insertar_proximo_mantenimiento_desde_remoto();")
+                cur.execute("CALL public.insertar_programas_desde_remoto();")
+                cur.execute("CALL public.insertar_orden_man_desde_remoto();")
+            conn_dst.commit()
+            confirmado = True
+
+            # Pipeline 1: Reprogramaciones
+            resultado_reprog = ejecutar_proceso_reprogramacion(conn_src, conn_dst, callback)
+
+            # Pipeline 2: Compras
+            resultado_compras = ejecutar_proceso_compras(conn_src, conn_dst, callback)
+
+            # Pipeline 3: Rollup del dashboard. Es derivado: si falla queda el rollup
+            # anterior y el sync sigue, porque lo de arriba ya está confirmado.
+            try:
+                resultado_dashboard = ejecutar_proceso_dashboard(conn_src, conn_dst, callback)
+            except Exception as e:
+                conn_dst.rollback()
+                conn_src.rollback()
+                resultado_dashboard = {"error": str(e)}
+    except Exception:
+        if confirmado:
+            # Hay datos nuevos confirmados: cachés, motores en memoria y ETag se
+            # refrescan igual antes de informar el error.
+            refrescar_tras_sync(callback)
+        raise
+
+    refresco = refrescar_tras_sync(callback)
 
     _ping("Finalizado", 100)
+    con_error = "error" in resultado_dashboard
     return {
-        "status": "success",
-        "mensaje": "Ambos pipelines completados",
+        "status": "parcial" if con_error else "success",
+        "mensaje": "Pipelines completados; rollup del dashboard con error" if con_error else "Pipelines completados",
         "reprogramaciones": resultado_reprog,
-        "compras": resultado_compras
-    }
\ No newline at end of file
+        "compras": resultado_compras,
+        "dashboard": resultado_dashboard,
+        **refresco,
+    }
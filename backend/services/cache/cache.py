@@ -0,0 +1,255 @@
+# backend/services/cache/cache.py
+"""
+Caché en memoria con TTL, límite de tamaño (LRU) y contadores.
+
+Cada instancia se registra por nombre para poder listarlas en diagnóstico
+e invalidarlas todas cuando termina un sync.
+
+obtener_o_calcular() agrega stale-while-revalidate: una entrada vencida (pero
+dentro de la ventana `stale_seg`) se devuelve de inmediato y un único worker
+en segundo plano la recalcula; los refrescos de una misma clave no se duplican.
+"""
+from __future__ import annotations
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+from flask import current_app, has_app_context
+
+from services.actualizar.actualizar import registrar_post_sync
+
+FALTA = object()  # valor de retorno de obtener() cuando no hay entrada vigente
+
+_registro: dict[str, "CacheTTL"] = {}
+_registro_lock = threading.Lock()
+
+# Un solo worker para todos los refrescos en segundo plano
+_refrescador = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-swr")
+_en_curso: set[tuple[str, Hashable]] = set()
+_en_curso_lock = threading.Lock()
+
+
+def _tamano(obj: Any, _vistos: set | None = None) -> int:
+    """Tamaño aproximado en bytes (recorre dict/list/tuple/set)."""
+    vistos = _vistos if _vistos is not None else set()
+    if id(obj) in vistos:
+        return 0
+    vistos.add(id(obj))
+    total = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        total += sum(_tamano(k, vistos) + _tamano(v, vistos) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        total += sum(_tamano(x, vistos) for x in obj)
+    return total
+
+
+class CacheTTL:
+    def __init__(self, nombre: str, ttl_seg: float, max_entradas: int = 256, max_bytes: int | None = None,
+                 stale_seg: float = 0.0, stale_error_seg: float = 0.0, invalidar_en_sync: bool = True):
+        self.nombre = nombre
+        self.ttl_seg = ttl_seg
+        self.stale_seg = stale_seg
+        # si recalcular falla, se sirve la entrada vencida mientras tenga menos de ttl + stale_error_seg
+        self.stale_error_seg = stale_error_seg
+        self.invalidar_en_sync = invalidar_en_sync
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos: OrderedDict[Hashable, tuple[Any, float, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidaciones = 0
+        self.stale_hits = 0
+        self.refrescos = 0
+        self.errores_refresco = 0
+        self.stale_por_error = 0
+        self._generacion = 0  # cambia en cada invalidar(); descarta refrescos iniciados antes
+        with _registro_lock:
+            _registro[nombre] = self
+
+    @property
+    def generacion(self) -> int:
+        """Tomarla antes de calcular y pasarla a guardar() para no guardar datos de antes de un invalidar()."""
+        with self._lock:
+            return self._generacion
+
+    def obtener(self, clave: Hashable) -> Any:
+        """Valor vigente o FALTA."""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return FALTA
+            valor, guardado, _ = entrada
+            if time.time() - guardado > self.ttl_seg:
+                self._quitar(clave)
+                self.misses += 1
+                return FALTA
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def guardar(self, clave: Hashable, valor: Any, generacion: int | None = None) -> None:
+        tam = _tamano(valor)
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (valor, time.time(), tam)
+            self._bytes += tam
+            while self._datos and (
+                len(self._datos) > self.max_entradas
+                or (self.max_bytes is not None and self._bytes > self.max_bytes and len(self._datos) > 1)
+            ):
+                self._quitar(next(iter(self._datos)))
+                self.evictions += 1
+
+    def obtener_o_calcular(self, clave: Hashable, calcular: Callable[[], Any]) -> tuple[Any, float, str]:
+        """
+        Stale-while-revalidate. Devuelve (valor, edad_seg, estado) con estado
+        HIT (vigente), STALE (vencido, refresco encolado) o MISS (calculado ahora).
+        `calcular` no debe depender de `request`: en segundo plano corre solo
+        con el contexto de la app.
+        """
+        ahora = time.time()
+        stale = respaldo = None
+        with self._lock:
+            entrada = self._datos.get(clave)
+            generacion = self._generacion
+            if entrada is not None:
+                valor, guardado, _ = entrada
+                edad = ahora - guardado
+                if edad <= self.ttl_seg:
+                    self._datos.move_to_end(clave)
+                    self.hits += 1
+                    return valor, edad, "HIT"
+                if edad <= self.ttl_seg + self.stale_seg:
+                    self._datos.move_to_end(clave)
+                    self.stale_hits += 1
+                    stale = (valor, edad)
+                elif edad <= self.ttl_seg + self.stale_error_seg:
+                    respaldo = (valor, edad)  # se conserva por si falla el recálculo
+                else:
+                    self._quitar(clave)
+            if stale is None:
+                self.misses += 1
+
+        if stale is not None:
+            self._refrescar(clave, calcular, generacion)
+            return stale[0], stale[1], "STALE"
+
+        try:
+            valor = calcular()
+        except Exception:
+            if respaldo is None:
+                raise
+            with self._lock:
+                self.stale_por_error += 1
+            return respaldo[0], respaldo[1], "STALE"
+        self.guardar(clave, valor, generacion)
+        return valor, 0.0, "MISS"
+
+    def _refrescar(self, clave: Hashable, calcular: Callable[[], Any], generacion: int) -> None:
+        marca = (self.nombre, clave)
+        with _en_curso_lock:
+            if marca in _en_curso:
+                return
+            _en_curso.add(marca)
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def tarea():
+            try:
+                if app is not None:
+                    with app.app_context():
+                        valor = calcular()
+                else:
+                    valor = calcular()
+                self.guardar(clave, valor, generacion)
+                with self._lock:
+                    self.refrescos += 1
+            except Exception:
+                # Se sigue sirviendo la entrada vencida hasta que salga de la ventana
+                with self._lock:
+                    self.errores_refresco += 1
+            finally:
+                with _en_curso_lock:
+                    _en_curso.discard(marca)
+
+        _refrescador.submit(tarea)
+
+    def claves(self) -> list[Hashable]:
+        with self._lock:
+            return list(self._datos.keys())
+
+    def quitar(self, clave: Hashable) -> None:
+        """Descarta la entrada de `clave` si existe."""
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+
+    def _quitar(self, clave: Hashable) -> None:
+        _, _, tam = self._datos.pop(clave)
+        self._bytes -= tam
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+            self.invalidaciones += 1
+            self._generacion += 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "nombre": self.nombre,
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "bytes_aprox": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seg": self.ttl_seg,
+                "stale_seg": self.stale_seg,
+                "stale_error_seg": self.stale_error_seg,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else None,
+                "evictions": self.evictions,
+                "invalidaciones": self.invalidaciones,
+                "refrescos": self.refrescos,
+                "errores_refresco": self.errores_refresco,
+                "stale_por_error": self.stale_por_error,
+            }
+
+
+def con_encabezados(resp, edad: float, estado: str):
+    """Expone la frescura de la respuesta cacheada (Age en segundos y X-Cache)."""
+    resp.headers["Age"] = str(int(edad))
+    resp.headers["X-Cache"] = estado
+    return resp
+
+
+def caches() -> list[CacheTTL]:
+    with _registro_lock:
+        return list(_registro.values())
+
+
+@registrar_post_sync
+def invalidar_todas() -> dict:
+    """
+    Post-sync: los datos del ERP/local cambiaron, se descarta lo cacheado.
+    Las cachés con invalidar_en_sync=False (catálogo) se recalientan por su cuenta.
+    """
+    out = {}
+    for c in caches():
+        if not c.invalidar_en_sync:
+            continue
+        c.invalidar()
+        out[c.nombre] = "invalidada"
+    return out
@@ -0,0 +1,139 @@
+# backend/services/cache/etag.py
+"""
+GET condicional (ETag / If-None-Match) atado a la versión de los datos.
+
+La versión es el mtime (ns) de un archivo marca, ETAG_MARCA: lo reescriben el
+arranque de cada worker y cada sync, así todos los procesos de la máquina ven
+la misma versión sin consultar ninguna base. Con varios servidores la marca
+tiene que estar en un disco compartido. El sync la mueve dos veces:
+
+- en el post-sync, apenas los datos nuevos están confirmados;
+- al terminar el calentamiento (fin-sync): lo que se respondió entre medio,
+  p.ej. listas del catálogo que todavía no se recalculaban, queda invalidado.
+
+El ETag de una respuesta es un hash de esa versión, la ruta, los query params
+ordenados y la fecha de hoy (las ventanas por defecto dependen del día). Así el
+304 se decide en before_request sin tocar ninguna base de datos ni ejecutar el
+handler.
+
+Solo aplica a GET/HEAD de JSON con status 200, que no vengan de una entrada de
+caché vencida (X-Cache: STALE), y fuera de los blueprints de ETAG_EXCLUIR. Por
+defecto quedan fuera diagnóstico, sync, exportaciones y login, y también las
+rutas que leen el ERP en vivo (costos, tiempo fuera, /erp): sus datos cambian
+sin que pase un sync y la versión no lo vería. Una ruta que lee a veces datos
+locales y a veces el ERP registra con solo_si() cuándo aplica (p.ej. el
+dashboard solo en modo rollup).
+
+Si la marca no se puede escribir, cada proceso usa su propia versión en
+memoria: entonces la app tiene que correr en un solo proceso, porque otro
+worker seguiría respondiendo 304 con la versión anterior al sync.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from typing import Callable
+
+from flask import current_app, request
+
+from services.actualizar.actualizar import registrar_fin_sync, registrar_post_sync
+
+ETAG_MARCA = os.getenv("ETAG_MARCA") or os.path.join(tempfile.gettempdir(), "caps2_etag_version")
+
+ETAG_EXCLUIR = {
+    b.strip()
+    for b in os.getenv(
+        "ETAG_EXCLUIR",
+        "home_diag_bp,actualizar_api,exports_api,auth_web,costos_api,tfuera_api,erp_query_api",
+    ).split(",")
+    if b.strip()
+}
+
+# endpoint -> predicado (evaluado con el request): el ETag solo aplica si es verdadero
+_condiciones: dict[str, Callable[[], bool]] = {}
+
+_lock = threading.Lock()
+_ultima = 0  # último mtime escrito por este proceso
+_en_memoria: str | None = None  # versión propia si la marca no se pudo escribir
+
+
+def version() -> str:
+    if _en_memoria is not None:
+        return _en_memoria
+    try:
+        return str(os.stat(ETAG_MARCA).st_mtime_ns)
+    except OSError:
+        return "0"
+
+
+@registrar_post_sync
+@registrar_fin_sync
+def nueva_version() -> dict:
+    """Post-sync y fin-sync: mueve la marca y con ella todos los ETag emitidos."""
+    global _ultima, _en_memoria
+    with _lock:
+        # mtime explícito y estrictamente creciente (no depende de la resolución del reloj del disco)
+        _ultima = max(time.time_ns(), _ultima + 1)
+        try:
+            with open(ETAG_MARCA, "w") as f:
+                f.write(str(_ultima))
+            os.utime(ETAG_MARCA, ns=(_ultima, _ultima))
+            _en_memoria = None
+        except OSError as e:
+            _en_memoria = str(_ultima)
+            return {"version": _en_memoria, "marca": f"error: {e}"}
+    return {"version": version()}
+
+
+def solo_si(endpoint: str, condicion: Callable[[], bool]) -> None:
+    """`endpoint` ("blueprint.funcion") usa ETag solo cuando condicion() es verdadera."""
+    _condiciones[endpoint] = condicion
+
+
+def _aplica() -> bool:
+    if request.method not in ("GET", "HEAD") or request.blueprint in ETAG_EXCLUIR:
+        return False
+    condicion = _condiciones.get(request.endpoint)
+    return condicion is None or condicion()
+
+
+def etag_actual() -> str:
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    base = f"{version()}|{request.path}|{args}|{date.today().isoformat()}"
+    return hashlib.sha1(base.encode()).hexdigest()[:20]
+
+
+def _antes():
+    if not _aplica() or not request.if_none_match:
+        return None
+    valor = etag_actual()
+    if not request.if_none_match.contains_weak(valor):
+        return None
+    resp = current_app.response_class(status=304)
+    resp.set_etag(valor, weak=True)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+def _despues(resp):
+    if (
+        resp.status_code == 200
+        and _aplica()
+        and resp.mimetype == "application/json"
+        and not resp.is_streamed
+        and "ETag" not in resp.headers
+        and resp.headers.get("X-Cache") != "STALE"
+    ):
+        resp.set_etag(etag_actual(), weak=True)
+        # el navegador guarda la respuesta pero la revalida siempre
+        resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+def iniciar(app) -> None:
+    nueva_version()  # un proceso nuevo (p.ej. otro deploy) no reconoce ETags anteriores
+    app.before_request(_antes)
+    app.after_request(_despues)
@@ -0,0 +1,87 @@
+# backend/services/cache/singleflight.py
+"""
+Coalescing de consultas idénticas en vuelo ("single flight").
+
+Si llegan varias peticiones con la misma SQL y parámetros mientras la primera
+todavía se ejecuta, las siguientes esperan esa ejecución y reciben el mismo
+resultado (o la misma excepción) en vez de abrir otra conexión al ERP.
+No guarda nada una vez terminada la ejecución: eso es trabajo de la caché.
+"""
+from __future__ import annotations
+import threading
+from typing import Any, Callable, Hashable
+
+_registro: dict[str, "SingleFlight"] = {}
+_registro_lock = threading.Lock()
+
+
+def clave_sql(sql: str, params: dict | None = None) -> tuple:
+    """Clave hashable a partir de la SQL y sus parámetros (listas -> tuplas)."""
+    def congelar(v):
+        if isinstance(v, dict):
+            return tuple(sorted((k, congelar(x)) for k, x in v.items()))
+        if isinstance(v, (list, tuple, set)):
+            return tuple(congelar(x) for x in v)
+        return v
+    return (sql, congelar(params or {}))
+
+
+class _Llamada:
+    __slots__ = ("evento", "resultado", "error")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._en_vuelo: dict[Hashable, _Llamada] = {}
+        self._lock = threading.Lock()
+        self.ejecuciones = 0
+        self.ahorradas = 0
+        with _registro_lock:
+            _registro[nombre] = self
+
+    def ejecutar(self, clave: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            llamada = self._en_vuelo.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_vuelo[clave] = _Llamada()
+                self.ejecuciones += 1
+            else:
+                self.ahorradas += 1
+
+        if not lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = fn()
+            return llamada.resultado
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+            llamada.evento.set()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "nombre": self.nombre,
+                "ejecuciones": self.ejecuciones,
+                "ahorradas": self.ahorradas,
+                "en_vuelo": len(self._en_vuelo),
+            }
+
+
+def vuelos() -> list[SingleFlight]:
+    with _registro_lock:
+        return list(_registro.values())
@@ -0,0 +1,102 @@
+# backend/services/calentamiento/calentamiento.py
+"""
+Calentamiento de cachés como última etapa de ejecutar_proceso().
+
+Después del sync (y de vaciar las cachés en el post-sync) se precalculan las
+consultas más pedidas para que los primeros usuarios no paguen la latencia
+del ERP en frío:
+
+- Cada módulo registra un generador con registrar(): al llamarse devuelve
+  tareas (etiqueta, fn) — p.ej. el dashboard por faena o las listas del
+  catálogo de filtros.
+- CALENTAR_EXTRA agrega rutas GET propias (separadas por coma) que se piden
+  contra la app, p.ej. "/query/costos/filters/faenas,/endpoints/home/dashboard?modo=sql".
+- Las tareas corren en un pool acotado (CALENTAR_WORKERS), cada una con su
+  app context. Un error en una tarea no corta las demás ni el sync.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Iterable
+
+from flask import current_app, has_app_context
+
+CALENTAR_WORKERS = int(os.getenv("CALENTAR_WORKERS", "4"))
+CALENTAR_EXTRA = os.getenv("CALENTAR_EXTRA", "")
+
+Tarea = tuple[str, Callable[[], Any]]
+
+_generadores: dict[str, Callable[[], Iterable[Tarea]]] = {}
+_lock = threading.Lock()
+_ultimo: dict[str, Any] = {}
+
+
+def registrar(nombre: str, fn: Callable[[], Iterable[Tarea]]) -> Callable[[], Iterable[Tarea]]:
+    """Registra un generador de tareas; se llama (con app context) al empezar cada calentamiento."""
+    _generadores[nombre] = fn
+    return fn
+
+
+def _pedir(ruta: str) -> int:
+    resp = current_app.test_client().get(ruta)
+    if resp.status_code >= 400:
+        raise RuntimeError(f"HTTP {resp.status_code}")
+    return resp.status_code
+
+
+def _extras() -> list[Tarea]:
+    rutas = [r.strip() for r in CALENTAR_EXTRA.split(",") if r.strip()]
+    return [(f"GET {r}", partial(_pedir, r)) for r in rutas]
+
+
+def ejecutar() -> dict:
+    """Corre todas las tareas registradas + CALENTAR_EXTRA. Requiere app context."""
+    if not has_app_context():
+        return {"omitido": "sin app context"}
+    app = current_app._get_current_object()
+    inicio = time.time()
+    tareas: list[Tarea] = []
+    errores: dict[str, str] = {}
+
+    for nombre, gen in list(_generadores.items()) + [("extra", _extras)]:
+        try:
+            tareas.extend(gen())
+        except Exception as e:
+            errores[nombre] = str(e)
+
+    def correr(fn):
+        with app.app_context():
+            return fn()
+
+    ok = 0
+    if tareas:
+        with ThreadPoolExecutor(max_workers=CALENTAR_WORKERS, thread_name_prefix="calentar") as ex:
+            futuros = {ex.submit(correr, fn): etiqueta for etiqueta, fn in tareas}
+            for fut in as_completed(futuros):
+                try:
+                    fut.result()
+                    ok += 1
+                except Exception as e:
+                    errores[futuros[fut]] = str(e)
+
+    resultado = {
+        "fin": datetime.now().isoformat(timespec="seconds"),
+        "tareas": len(tareas),
+        "ok": ok,
+        "errores": errores,
+        "workers": CALENTAR_WORKERS,
+        "duracion_seg": round(time.time() - inicio, 3),
+    }
+    with _lock:
+        _ultimo.clear()
+        _ultimo.update(resultado)
+    return resultado
+
+
+def ultimo() -> dict:
+    with _lock:
+        return dict(_ultimo)
@@ -0,0 +1,153 @@
+# backend/services/catalogo/catalogo.py
+"""
+Catálogo compartido para las listas de los endpoints /filters/* (faenas,
+tipos, equipos y árbol) de todos los módulos.
+
+- Una sola caché acotada (entradas y bytes) con clave (modulo, nombre, params).
+- Cada módulo registra su cargador con registrar(); los handlers piden con obtener().
+- Se calienta al arrancar (hilo en segundo plano) y en la etapa de
+  calentamiento del sync (services.calentamiento). El sync no vacía el
+  catálogo: se recalculan las claves ya conocidas y las por defecto, y si el
+  recálculo falla se conserva el valor anterior. Las listas registradas con
+  base_local=True (leídas de la base local que el sync reescribe) se descartan
+  si su recálculo falla: el valor anterior ya no corresponde a los datos y el
+  siguiente pedido las vuelve a calcular.
+- Si el origen no responde, una entrada vencida se sigue sirviendo hasta
+  FILTROS_CACHE_STALE_ERROR segundos después de su TTL.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Iterable
+
+from services.cache.cache import CacheTTL
+from services.calentamiento import calentamiento
+
+FILTROS_TTL = float(os.getenv("FILTROS_CACHE_TTL", "900"))
+FILTROS_STALE = float(os.getenv("FILTROS_CACHE_STALE", "86400"))
+FILTROS_STALE_ERROR = float(os.getenv("FILTROS_CACHE_STALE_ERROR", str(7 * 86400)))
+
+_cache = CacheTTL(
+    "catalogo",
+    ttl_seg=FILTROS_TTL,
+    max_entradas=int(os.getenv("CATALOGO_MAX_ENTRADAS", "2048")),
+    max_bytes=int(os.getenv("CATALOGO_MAX_BYTES", str(32 * 1024 * 1024))),
+    stale_seg=FILTROS_STALE,
+    stale_error_seg=FILTROS_STALE_ERROR,
+    invalidar_en_sync=False,
+)
+
+# (modulo, nombre) -> cargador(*params)
+_cargadores: dict[tuple[str, str], Callable[..., Any]] = {}
+# (modulo, nombre) -> fn() que devuelve las tuplas de params a precalentar
+_por_defecto: dict[tuple[str, str], Callable[[], Iterable[tuple]]] = {}
+# listas leídas de la base local
+_locales: set[tuple[str, str]] = set()
+
+_app = None
+_calentando = threading.Lock()
+_ultimo: dict[str, Any] = {}
+
+
+def registrar(modulo: str, nombre: str, fn: Callable[..., Any],
+              calentar: Callable[[], Iterable[tuple]] | None = None,
+              base_local: bool = False) -> Callable[..., Any]:
+    """
+    Registra el cargador de una lista. `calentar` (opcional) devuelve los params
+    que se precargan al arrancar y tras cada sync; [()] para listas sin params.
+    `base_local`: la lista sale de la base local (ver docstring del módulo).
+    """
+    _cargadores[(modulo, nombre)] = fn
+    if base_local:
+        _locales.add((modulo, nombre))
+    if calentar is not None:
+        _por_defecto[(modulo, nombre)] = calentar
+    return fn
+
+
+def obtener(modulo: str, nombre: str, *params) -> tuple[Any, float, str]:
+    """(valor, edad_seg, estado) como CacheTTL.obtener_o_calcular()."""
+    fn = _cargadores[(modulo, nombre)]
+    return _cache.obtener_o_calcular((modulo, nombre, params), lambda: fn(*params))
+
+
+def _claves_a_calentar() -> list[tuple]:
+    claves = {k for k in _cache.claves() if (k[0], k[1]) in _cargadores}
+    for (modulo, nombre), gen in _por_defecto.items():
+        try:
+            claves.update((modulo, nombre, tuple(p)) for p in gen())
+        except Exception:
+            pass
+    return sorted(claves, key=repr)
+
+
+def _recalcular(clave: tuple) -> None:
+    modulo, nombre, params = clave
+    try:
+        _cache.guardar(clave, _cargadores[(modulo, nombre)](*params))
+    except Exception:
+        if (modulo, nombre) in _locales:
+            _cache.quitar(clave)
+        raise
+
+
+def _etiqueta(clave: tuple) -> str:
+    modulo, nombre, params = clave
+    return f"{modulo}.{nombre}{list(params)}"
+
+
+def tareas_calentamiento() -> list[tuple[str, Callable[[], None]]]:
+    """Una tarea por lista, para el pool de la etapa de calentamiento del sync."""
+    return [(f"catalogo {_etiqueta(c)}", partial(_recalcular, c)) for c in _claves_a_calentar()]
+
+
+calentamiento.registrar("catalogo", tareas_calentamiento)
+
+
+def calentar() -> dict:
+    """Recalcula las listas por defecto y las ya cacheadas; lo que falle conserva su valor."""
+    if not _calentando.acquire(blocking=False):
+        return {"omitido": "calentamiento en curso"}
+    try:
+        inicio = time.time()
+        ok, errores = 0, {}
+        for clave in _claves_a_calentar():
+            try:
+                _recalcular(clave)
+                ok += 1
+            except Exception as e:
+                errores[_etiqueta(clave)] = str(e)
+        _ultimo.clear()
+        _ultimo.update({
+            "fin": datetime.now().isoformat(timespec="seconds"),
+            "claves": ok,
+            "errores": errores,
+            "duracion_seg": round(time.time() - inicio, 3),
+        })
+        return dict(_ultimo)
+    finally:
+        _calentando.release()
+
+
+def _calentar_con_app() -> None:
+    if _app is not None:
+        with _app.app_context():
+            calentar()
+    else:
+        calentar()
+
+
+def iniciar(app) -> threading.Thread:
+    """Guarda la app (para calentar fuera de un request) y lanza el primer calentamiento."""
+    global _app
+    _app = app
+    hilo = threading.Thread(target=_calentar_con_app, name="catalogo-calentar", daemon=True)
+    hilo.start()
+    return hilo
+
+
+def ultimo_calentamiento() -> dict:
+    return dict(_ultimo)
@@ -0,0 +1,111 @@
+# backend/services/compresion/compresion.py
+"""
+Compresión de respuestas negociada por Accept-Encoding (br si está instalado
+el paquete brotli, si no gzip).
+
+- JSON, NDJSON y texto; nunca archivos (send_file) ni respuestas que ya traen
+  Content-Encoding.
+- Respuestas normales: solo si pesan al menos COMPRESION_MIN_BYTES.
+- Respuestas en streaming (exportaciones): se comprimen por bloque con flush,
+  así el cliente sigue recibiendo datos a medida que se generan.
+- Agrega `Vary: Accept-Encoding` y debilita el ETag (los bytes cambian según
+  la codificación, la representación es la misma).
+
+Los niveles por defecto (gzip 6, brotli 4) apuntan a JSON dinámico;
+/endpoints/home/compresion mide CPU vs. bytes sobre respuestas reales.
+"""
+from __future__ import annotations
+import os
+import zlib
+from typing import Iterable, Iterator
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # solo gzip
+    brotli = None
+
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+COMPRESION_CALIDAD_BR = int(os.getenv("COMPRESION_CALIDAD_BR", "4"))
+
+_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html"}
+
+
+def codificaciones() -> list[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+class _Compresor:
+    """Interfaz común gzip / brotli: comprimir(bloque) + fin()."""
+
+    def __init__(self, codificacion: str, nivel: int | None = None):
+        self.br = codificacion == "br"
+        if self.br:
+            self._c = brotli.Compressor(quality=COMPRESION_CALIDAD_BR if nivel is None else nivel)
+        else:
+            # wbits=31: formato gzip (cabecera + CRC), no deflate crudo
+            self._c = zlib.compressobj(COMPRESION_NIVEL_GZIP if nivel is None else nivel, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos: bytes, flush: bool = False) -> bytes:
+        if self.br:
+            out = self._c.process(datos)
+            return out + self._c.flush() if flush else out
+        out = self._c.compress(datos)
+        return out + self._c.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def fin(self) -> bytes:
+        return self._c.finish() if self.br else self._c.flush()
+
+
+def comprimir(datos: bytes, codificacion: str, nivel: int | None = None) -> bytes:
+    c = _Compresor(codificacion, nivel)
+    return c.comprimir(datos) + c.fin()
+
+
+def _en_stream(bloques: Iterable[bytes], codificacion: str) -> Iterator[bytes]:
+    c = _Compresor(codificacion)
+    for bloque in bloques:
+        out = c.comprimir(bloque, flush=True)  # flush: cada bloque sale de inmediato
+        if out:
+            yield out
+    yield c.fin()
+
+
+def _despues(resp):
+    if resp.status_code == 304:
+        resp.vary.add("Accept-Encoding")  # mismo Vary que la respuesta 200
+        return resp
+    if (
+        resp.status_code < 200
+        or resp.status_code == 204
+        or resp.direct_passthrough
+        or "Content-Encoding" in resp.headers
+        or resp.mimetype not in _MIMETYPES
+    ):
+        return resp
+
+    resp.vary.add("Accept-Encoding")
+    codificacion = request.accept_encodings.best_match(codificaciones())  # respeta q=0
+    if codificacion is None:
+        return resp
+
+    if resp.is_streamed:
+        resp.response = _en_stream(resp.iter_encoded(), codificacion)
+        resp.headers.pop("Content-Length", None)
+    else:
+        datos = resp.get_data()
+        if len(datos) < COMPRESION_MIN_BYTES:
+            return resp
+        resp.set_data(comprimir(datos, codificacion))
+
+    resp.headers["Content-Encoding"] = codificacion
+    etag, debil = resp.get_etag()
+    if etag and not debil:
+        resp.set_etag(etag, weak=True)
+    return resp
+
+
+def iniciar(app) -> None:
+    app.after_request(_despues)
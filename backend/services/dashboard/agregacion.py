@@ -0,0 +1,293 @@
+# backend/services/dashboard/agregacion.py
+"""
+Motor de agregación del dashboard.
+
+Carga las filas una sola vez en columnas (pandas/NumPy) y calcula KPIs,
+gráficos, recientes y filtros sobre esas columnas, en vez de recorrer la
+lista de filas una vez por indicador.
+
+Las fechas se pasan a microsegundos enteros valor por valor (_instantes) en
+vez de pd.to_datetime: el ERP usa 9999-12-31 como "sin fecha" y eso queda
+fuera de datetime64[ns] (1677-2262), que según la versión de pandas las
+convierte en NaT o las desborda. Así esas filas cuentan igual que en el
+cálculo por filas anterior (tests/test_dashboard_paridad.py).
+"""
+from __future__ import annotations
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+N_RECIENTES = 50
+
+
+# -------- utilidades de serialización --------
+def to_float(x):
+    if x is None:
+        return 0.0
+    if isinstance(x, Decimal):
+        return float(x)
+    try:
+        return float(x)
+    except Exception:
+        return 0.0
+
+def to_iso(dt):
+    if isinstance(dt, (datetime, date)):
+        return dt.isoformat()
+    return None
+
+def month_key(dt):
+    if not isinstance(dt, (datetime, date)):
+        return None
+    return f"{dt.year}-{dt.month:02d}"
+
+def best_date(r):
+    """Mejor fecha disponible en el registro (sin coerción)."""
+    return r.get("fecha_solicitud") or r.get("fecha_inicio") or r.get("fecha_ejecucion_otm") or r.get("fecha_log")
+
+def row_cost(r):
+    """Costo de una fila: monto_total_factura > valor_total > monto_neto."""
+    return to_float(r.get("monto_total_factura")) or to_float(r.get("valor_total")) or to_float(r.get("monto_neto"))
+
+def fila_reciente(r, costo: float) -> dict:
+    """Fila de la tabla de recientes."""
+    return {
+        "ot": r.get("numero_otm") or r.get("tipo_solicitud") or "N/D",
+        "fecha": to_iso(best_date(r)) or "",
+        "maquina": r.get("equipo_codigo") or r.get("equipo") or "N/D",
+        "causa": r.get("actividad") or (r.get("tipo_actividad") or "N/D"),
+        "costo": costo,
+        "estado": r.get("estado_actividad") or r.get("tipo_solicitud") or "N/D",
+    }
+
+
+# -------- columnas --------
+def _col(df, nombre):
+    if nombre in df:
+        return df[nombre]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+def _numero(df, nombre):
+    return pd.to_numeric(_col(df, nombre), errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+
+def _texto_upper(df, nombre):
+    return _col(df, nombre).fillna("").astype(str).str.upper()
+
+def _primero(df, *nombres):
+    """Equivalente vectorial de `a or b or c` sobre columnas."""
+    s = _col(df, nombres[0])
+    for n in nombres[1:]:
+        s = s.where(s.notna() & (s != ""), _col(df, n))
+    return s
+
+_EPOCA = date(1970, 1, 1).toordinal()
+
+def _micros(v) -> int | None:
+    """Microsegundos desde 1970 (naive = UTC, date = 00:00); None si no es fecha."""
+    if isinstance(v, datetime):
+        us = ((v.toordinal() - _EPOCA) * 86400 + v.hour * 3600 + v.minute * 60 + v.second) * 1_000_000 + v.microsecond
+        off = v.utcoffset()
+        return us - off // timedelta(microseconds=1) if off else us
+    if isinstance(v, date):
+        return (v.toordinal() - _EPOCA) * 86_400_000_000
+    return None
+
+def _instantes(s):
+    """(int64 en microsegundos, máscara de fechas válidas) para una columna de fechas."""
+    us = [_micros(v) for v in s]
+    validos = np.fromiter((u is not None for u in us), dtype=bool, count=len(us))
+    return np.array([0 if u is None else u for u in us], dtype=np.int64), validos
+
+# sin fecha = datetime.min, como ordenaba el cálculo por filas
+_SIN_FECHA = _micros(datetime.min)
+
+
+def agregar_dashboard(columnas, filas, date_from: datetime, date_to: datetime) -> dict:
+    """
+    Calcula los agregados del dashboard a partir de las filas de la consulta base.
+    Devuelve kpis (sin tendencias), charts, recent y las listas de sites/machines.
+    """
+    # Una sola transposición filas -> columnas; dtype=object conserva los
+    # valores originales (Decimal, date, datetime) tal como los entrega el driver.
+    columnas = list(columnas)
+    valores = list(zip(*filas)) if filas else [()] * len(columnas)
+    df = pd.DataFrame({c: pd.Series(v, dtype=object) for c, v in zip(columnas, valores)})
+    n = len(df)
+
+    # Costos: preferimos monto_total_factura > valor_total > monto_neto
+    fac = _numero(df, "monto_total_factura")
+    val = _numero(df, "valor_total")
+    net = _numero(df, "monto_neto")
+    costo = np.where(fac != 0, fac, np.where(val != 0, val, net))
+
+    # Downtime: programa.fecha_hora_inicio/fin cuando existen
+    ini, con_ini = _instantes(_col(df, "fecha_hora_inicio"))
+    fin, con_fin = _instantes(_col(df, "fecha_hora_fin"))
+    horas = np.where(con_ini & con_fin, (fin - ini) / 3.6e9, 0.0).clip(min=0.0)
+
+    # ¿Es OTR (reparación)? heurística por tipo_solicitud o tipo_actividad
+    es_otr = (
+        _texto_upper(df, "tipo_solicitud").str.contains("OTR", regex=False)
+        | _texto_upper(df, "tipo_actividad").str.contains("REPAR", regex=False)
+    ).to_numpy(dtype=bool)
+
+    maquina = _primero(df, "equipo_codigo", "equipo")
+    con_maquina = (maquina.notna() & (maquina != "")).to_numpy(dtype=bool)
+    maquina_nd = maquina.where(con_maquina, "N/D")
+
+    # ===== KPIs =====
+    mttr_mask = es_otr & (horas > 0)
+    mttr = float(horas[mttr_mask].mean()) if mttr_mask.any() else 0.0
+
+    # MTBF aprox: (horas del periodo) / (# OTR por máquina) → luego promediamos
+    period_hours = max((date_to - date_from).total_seconds() / 3600.0, 1.0)
+    otr_por_maquina = maquina[es_otr & con_maquina].value_counts(sort=False)
+    mtbf = float((period_hours / otr_por_maquina).mean()) if len(otr_por_maquina) else 0.0
+
+    wo_closed = int(_texto_upper(df, "estado_actividad").isin(("CERRADA", "CERRADO")).sum())
+
+    # ===== Charts =====
+    # 1) Costos por mes (fecha de solicitud, fecha_inicio, fecha_log o fecha_ejecucion_otm)
+    mes = _primero(df, "fecha_solicitud", "fecha_inicio", "fecha_log", "fecha_ejecucion_otm").map(month_key)
+    costo_s = pd.Series(costo, index=df.index)
+    por_mes = costo_s[mes.notna()].groupby(mes[mes.notna()]).sum().sort_index()
+    cost_monthly = [{"month": k, "cost": float(v)} for k, v in por_mes.items()]
+
+    # 2) Pareto de causas por costo (rotm.actividad como “causa”)
+    causa = _primero(df, "actividad").where(lambda s: s.notna() & (s != ""), "Sin causa")
+    por_causa = costo_s.groupby(causa, sort=False).sum().sort_values(ascending=False, kind="stable")
+    total = float(por_causa.sum()) or 1.0
+    acumulado = por_causa.cumsum()
+    cause_pareto = [
+        {"cause": c, "cost": float(v), "cumPct": min(float(a) / total * 100.0, 100.0)}
+        for (c, v), a in zip(por_causa.items(), acumulado.to_numpy())
+    ]
+
+    # 3) Downtime por máquina
+    horas_s = pd.Series(horas, index=df.index)
+    por_maquina = horas_s.groupby(maquina_nd, sort=False).sum().sort_values(ascending=False, kind="stable")
+    downtime_by_machine = [{"machine": k, "hours": float(v)} for k, v in por_maquina.items()]
+
+    # 4) MTTR / MTBF por máquina
+    mttr_maquina = horas_s[mttr_mask].groupby(maquina_nd[mttr_mask], sort=False).mean()
+    mttr_mtbf_by_machine = [
+        {
+            "machine": m,
+            "mttr": float(mttr_maquina.get(m, 0.0)),
+            "mtbf": (period_hours / int(otr_por_maquina[m])) if m in otr_por_maquina.index else 0.0,
+        }
+        for m in por_maquina.index
+    ]
+
+    # ===== Recientes: top-N por mejor fecha, sin ordenar todo =====
+    mejor, con_fecha = _instantes(_primero(df, "fecha_solicitud", "fecha_inicio", "fecha_ejecucion_otm", "fecha_log"))
+    clave = pd.Series(np.where(con_fecha, mejor, _SIN_FECHA), index=df.index)
+    recent = []
+    for i in clave.nlargest(min(N_RECIENTES, n), keep="first").index:
+        recent.append(fila_reciente(dict(zip(columnas, filas[i])), float(costo[i])))
+
+    # ===== Filtros de UI (valores reales presentes en data) =====
+    faenas = _col(df, "nombre_faena")
+    sites = sorted(set(faenas[faenas.notna() & (faenas != "")]))
+    machines = sorted(set(maquina[con_maquina]))
+
+    return {
+        "sites": sites,
+        "machines": machines,
+        "kpis": {
+            "cost_total": float(costo.sum()),
+            "downtime_total": float(horas.sum()),
+            "mttr": mttr,
+            "mtbf": mtbf,
+            "wo_closed": wo_closed,
+        },
+        "charts": {
+            "cost_monthly": cost_monthly,
+            "cause_pareto": cause_pareto,
+            "downtime_by_machine": downtime_by_machine,
+            "mttr_mtbf_by_machine": mttr_mtbf_by_machine,
+        },
+        "recent": recent,
+    }
+
+
+def agregar_dashboard_sql(agregados, recientes, date_from: datetime, date_to: datetime) -> dict:
+    """
+    Arma el mismo resultado que agregar_dashboard() a partir de SQL_AGREGADOS
+    (filas por GROUPING SETS) y SQL_RECIENTES (detalle de las N más recientes).
+    """
+    period_hours = max((date_to - date_from).total_seconds() / 3600.0, 1.0)
+
+    total = None
+    por_mes, por_causa, sites, machines = {}, {}, [], []
+    por_maquina: dict[str, dict] = {}
+    otr_por_maquina: dict[str, int] = {}
+    for r in agregados:
+        if r["g_mes"] and r["g_causa"] and r["g_maquina"] and r["g_faena"]:
+            total = r
+        elif not r["g_mes"]:
+            if r["mes"]:
+                por_mes[r["mes"]] = to_float(r["costo"])
+        elif not r["g_causa"]:
+            por_causa[r["causa"]] = to_float(r["costo"])
+        elif not r["g_maquina"]:
+            m = r["maquina"]
+            if m:
+                machines.append(m)
+                if r["otr_n"]:
+                    otr_por_maquina[m] = int(r["otr_n"])
+            # Sin máquina (NULL) se agrupa como "N/D", igual que en el modo python
+            acc = por_maquina.setdefault(m or "N/D", {"horas": 0.0, "mttr_horas": 0.0, "mttr_n": 0})
+            acc["horas"] += to_float(r["horas"])
+            acc["mttr_horas"] += to_float(r["mttr_horas"])
+            acc["mttr_n"] += int(r["mttr_n"] or 0)
+        elif not r["g_faena"]:
+            if r["faena"]:
+                sites.append(r["faena"])
+
+    mttr_n = int(total["mttr_n"] or 0) if total else 0
+    mtbf_vals = [period_hours / c for c in otr_por_maquina.values()]
+
+    cost_monthly = [{"month": k, "cost": v} for k, v in sorted(por_mes.items())]
+
+    pareto_items = sorted(por_causa.items(), key=lambda kv: (-kv[1], kv[0]))
+    suma = sum(v for _, v in pareto_items) or 1.0
+    cum = 0.0
+    cause_pareto = []
+    for cause, val in pareto_items:
+        cum += val
+        cause_pareto.append({"cause": cause, "cost": val, "cumPct": min(cum / suma * 100.0, 100.0)})
+
+    maquinas = sorted(por_maquina.items(), key=lambda kv: (-kv[1]["horas"], kv[0]))
+    downtime_by_machine = [{"machine": m, "hours": a["horas"]} for m, a in maquinas]
+    mttr_mtbf_by_machine = [
+        {
+            "machine": m,
+            "mttr": (a["mttr_horas"] / a["mttr_n"]) if a["mttr_n"] else 0.0,
+            "mtbf": (period_hours / otr_por_maquina[m]) if m in otr_por_maquina else 0.0,
+        }
+        for m, a in maquinas
+    ]
+
+    recent = [fila_reciente(r, row_cost(r)) for r in recientes]
+
+    return {
+        "sites": sorted(sites),
+        "machines": sorted(machines),
+        "kpis": {
+            "cost_total": to_float(total["costo"]) if total else 0.0,
+            "downtime_total": to_float(total["horas"]) if total else 0.0,
+            "mttr": (to_float(total["mttr_horas"]) / mttr_n) if mttr_n else 0.0,
+            "mtbf": (sum(mtbf_vals) / len(mtbf_vals)) if mtbf_vals else 0.0,
+            "wo_closed": int(total["cerradas"] or 0) if total else 0,
+        },
+        "charts": {
+            "cost_monthly": cost_monthly,
+            "cause_pareto": cause_pareto,
+            "downtime_by_machine": downtime_by_machine,
+            "mttr_mtbf_by_machine": mttr_mtbf_by_machine,
+        },
+        "recent": recent,
+    }
@@ -0,0 +1,382 @@
+# backend/services/dashboard/consultas.py
+"""
+SQL del dashboard (home).
+
+CTES es la base común (programa, reg_otm, ot_mantenimiento, equipo). Sobre ella
+se arman la consulta de detalle (modo python), la de agregados con GROUPING SETS
+y la de recientes (modo sql).
+"""
+from datetime import datetime
+
+CTES = """
+WITH programa AS (
+    SELECT
+        id_programa_otm,
+        equipo,
+        codigo_tarea,
+        horometro_referencia,
+        descripcion,
+        disponibilidad_insumos,
+        instrucciones_especiales,
+        fecha_limite,
+        cantidad_reprogramaciones,
+        usuario_programacion,
+        estado_programa,
+        otm,
+        nombre_prioridad_otm,
+        fecha_ejecucion_otm,
+        horometro_planificacion,
+        ultimo_horometro,
+        fecha_ultimo_horometro,
+        usuario_ultimo_horometro,
+        fecha_log,
+        fecha_hora_inicio,
+        fecha_hora_fin
+    FROM CONSULTAS_CGO_EXT.V_PROGRAMA_OTM
+),
+reg_otm AS (
+    SELECT
+        id_otm,
+        fecha_inicio,
+        anio,
+        nombre_faena,
+        codigo_interno,
+        actividad,
+        tipo_actividad,
+        estado_actividad,
+        motivo_no_cumplimiento,
+        numero_otm,
+        fecha_original,
+        cantidad_reprogramaciones
+    FROM CONSULTAS_CGO_EXT.V_REG_HISTORICO_OT_ORDEN
+    WHERE numero_otm ~ '^M[0-9]+$'
+),
+ot_mantenimiento AS (
+    SELECT
+        numero_solicitud,
+        fecha_solicitud,
+        ot,
+        tipo_solicitud,                -- típicamente OTM/OTR
+        equipo,
+        solicitante,
+        estado_solicitud,
+        faena,
+        cuenta_contable,
+        centro_costos,
+        proveedor_seleccionado,
+        fecha_cotizacion,
+        condicion_pago,
+        monto_neto,
+        valor_total,
+        plazo_entrega,
+        motivo_compra,
+        orden_compra,
+        fecha_orden_compra,
+        fecha_emision_factura,
+        monto_total_factura,
+        item_material_o_servicio,
+        item_cantidad,
+        item_unidad,
+        item_monto_total,
+        estado_recepcion,
+        fecha_aceptado,
+        fecha_aceptado_gerencia,
+        validador,
+        validador_gerencia
+    FROM CONSULTAS_CGO_EXT.V_SOL_ITEMS_OTM_OTR
+),
+equipo AS (
+    SELECT DISTINCT
+        equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')) AS tipo_equipo,
+        SPLIT_PART(equipo, ' - ', 2) AS marca,
+        SPLIT_PART(equipo, ' - ', 3) AS modelo
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_ANGLO_EXPORT
+    UNION ALL
+    SELECT DISTINCT equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
+        SPLIT_PART(equipo, ' - ', 2),
+        SPLIT_PART(equipo, ' - ', 3)
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_CGO_ANDINA_EXPORT
+    UNION ALL
+    SELECT DISTINCT equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
+        SPLIT_PART(equipo, ' - ', 2),
+        SPLIT_PART(equipo, ' - ', 3)
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_CGO_CUMET_VENTANAS_EXPORT
+    UNION ALL
+    SELECT DISTINCT equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
+        SPLIT_PART(equipo, ' - ', 2),
+        SPLIT_PART(equipo, ' - ', 3)
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_CUCONS_EXPORT
+    UNION ALL
+    SELECT DISTINCT equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
+        SPLIT_PART(equipo, ' - ', 2),
+        SPLIT_PART(equipo, ' - ', 3)
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_ETEO_EXPORT
+    UNION ALL
+    SELECT DISTINCT equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
+        SPLIT_PART(equipo, ' - ', 2),
+        SPLIT_PART(equipo, ' - ', 3)
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_KDM_EXPORT
+    UNION ALL
+    SELECT DISTINCT equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
+        SPLIT_PART(equipo, ' - ', 2),
+        SPLIT_PART(equipo, ' - ', 3)
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_TC_EXPORT
+    UNION ALL
+    SELECT DISTINCT equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
+        SPLIT_PART(equipo, ' - ', 2),
+        SPLIT_PART(equipo, ' - ', 3)
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_CATODO_EXPORT
+    UNION ALL
+    SELECT DISTINCT equipo_codigo,
+        TRIM(REGEXP_REPLACE(SPLIT_PART(equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')),
+        SPLIT_PART(equipo, ' - ', 2),
+        SPLIT_PART(equipo, ' - ', 3)
+    FROM CONSULTAS_CGO_EXT.V_REGISTRO_DIARIO_SPOT_EXPORT
+)
+"""
+
+FROM_JOINS = """
+FROM programa pro
+LEFT JOIN equipo eq ON eq.equipo_codigo = pro.equipo
+LEFT JOIN reg_otm rotm ON pro.otm = rotm.numero_otm
+LEFT JOIN ot_mantenimiento otm ON rotm.numero_otm = otm.ot
+"""
+
+# Detalle para agregar en Python (modo "python")
+SQL_DETALLE = CTES + """
+SELECT
+    pro.id_programa_otm,
+    pro.equipo,
+    pro.codigo_tarea,
+    pro.descripcion,
+    pro.fecha_limite,
+    pro.fecha_ejecucion_otm,
+    pro.fecha_hora_inicio,
+    pro.fecha_hora_fin,
+    pro.fecha_log,
+
+    eq.equipo_codigo,
+    eq.tipo_equipo,
+    eq.marca,
+    eq.modelo,
+
+    rotm.nombre_faena,
+    rotm.actividad,
+    rotm.tipo_actividad,
+    rotm.estado_actividad,
+    rotm.fecha_inicio,
+    rotm.numero_otm,
+
+    otm.tipo_solicitud,
+    otm.valor_total,
+    otm.monto_total_factura,
+    otm.monto_neto,
+    otm.fecha_solicitud
+""" + FROM_JOINS + """
+WHERE {where_clause}
+LIMIT 20000
+"""
+
+# Columnas derivadas por fila (mismas reglas que services/dashboard/agregacion.py)
+COLUMNAS_BASE = """
+        rotm.nombre_faena AS faena,
+        NULLIF(COALESCE(NULLIF(eq.equipo_codigo, ''), pro.equipo), '') AS maquina,
+        COALESCE(eq.equipo_codigo, '') <> '' AS con_equipo,
+        COALESCE(NULLIF(rotm.actividad, ''), 'Sin causa') AS causa,
+        TO_CHAR(COALESCE(otm.fecha_solicitud, rotm.fecha_inicio, pro.fecha_log, pro.fecha_ejecucion_otm), 'YYYY-MM') AS mes,
+        COALESCE(NULLIF(otm.monto_total_factura, 0), NULLIF(otm.valor_total, 0), otm.monto_neto, 0)::float8 AS costo,
+        GREATEST(COALESCE(EXTRACT(EPOCH FROM (pro.fecha_hora_fin::timestamp - pro.fecha_hora_inicio::timestamp)) / 3600.0, 0), 0)::float8 AS horas,
+        (STRPOS(UPPER(COALESCE(otm.tipo_solicitud, '')), 'OTR') > 0
+         OR STRPOS(UPPER(COALESCE(rotm.tipo_actividad, '')), 'REPAR') > 0) AS es_otr,
+        UPPER(COALESCE(rotm.estado_actividad, '')) IN ('CERRADA', 'CERRADO') AS cerrada"""
+
+# Agregados en el servidor (modo "sql"): una fila por conjunto de agrupación.
+SQL_AGREGADOS = CTES + """,
+base AS (
+    SELECT""" + COLUMNAS_BASE + """
+""" + FROM_JOINS + """
+    WHERE {where_clause}
+)
+SELECT
+    GROUPING(mes) AS g_mes,
+    GROUPING(causa) AS g_causa,
+    GROUPING(maquina) AS g_maquina,
+    GROUPING(faena) AS g_faena,
+    mes, causa, maquina, faena,
+    COUNT(*) AS filas,
+    SUM(costo) AS costo,
+    SUM(horas) AS horas,
+    COALESCE(SUM(horas) FILTER (WHERE es_otr AND horas > 0), 0) AS mttr_horas,
+    COUNT(*) FILTER (WHERE es_otr AND horas > 0) AS mttr_n,
+    COUNT(*) FILTER (WHERE es_otr) AS otr_n,
+    COUNT(*) FILTER (WHERE cerrada) AS cerradas
+FROM base
+GROUP BY GROUPING SETS ((), (mes), (causa), (maquina), (faena))
+"""
+
+# Solo las filas de la tabla "recientes" (modo "sql")
+SQL_RECIENTES = CTES + """
+SELECT
+    pro.equipo,
+    pro.fecha_ejecucion_otm,
+    pro.fecha_log,
+    eq.equipo_codigo,
+    rotm.actividad,
+    rotm.tipo_actividad,
+    rotm.estado_actividad,
+    rotm.fecha_inicio,
+    rotm.numero_otm,
+    otm.tipo_solicitud,
+    otm.valor_total,
+    otm.monto_total_factura,
+    otm.monto_neto,
+    otm.fecha_solicitud
+""" + FROM_JOINS + """
+WHERE {where_clause}
+ORDER BY COALESCE(otm.fecha_solicitud, rotm.fecha_inicio, pro.fecha_ejecucion_otm, pro.fecha_log) DESC NULLS LAST
+LIMIT {limite}
+"""
+
+
+# Eventos para el rollup local (sync): columnas base + fecha del evento + campos de "recientes"
+SQL_EVENTOS = CTES + """
+SELECT""" + COLUMNAS_BASE + """,
+    COALESCE(rotm.fecha_inicio, pro.fecha_log, otm.fecha_solicitud)::date AS fecha_evento,
+    COALESCE(otm.fecha_solicitud, rotm.fecha_inicio, pro.fecha_ejecucion_otm, pro.fecha_log)::timestamp AS fecha_orden,
+    pro.equipo,
+    pro.fecha_ejecucion_otm,
+    pro.fecha_log,
+    eq.equipo_codigo,
+    rotm.actividad,
+    rotm.tipo_actividad,
+    rotm.estado_actividad,
+    rotm.fecha_inicio,
+    rotm.numero_otm,
+    otm.tipo_solicitud,
+    otm.fecha_solicitud
+""" + FROM_JOINS + """
+WHERE COALESCE(rotm.fecha_inicio, pro.fecha_log, otm.fecha_solicitud) IS NOT NULL
+"""
+
+# ---- Rollup local (modo "rollup") ----
+# Tablas: DashboardEvento / DashboardDiario en models/models.py
+def ddl_rollup() -> list[str]:
+    """
+    CREATE TABLE / CREATE INDEX IF NOT EXISTS de las tablas del rollup, generados
+    desde los modelos: el sync las crea si la base todavía no las tiene.
+    """
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateIndex, CreateTable
+
+    from models.models import DashboardDiario, DashboardEvento
+
+    dialecto = postgresql.dialect()
+    sentencias = []
+    for modelo in (DashboardEvento, DashboardDiario):
+        tabla = modelo.__table__
+        sentencias.append(str(CreateTable(tabla, if_not_exists=True).compile(dialect=dialecto)))
+        for indice in sorted(tabla.indexes, key=lambda i: i.name):
+            sentencias.append(str(CreateIndex(indice, if_not_exists=True).compile(dialect=dialecto)))
+    return sentencias
+
+
+SQL_ROLLUP_DIARIO = """
+INSERT INTO public.dashboard_diario
+    (dia, faena, maquina, con_equipo, causa, mes, filas, costo, horas, mttr_horas, mttr_n, otr_n, cerradas)
+SELECT
+    fecha_evento, faena, maquina, con_equipo, causa, mes,
+    COUNT(*),
+    SUM(costo),
+    SUM(horas),
+    COALESCE(SUM(horas) FILTER (WHERE es_otr AND horas > 0), 0),
+    COUNT(*) FILTER (WHERE es_otr AND horas > 0),
+    COUNT(*) FILTER (WHERE es_otr),
+    COUNT(*) FILTER (WHERE cerrada)
+FROM public.dashboard_evento
+GROUP BY fecha_evento, faena, maquina, con_equipo, causa, mes;
+"""
+
+# Misma forma de salida que SQL_AGREGADOS, sumando filas del rollup diario
+SQL_ROLLUP_AGREGADOS = """
+SELECT
+    GROUPING(mes) AS g_mes,
+    GROUPING(causa) AS g_causa,
+    GROUPING(maquina) AS g_maquina,
+    GROUPING(faena) AS g_faena,
+    mes, causa, maquina, faena,
+    SUM(filas) AS filas,
+    SUM(costo) AS costo,
+    SUM(horas) AS horas,
+    SUM(mttr_horas) AS mttr_horas,
+    SUM(mttr_n) AS mttr_n,
+    SUM(otr_n) AS otr_n,
+    SUM(cerradas) AS cerradas
+FROM public.dashboard_diario
+WHERE {where_clause}
+GROUP BY GROUPING SETS ((), (mes), (causa), (maquina), (faena))
+"""
+
+SQL_ROLLUP_RECIENTES = """
+SELECT ot, fecha, maquina_txt AS maquina, causa_txt AS causa, costo, estado
+FROM public.dashboard_evento
+WHERE {where_clause}
+ORDER BY fecha_orden DESC NULLS LAST
+LIMIT {limite}
+"""
+
+
+# Los filtros opcionales (faena, máquina) dan un conjunto fijo de variantes del
+# WHERE: cada SQL se arma una vez por variante y en cada petición solo cambian
+# los parámetros.
+VARIANTES = [(con_site, con_machine) for con_site in (False, True) for con_machine in (False, True)]
+
+
+def variante(site: str | None, machine: str | None) -> tuple[bool, bool]:
+    return (bool(site) and site.upper() != "TODOS", bool(machine) and machine.upper() != "TODAS")
+
+
+def where_rollup(v: tuple[bool, bool], col_fecha: str) -> str:
+    conds = [f"{col_fecha} BETWEEN :dfrom AND :dto"]
+    if v[0]:
+        conds.append("faena = :site")
+    if v[1]:
+        conds.append("maquina = :machine AND con_equipo")
+    return " AND ".join(conds)
+
+
+def where_dashboard(v: tuple[bool, bool]) -> str:
+    conds = ["COALESCE(rotm.fecha_inicio, pro.fecha_log, otm.fecha_solicitud) BETWEEN %(dfrom)s AND %(dto)s"]
+    if v[0]:
+        conds.append("rotm.nombre_faena = %(site)s")
+    if v[1]:
+        conds.append("eq.equipo_codigo = %(machine)s")
+    return " AND ".join(conds)
+
+
+def _params(v: tuple[bool, bool], date_from, date_to, site, machine) -> dict:
+    params = {"dfrom": date_from, "dto": date_to}
+    if v[0]:
+        params["site"] = site
+    if v[1]:
+        params["machine"] = machine
+    return params
+
+
+def filtros_rollup(date_from: datetime, date_to: datetime, site: str | None, machine: str | None, col_fecha: str):
+    """WHERE para las tablas del rollup (fecha a nivel de día)."""
+    v = variante(site, machine)
+    return where_rollup(v, col_fecha), _params(v, date_from.date(), date_to.date(), site, machine)
+
+
+def filtros_dashboard(date_from: datetime, date_to: datetime, site: str | None, machine: str | None):
+    """WHERE dinámico del dashboard (ERP, estilo psycopg2 %(nombre)s) y sus parámetros."""
+    v = variante(site, machine)
+    return where_dashboard(v), _params(v, date_from, date_to, site, machine)
@@ -0,0 +1,75 @@
+# backend/services/exportar/stream.py
+"""
+Respuestas de exportación en streaming (NDJSON o CSV).
+
+Reciben un iterador de dicts (normalmente alimentado por un cursor del lado
+del servidor) y lo van escribiendo por bloques: la memoria no depende del
+tamaño del resultado y los primeros bytes salen apenas llega la primera fila.
+"""
+from __future__ import annotations
+import csv
+import io
+from datetime import date, datetime
+from typing import Iterable, Iterator
+
+from flask import Response, stream_with_context
+
+from services.serializacion.json_rapido import dumps_str
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+FILAS_POR_BLOQUE = 500
+
+
+def _csv_valor(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def _ndjson(filas: Iterable[dict]) -> Iterator[str]:
+    bloque = []
+    for f in filas:
+        bloque.append(dumps_str(f))
+        if len(bloque) >= FILAS_POR_BLOQUE:
+            yield "\n".join(bloque) + "\n"
+            bloque = []
+    if bloque:
+        yield "\n".join(bloque) + "\n"
+
+
+def _csv(filas: Iterable[dict], columnas: list[str] | None) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = None
+    n = 0
+    for f in filas:
+        if writer is None:
+            writer = csv.writer(buf)
+            columnas = columnas or list(f.keys())
+            writer.writerow(columnas)
+        writer.writerow([_csv_valor(f.get(c)) for c in columnas])
+        n += 1
+        if n % FILAS_POR_BLOQUE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if writer is None and columnas:
+        csv.writer(buf).writerow(columnas)
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def formato_valido(formato: str | None) -> str | None:
+    formato = (formato or "ndjson").strip().lower()
+    return formato if formato in FORMATOS else None
+
+
+def respuesta_stream(filas: Iterable[dict], formato: str, nombre: str, columnas: list[str] | None = None) -> Response:
+    """Response en streaming; `filas` se consume recién cuando Flask envía el cuerpo."""
+    cuerpo = _csv(filas, columnas) if formato == "csv" else _ndjson(filas)
+    resp = Response(stream_with_context(cuerpo), mimetype=FORMATOS[formato])
+    resp.headers["Content-Disposition"] = f'attachment; filename="{nombre}.{formato}"'
+    resp.headers["X-Accel-Buffering"] = "no"  # que un proxy (nginx) no acumule la respuesta
+    return resp
@@ -0,0 +1,266 @@
+# backend/services/exportar/trabajos.py
+"""
+Trabajos de exportación asíncronos.
+
+Un POST crea el trabajo y vuelve de inmediato; un pool acotado de workers
+consume la fuente (un iterador de dicts, normalmente un cursor del lado del
+servidor) y escribe un archivo comprimido en disco:
+
+- "csv":     CSV con gzip (.csv.gz).
+- "parquet": Parquet (compresión snappy); requiere pyarrow instalado.
+
+El estado (filas escritas, bytes, heartbeat) se consulta mientras corre. Los
+archivos terminados se conservan EXPORT_RETENCION_HORAS y luego se borran
+(junto con huérfanos de ejecuciones anteriores) en la siguiente purga.
+"""
+from __future__ import annotations
+import csv
+import gzip
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Iterable, Mapping
+
+from flask import current_app
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet es opcional
+    pa = None
+    pq = None
+
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR") or Path(__file__).resolve().parents[2] / "exports")
+EXPORT_RETENCION_SEG = float(os.getenv("EXPORT_RETENCION_HORAS", "24")) * 3600
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_LOTE = int(os.getenv("EXPORT_LOTE", "5000"))
+
+EXTENSIONES = {"csv": ".csv.gz", "parquet": ".parquet"}
+
+# Fuentes: nombre -> fn(params) -> iterador de dicts. La función valida los
+# parámetros al llamarse (ValueError si faltan) y la lectura ocurre al iterar.
+Fuente = Callable[[Mapping[str, Any]], Iterable[dict]]
+_fuentes: dict[str, Fuente] = {}
+
+_trabajos: dict[str, "Trabajo"] = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+
+
+def registrar_fuente(nombre: str, fn: Fuente) -> Fuente:
+    _fuentes[nombre] = fn
+    return fn
+
+
+def fuentes() -> list[str]:
+    return sorted(_fuentes)
+
+
+def formatos() -> list[str]:
+    return ["csv", "parquet"] if pa is not None else ["csv"]
+
+
+def _ahora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class Trabajo:
+    def __init__(self, fuente: str, params: dict, formato: str):
+        self.id = uuid.uuid4().hex
+        self.fuente = fuente
+        self.params = params
+        self.formato = formato
+        self.status = "pendiente"  # pendiente | ejecutando | completado | error
+        self.filas = 0
+        self.bytes = 0
+        self.creado = _ahora()
+        self.inicio: str | None = None
+        self.fin: str | None = None
+        self.heartbeat: str | None = None
+        self.duracion_seg: float | None = None
+        self.error: str | None = None
+        self.traceback: str | None = None
+        self.archivo = EXPORT_DIR / f"{fuente}_{self.id}{EXTENSIONES[formato]}"
+        self.terminado_ts: float | None = None
+
+    @property
+    def nombre_archivo(self) -> str:
+        return f"{self.fuente}_{self.creado[:10]}{EXTENSIONES[self.formato]}"
+
+    def estado(self) -> dict:
+        expira = None
+        if self.terminado_ts is not None:
+            expira = datetime.fromtimestamp(self.terminado_ts + EXPORT_RETENCION_SEG).isoformat(timespec="seconds")
+        return {
+            "id": self.id,
+            "fuente": self.fuente,
+            "params": self.params,
+            "formato": self.formato,
+            "status": self.status,
+            "filas": self.filas,
+            "bytes": self.bytes,
+            "creado": self.creado,
+            "inicio": self.inicio,
+            "fin": self.fin,
+            "heartbeat": self.heartbeat,
+            "duracion_seg": self.duracion_seg,
+            "expira": expira,
+            "error": self.error,
+        }
+
+
+# ---------- escritura ----------
+def _csv_valor(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def _escribir_csv(filas: Iterable[dict], ruta: Path, avance: Callable[[int], None]) -> None:
+    with gzip.open(ruta, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        columnas = None
+        n = 0
+        for fila in filas:
+            if columnas is None:
+                columnas = list(fila.keys())
+                writer.writerow(columnas)
+            writer.writerow([_csv_valor(fila.get(c)) for c in columnas])
+            n += 1
+            if n % EXPORT_LOTE == 0:
+                avance(n)
+        avance(n)
+
+
+def _parquet_valor(v):
+    return float(v) if isinstance(v, Decimal) else v
+
+
+def _escribir_parquet(filas: Iterable[dict], ruta: Path, avance: Callable[[int], None]) -> None:
+    writer = None
+    schema = None
+    lote: list[dict] = []
+    n = 0
+
+    def volcar():
+        nonlocal writer, schema
+        if schema is None:
+            # columnas que vinieron todas en NULL en el primer lote se tipan como texto
+            inferido = pa.Table.from_pylist(lote).schema
+            schema = pa.schema([
+                pa.field(c.name, pa.string()) if pa.types.is_null(c.type) else c for c in inferido
+            ])
+            writer = pq.ParquetWriter(ruta, schema, compression="snappy")
+        writer.write_table(pa.Table.from_pylist(lote, schema=schema))
+        lote.clear()
+
+    try:
+        for fila in filas:
+            lote.append({k: _parquet_valor(v) for k, v in fila.items()})
+            n += 1
+            if len(lote) >= EXPORT_LOTE:
+                volcar()
+                avance(n)
+        if lote:
+            volcar()
+        if writer is None:
+            pq.write_table(pa.table({}), ruta)
+        avance(n)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# ---------- ciclo de vida ----------
+def _worker(app, trabajo: Trabajo, filas: Iterable[dict]) -> None:
+    inicio = time.time()
+    trabajo.status = "ejecutando"
+    trabajo.inicio = trabajo.heartbeat = _ahora()
+    tmp = trabajo.archivo.with_name(trabajo.archivo.name + ".tmp")
+
+    def avance(n: int) -> None:
+        trabajo.filas = n
+        trabajo.heartbeat = _ahora()
+        try:
+            trabajo.bytes = tmp.stat().st_size
+        except OSError:
+            pass
+
+    try:
+        with app.app_context():
+            EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+            if trabajo.formato == "parquet":
+                _escribir_parquet(filas, tmp, avance)
+            else:
+                _escribir_csv(filas, tmp, avance)
+        tmp.replace(trabajo.archivo)  # el archivo final solo aparece completo
+        trabajo.bytes = trabajo.archivo.stat().st_size
+        trabajo.status = "completado"
+    except Exception as e:
+        trabajo.status = "error"
+        trabajo.error = str(e)
+        trabajo.traceback = traceback.format_exc()
+        tmp.unlink(missing_ok=True)
+    finally:
+        trabajo.fin = _ahora()
+        trabajo.duracion_seg = round(time.time() - inicio, 3)
+        trabajo.terminado_ts = time.time()
+
+
+def purgar() -> int:
+    """Borra trabajos/archivos vencidos y archivos huérfanos de ejecuciones anteriores."""
+    limite = time.time() - EXPORT_RETENCION_SEG
+    with _lock:
+        vencidos = [t for t in _trabajos.values() if t.terminado_ts is not None and t.terminado_ts < limite]
+        for t in vencidos:
+            del _trabajos[t.id]
+        vigentes = {t.archivo.name for t in _trabajos.values()}
+    borrados = 0
+    for t in vencidos:
+        t.archivo.unlink(missing_ok=True)
+        borrados += 1
+    if EXPORT_DIR.is_dir():
+        for ruta in EXPORT_DIR.iterdir():
+            if ruta.name in vigentes or not ruta.is_file():
+                continue
+            try:
+                if ruta.stat().st_mtime < limite:
+                    ruta.unlink()
+                    borrados += 1
+            except OSError:
+                pass
+    return borrados
+
+
+def crear(fuente: str, params: Mapping[str, Any] | None, formato: str = "csv") -> Trabajo:
+    """Valida y encola un trabajo. ValueError si la fuente, el formato o los parámetros no sirven."""
+    if fuente not in _fuentes:
+        raise ValueError(f"Fuente desconocida: {fuente!r} (disponibles: {', '.join(fuentes())})")
+    if formato not in formatos():
+        raise ValueError(f"Formato no disponible: {formato!r} (disponibles: {', '.join(formatos())})")
+    params = dict(params or {})
+    filas = _fuentes[fuente](params)  # valida parámetros; la lectura ocurre en el worker
+
+    purgar()
+    trabajo = Trabajo(fuente, params, formato)
+    with _lock:
+        _trabajos[trabajo.id] = trabajo
+    _executor.submit(_worker, current_app._get_current_object(), trabajo, filas)
+    return trabajo
+
+
+def obtener(id_trabajo: str) -> Trabajo | None:
+    with _lock:
+        return _trabajos.get(id_trabajo)
+
+
+def listar() -> list[Trabajo]:
+    purgar()
+    with _lock:
+        return sorted(_trabajos.values(), key=lambda t: t.creado, reverse=True)
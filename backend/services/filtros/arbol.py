@@ -0,0 +1,24 @@
+# backend/services/filtros/arbol.py
+"""
+Árbol de filtros faena → tipo → equipo en un solo payload.
+
+Recibe las filas (faena, tipo, equipo) ordenadas de una consulta DISTINCT y
+arma {faena: {tipo: [equipos]}}. Un tipo o equipo NULL (LEFT JOIN sin match)
+deja la faena/tipo en el árbol sin hijos, igual que los endpoints en cascada.
+"""
+from __future__ import annotations
+from typing import Iterable
+
+
+def arbol(filas: Iterable[tuple]) -> dict[str, dict[str, list]]:
+    out: dict[str, dict[str, list]] = {}
+    for faena, tipo, equipo in filas:
+        if faena is None:
+            continue
+        tipos = out.setdefault(faena, {})
+        if tipo is None:
+            continue
+        equipos = tipos.setdefault(tipo, [])
+        if equipo is not None and (not equipos or equipos[-1] != equipo):
+            equipos.append(equipo)
+    return out
@@ -0,0 +1,177 @@
+# backend/services/paginacion/cursor.py
+"""
+Paginación por cursor (keyset) sobre el ORDER BY existente de cada endpoint.
+
+El cursor es opaco para el cliente: base64 de los valores de la clave de orden
+de la última fila entregada + cuántas filas con exactamente esa clave ya se
+entregaron. La página siguiente pide `clave >= cursor` y salta esas filas.
+
+En SQL la clave tiene que ser única: Postgres no conserva el orden entre filas
+empatadas de una ejecución a otra, así que saltar N empates podría repetir u
+omitir filas. Cada ORDER BY termina en una columna de desempate (pm.equipo_id
+en proxmtto, fila_id en costos) y el salto queda en la fila del cursor. Solo
+desde_en_memoria admite claves repetidas, porque ahí el orden es estable.
+
+Todas las claves se asumen con NULLS LAST (como en los ORDER BY actuales).
+"""
+from __future__ import annotations
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Sequence
+
+from sqlalchemy import and_, or_, true
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+# -------- token --------
+def _tipar(v: Any):
+    if isinstance(v, Decimal):
+        return {"$dec": str(v)}
+    if isinstance(v, datetime):
+        return {"$dt": v.isoformat()}
+    if isinstance(v, date):
+        return {"$d": v.isoformat()}
+    return v
+
+
+def _destipar(v: Any):
+    if isinstance(v, dict):
+        if "$dec" in v:
+            return Decimal(v["$dec"])
+        if "$dt" in v:
+            return datetime.fromisoformat(v["$dt"])
+        if "$d" in v:
+            return date.fromisoformat(v["$d"])
+    return v
+
+
+def codificar(valores: Sequence, saltar: int) -> str:
+    crudo = json.dumps({"k": [_tipar(v) for v in valores], "s": saltar}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar(token: str, n_claves: int) -> tuple[list, int]:
+    try:
+        crudo = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        obj = json.loads(crudo)
+        valores = [_destipar(v) for v in obj["k"]]
+        saltar = int(obj["s"])
+    except Exception as e:
+        raise CursorInvalido("cursor inválido") from e
+    if len(valores) != n_claves or saltar < 0:
+        raise CursorInvalido("cursor inválido")
+    return valores, saltar
+
+
+def siguiente(claves_pagina: list[tuple], limit: int, anterior: tuple[list, int] | None = None) -> str | None:
+    """
+    next_cursor a partir de las claves de las filas devueltas (None si la página no vino llena).
+    `anterior` es el cursor decodificado con que se pidió esta página.
+    """
+    if not claves_pagina or len(claves_pagina) < limit:
+        return None
+    ultima = tuple(claves_pagina[-1])
+    iguales = 0
+    for k in reversed(claves_pagina):
+        if tuple(k) != ultima:
+            break
+        iguales += 1
+    if iguales == len(claves_pagina) and anterior is not None and tuple(anterior[0]) == ultima:
+        iguales += anterior[1]  # toda la página es empate con el cursor anterior
+    return codificar(ultima, iguales)
+
+
+# -------- predicados "clave >= cursor" --------
+def _predicado(n: int, valores: Sequence, desc: Sequence[bool], igual, despues, y, o):
+    disyuntos = []
+    for i in range(n):
+        if valores[i] is None:
+            continue  # con NULLS LAST no hay nada estrictamente después de NULL
+        disyuntos.append(y([igual(j, valores[j]) for j in range(i)] + [despues(i, valores[i], desc[i])]))
+    disyuntos.append(y([igual(j, valores[j]) for j in range(n)]))
+    return o(disyuntos)
+
+
+def predicado_sql(expresiones: Sequence[str], desc: Sequence[bool], valores: Sequence,
+                  marcador: Callable[[str], str]) -> tuple[str, dict]:
+    """
+    WHERE textual. `marcador` arma el placeholder del driver:
+    lambda n: f"%({n})s" (psycopg2) o lambda n: f":{n}" (SQLAlchemy text()).
+    """
+    params = {f"cur_{i}": v for i, v in enumerate(valores) if v is not None}
+
+    def igual(i, v):
+        return f"{expresiones[i]} IS NULL" if v is None else f"{expresiones[i]} = {marcador(f'cur_{i}')}"
+
+    def despues(i, v, d):
+        op = "<" if d else ">"
+        return f"({expresiones[i]} {op} {marcador(f'cur_{i}')} OR {expresiones[i]} IS NULL)"
+
+    sql = _predicado(
+        len(expresiones), valores, desc, igual, despues,
+        lambda partes: "(" + " AND ".join(partes) + ")",
+        lambda partes: "(" + " OR ".join(partes) + ")",
+    )
+    return sql, params
+
+
+def desde_token(token: str, expresiones: Sequence[str], desc: Sequence[bool],
+                marcador: Callable[[str], str]) -> tuple[str, dict, tuple[list, int] | None]:
+    """
+    (predicado, params, cursor decodificado) para el ?cursor= recibido;
+    ("", {}, None) si no vino. Lanza CursorInvalido si el token no corresponde.
+    """
+    if not token:
+        return "", {}, None
+    anterior = decodificar(token, len(expresiones))
+    pred, params = predicado_sql(expresiones, desc, anterior[0], marcador)
+    return pred, params, anterior
+
+
+def predicado_orm(columnas: Sequence, desc: Sequence[bool], valores: Sequence):
+    """Mismo predicado como expresión SQLAlchemy (para consultas ORM)."""
+    def igual(i, v):
+        return columnas[i].is_(None) if v is None else columnas[i] == v
+
+    def despues(i, v, d):
+        return or_(columnas[i] < v if d else columnas[i] > v, columnas[i].is_(None))
+
+    return _predicado(len(columnas), valores, desc, igual, despues,
+                      lambda partes: and_(true(), *partes), lambda partes: or_(*partes))
+
+
+# -------- en memoria --------
+def _comparar(a, b, d: bool) -> int:
+    if a == b:
+        return 0
+    if a is None:
+        return 1
+    if b is None:
+        return -1
+    menor = a < b
+    return (1 if menor else -1) if d else (-1 if menor else 1)
+
+
+def desde_en_memoria(filas: list, clave: Callable[[Any], tuple], desc: Sequence[bool],
+                     valores: Sequence, saltar: int) -> list:
+    """Filas (ya ordenadas) desde la posición del cursor."""
+    for pos, f in enumerate(filas):
+        k = clave(f)
+        for a, b, d in zip(k, valores, desc):
+            c = _comparar(a, b, d)
+            if c:
+                break
+        else:
+            c = 0
+        if c >= 0:
+            # saltamos solo las filas empatadas con el cursor (ya entregadas)
+            while saltar and pos < len(filas) and tuple(clave(filas[pos])) == tuple(valores):
+                pos += 1
+                saltar -= 1
+            return filas[pos:]
+    return []
@@ -0,0 +1,42 @@
+# backend/services/proyeccion/proyeccion.py
+"""
+Proyección de columnas para listados anchos (?fields=a,b,c).
+
+Cada endpoint declara sus columnas como (expresión SQL, alias) — el alias es
+el nombre en la respuesta y a la vez la lista blanca de ?fields=. Las claves
+(id y columnas de orden/cursor) van siempre. La proyección solo quita
+columnas: los JOIN y el DISTINCT que definen cada fila se arman completos, así
+que una página trae las mismas filas con o sin ?fields=. La consulta en el ERP
+no se achica (lee, junta y ordena lo mismo); lo que se ahorra es el envío de
+columnas y el tamaño del JSON.
+"""
+from __future__ import annotations
+from typing import Sequence
+
+from flask import request
+
+Columna = tuple[str, str]  # (expresión SQL, alias)
+
+
+def campos(columnas: Sequence[Columna], obligatorias: Sequence[str] = ()) -> tuple[str, ...] | None:
+    """
+    Alias pedidos en ?fields= (coma o repetido), más las obligatorias, en el orden
+    de `columnas`. None si no se pidió proyección. ValueError si hay campos fuera
+    de la lista blanca.
+    """
+    pedidos = [c.strip() for valor in request.args.getlist("fields") for c in valor.split(",") if c.strip()]
+    if not pedidos:
+        return None
+    permitidos = [alias for _, alias in columnas]
+    invalidos = [c for c in pedidos if c not in permitidos]
+    if invalidos:
+        raise ValueError(f"Campos no permitidos: {', '.join(invalidos)} (disponibles: {', '.join(permitidos)})")
+    elegidos = set(pedidos) | set(obligatorias)
+    return tuple(a for a in permitidos if a in elegidos)
+
+
+def select(columnas: Sequence[Columna], elegidos: Sequence[str] | None = None, sangria: str = "    ") -> str:
+    """Lista del SELECT (todas las columnas si `elegidos` es None)."""
+    usar = columnas if elegidos is None else [c for c in columnas if c[1] in elegidos]
+    return (",\n" + sangria).join(f"{expr} AS {alias}" for expr, alias in usar)
+
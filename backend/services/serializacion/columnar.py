@@ -0,0 +1,45 @@
+# backend/services/serializacion/columnar.py
+"""
+Formato columnar opcional para los listados (?format=columnar):
+
+    {"columns": ["id_programa_otm", "otm_numero", ...], "rows": [[1, "M0001", ...], ...]}
+
+Los nombres de columna viajan una vez y no en cada fila, y las filas se leen
+con cursores de tuplas (sin armar un dict por fila). El formato por defecto
+sigue siendo la lista de objetos.
+"""
+from __future__ import annotations
+from typing import Iterable, Sequence
+
+from flask import request
+
+
+def pedido() -> bool:
+    return (request.args.get("format") or "").strip().lower() == "columnar"
+
+
+def tabla(columnas: Sequence[str], filas: Iterable[Sequence]) -> dict:
+    return {"columns": list(columnas), "rows": list(filas)}
+
+
+def desde_cursor(cur) -> dict:
+    """Tabla a partir de un cursor de tuplas ya ejecutado (columnas de cur.description)."""
+    return tabla([d[0] for d in cur.description], cur.fetchall())
+
+
+def desde_dicts(filas: Sequence[dict], columnas: Sequence[str] | None = None) -> dict:
+    if columnas is None:
+        columnas = list(filas[0].keys()) if filas else []
+    return tabla(columnas, ([f.get(c) for c in columnas] for f in filas))
+
+
+def claves(t: dict, nombres: Sequence[str]) -> list[tuple]:
+    """Valores de `nombres` por fila (para armar el cursor de paginación)."""
+    idx = [t["columns"].index(n) for n in nombres]
+    return [tuple(f[i] for i in idx) for f in t["rows"]]
+
+
+def sin(t: dict, nombres: Sequence[str]) -> dict:
+    """Copia de la tabla sin las columnas `nombres` (no modifica `t`)."""
+    idx = [i for i, c in enumerate(t["columns"]) if c not in nombres]
+    return tabla([t["columns"][i] for i in idx], ([f[i] for i in idx] for f in t["rows"]))
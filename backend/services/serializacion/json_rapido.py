@@ -0,0 +1,110 @@
+# backend/services/serializacion/json_rapido.py
+"""
+Proveedor JSON de la app: una sola pasada que entiende los tipos que
+devuelven psycopg2 / SQLAlchemy / pandas, sin convertidores por endpoint.
+
+- Con orjson instalado, la serialización corre en C: dict/list/str/números,
+  datetime/date/time (ISO 8601), UUID, numpy y subclases de dict (RealDictRow)
+  son nativos; Decimal, Row/RowMapping y demás pasan por _default().
+- Sin orjson, json de la stdlib con el mismo _default(). orjson es opcional
+  (no está en requirements.txt): `pip install orjson` lo activa.
+
+Formato: Decimal como número y fechas ISO 8601, lo que ya entregaban los
+endpoints que convertían a mano (dashboard, /erp, proxmtto, reprogramaciones,
+exportaciones). Los blueprints de JSON_COMPAT (costos y tiempo fuera, con sus
+filtros) pasaban por el proveedor por defecto de Flask y mantienen ese
+formato: Decimal como string exacto ("2.50", montos sin pérdida) y fechas
+RFC 822 (http_date).
+"""
+from __future__ import annotations
+import json
+import os
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # fallback a la stdlib
+    orjson = None
+
+_OPCIONES = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY if orjson is not None else 0
+)
+# compat: las fechas pasan por _default_compat en vez de salir ISO nativas
+_OPCIONES_COMPAT = _OPCIONES | orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else 0
+
+JSON_COMPAT = {
+    b.strip()
+    for b in os.getenv("JSON_COMPAT", "costos_api,tfuera_api").split(",")
+    if b.strip()
+}
+
+
+def _default(v: Any):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (datetime, date, time)):
+        return v.isoformat()
+    if isinstance(v, Mapping):
+        return dict(v)
+    if hasattr(v, "_mapping"):  # sqlalchemy Row
+        return dict(v._mapping)
+    if hasattr(v, "item"):  # escalares numpy (solo en el fallback)
+        return v.item()
+    if isinstance(v, (set, frozenset, tuple)):
+        return list(v)
+    raise TypeError(f"Tipo no serializable: {type(v).__name__}")
+
+
+def _default_compat(v: Any):
+    """Formato del proveedor por defecto de Flask (Decimal exacto, http_date)."""
+    if isinstance(v, Decimal):
+        return str(v)
+    if isinstance(v, date):  # datetime incluido
+        return http_date(v)
+    return _default(v)
+
+
+def dumps_bytes(obj: Any, compat: bool = False) -> bytes:
+    default = _default_compat if compat else _default
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=_OPCIONES_COMPAT if compat else _OPCIONES)
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def dumps_str(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_OPCIONES).decode()
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+
+def motor() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+class JSONRapido(DefaultJSONProvider):
+    sort_keys = False
+    ensure_ascii = False
+    default = staticmethod(_default)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:  # opciones explícitas (indent, sort_keys...): stdlib
+            kwargs.setdefault("default", _default)
+            return json.dumps(obj, **kwargs)
+        return dumps_str(obj)
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        compat = has_request_context() and request.blueprint in JSON_COMPAT
+        return self._app.response_class(dumps_bytes(obj, compat) + b"\n", mimetype=self.mimetype)
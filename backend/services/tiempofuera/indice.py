@@ -0,0 +1,74 @@
+# backend/services/tiempofuera/indice.py
+"""
+Índice faena -> equipos (desde el registro diario).
+
+Reemplaza el EXISTS correlacionado contra la unión de turnos en get_tiempo_fuera():
+el conjunto de equipos de la faena se arma una vez, se cachea y se pasa
+como arreglo a la consulta. Se invalida tras cada sync y expira por TTL.
+
+La carga desde el ERP corre fuera del lock (peticiones concurrentes la
+comparten con SingleFlight); el lock solo protege el reemplazo del índice.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+
+import psycopg2.extensions
+
+from database import erp
+from services.actualizar.actualizar import registrar_post_sync
+from services.cache.singleflight import SingleFlight
+from services.tiempofuera.motor import VISTAS_REGISTRO
+
+TTL_SEG = int(os.getenv("TFUERA_INDICE_TTL", "3600"))
+
+_lock = threading.Lock()
+_indice: dict | None = None
+_generacion = 0  # sube en cada invalidación: una carga iniciada antes no se instala
+_vuelo = SingleFlight("tiempo-fuera-indice")
+
+
+def _sql(s: str) -> str:
+    union = "\nUNION ALL ".join(f"SELECT distrito, equipo_codigo FROM {s}.{v}" for v in VISTAS_REGISTRO)
+    return f"""
+    SELECT DISTINCT distrito, equipo_codigo
+    FROM ({union}) r
+    WHERE distrito IS NOT NULL AND equipo_codigo IS NOT NULL
+    """
+
+
+def _cargar(schema: str) -> dict:
+    with erp.conexion("reportes") as conn:
+        with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+            cur.execute(_sql(schema))
+            rows = cur.fetchall()
+    faenas: dict[str, list] = {}
+    for distrito, codigo in rows:
+        faenas.setdefault(distrito, []).append(codigo)
+    return {"schema": schema, "cargado": time.time(), "faenas": {k: sorted(v) for k, v in faenas.items()}}
+
+
+def _vigente(idx: dict | None, schema: str) -> bool:
+    return idx is not None and idx["schema"] == schema and time.time() - idx["cargado"] <= TTL_SEG
+
+
+def equipos_de_faena(schema: str, faena: str) -> list[str]:
+    """Códigos de equipo con turnos registrados en la faena (lista vacía si no hay)."""
+    global _indice
+    idx = _indice
+    if not _vigente(idx, schema):
+        generacion = _generacion
+        idx = _vuelo.ejecutar(schema, lambda: _cargar(schema))
+        with _lock:
+            if generacion == _generacion:
+                _indice = idx
+    return idx["faenas"].get(faena, [])
+
+
+@registrar_post_sync
+def invalidar() -> None:
+    global _indice, _generacion
+    with _lock:
+        _indice = None
+        _generacion += 1
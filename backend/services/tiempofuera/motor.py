@@ -0,0 +1,209 @@
+# backend/services/tiempofuera/motor.py
+"""
+Motor en memoria para tiempo fuera de servicio.
+
+Mantiene, por equipo, arreglos NumPy ordenados con los timestamps de turnos
+(registro diario) y de notificaciones de falla. Para cada falla el próximo
+turno se obtiene con np.searchsorted, sin volver a consultar la base.
+Equivale al cálculo SQL de get_tiempo_fuera() y se recarga tras cada sync.
+
+Paridad con el SQL (tests/test_tiempofuera_paridad.py):
+- Los códigos y el distrito se comparan tal como vienen (sin TRIM), igual que
+  `distrito = %(faena)s` y el JOIN con equipos_tipo; solo el mapa de tipos
+  se arma con TRIM(equipo_codigo), como en la consulta.
+- Diferencias conocidas: con turno y falla en el mismo instante el SQL depende
+  del orden entre pares de la ventana (no determinista) y el motor toma ese
+  turno (0 días); y sin filtro de faena el SQL puede devolver una fila con
+  equipo_codigo NULL, que el motor descarta.
+"""
+from __future__ import annotations
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+
+from database import erp
+from services.actualizar.actualizar import registrar_post_sync
+
+VISTAS_REGISTRO = (
+    "v_registro_diario_anglo_export",
+    "v_registro_diario_catodo_export",
+    "v_registro_diario_cgo_andina_export",
+    "v_registro_diario_cgo_cumet_ventanas_export",
+    "v_registro_diario_cucons_export",
+    "v_registro_diario_eteo_export",
+    "v_registro_diario_kdm_export",
+    "v_registro_diario_spot_export",
+)
+
+_carga_lock = threading.Lock()
+_datos: dict | None = None
+
+
+def _sql_turnos(s: str) -> str:
+    partes = [
+        f"""SELECT equipo_codigo,
+               EXTRACT(EPOCH FROM fecha_inicio::timestamp)::float8 AS ts,
+               distrito
+        FROM {s}.{v}
+        WHERE equipo_codigo IS NOT NULL AND fecha_inicio IS NOT NULL"""
+        for v in VISTAS_REGISTRO
+    ]
+    return "\nUNION ALL\n".join(partes)
+
+
+def _sql_fallas(s: str) -> str:
+    return f"""
+    SELECT n.codigo_interno::text AS equipo_codigo,
+           EXTRACT(EPOCH FROM n.fecha::timestamp)::float8 AS ts
+    FROM {s}.v_notificacion_reporte n
+    WHERE n.motivo = 'FALLA - DAÑO'
+      AND n.codigo_interno IS NOT NULL AND n.fecha IS NOT NULL
+    """
+
+
+def _sql_tipos(s: str) -> str:
+    union = "\nUNION ALL ".join(f"SELECT equipo_codigo, equipo FROM {s}.{v}" for v in VISTAS_REGISTRO)
+    return f"""
+    SELECT DISTINCT
+      TRIM(r.equipo_codigo) AS equipo_codigo,
+      TRIM(REGEXP_REPLACE(SPLIT_PART(r.equipo, ' - ', 1), '^[A-Z0-9-]+ ', '')) AS tipo_equipo
+    FROM ({union}) r
+    WHERE r.equipo_codigo IS NOT NULL AND r.equipo IS NOT NULL
+    """
+
+
+def _por_equipo(df: pd.DataFrame) -> dict:
+    """equipo_codigo -> np.ndarray(float64) ordenado de timestamps (epoch)."""
+    if df.empty:
+        return {}
+    df = df.sort_values(["equipo_codigo", "ts"], kind="mergesort")
+    return {k: g.to_numpy(dtype=np.float64) for k, g in df.groupby("equipo_codigo", sort=False)["ts"]}
+
+
+def cargar(schema: str = "consultas_cgo_ext") -> dict:
+    """Lee turnos, fallas y tipos desde el ERP y arma los arreglos por equipo."""
+    inicio = time.time()
+    with erp.conexion("reportes") as conn:
+        with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+            cur.execute(_sql_turnos(schema))
+            turnos = pd.DataFrame(cur.fetchall(), columns=["equipo_codigo", "ts", "distrito"])
+            cur.execute(_sql_fallas(schema))
+            fallas = pd.DataFrame(cur.fetchall(), columns=["equipo_codigo", "ts"])
+            cur.execute(_sql_tipos(schema))
+            tipos_rows = cur.fetchall()
+
+    tipos: dict[str, set] = {}
+    for codigo, tipo in tipos_rows:
+        tipos.setdefault(codigo, set()).add(tipo)
+
+    turnos_faena = {
+        faena: _por_equipo(g[["equipo_codigo", "ts"]])
+        for faena, g in turnos.dropna(subset=["distrito"]).groupby("distrito", sort=False)
+    }
+
+    datos = {
+        "schema": schema,
+        "turnos": _por_equipo(turnos[["equipo_codigo", "ts"]]),
+        "turnos_faena": turnos_faena,
+        "fallas": _por_equipo(fallas),
+        "tipos": tipos,
+        "cargado": time.time(),
+        "duracion_seg": round(time.time() - inicio, 3),
+        "n_turnos": int(len(turnos)),
+        "n_fallas": int(len(fallas)),
+    }
+
+    global _datos
+    _datos = datos
+    return datos
+
+
+def _asegurar(schema: str) -> dict:
+    datos = _datos
+    if datos is not None and datos["schema"] == schema:
+        return datos
+    with _carga_lock:
+        datos = _datos
+        if datos is not None and datos["schema"] == schema:
+            return datos
+        return cargar(schema)
+
+
+@registrar_post_sync
+def recargar() -> dict | None:
+    """Post-sync: recarga solo si el motor ya estaba en uso."""
+    if _datos is None:
+        return None
+    datos = cargar(_datos["schema"])
+    return {"turnos": datos["n_turnos"], "fallas": datos["n_fallas"], "duracion_seg": datos["duracion_seg"]}
+
+
+def estado() -> dict:
+    datos = _datos
+    if datos is None:
+        return {"cargado": False}
+    return {
+        "cargado": True,
+        "schema": datos["schema"],
+        "equipos": len(datos["turnos"]),
+        "turnos": datos["n_turnos"],
+        "fallas": datos["n_fallas"],
+        "duracion_seg": datos["duracion_seg"],
+        "edad_seg": round(time.time() - datos["cargado"], 1),
+    }
+
+
+def _promedio_dias(segundos: np.ndarray) -> Decimal:
+    # Igual que ROUND(AVG(...)::numeric, 2) en Postgres: promedio exacto en
+    # microsegundos (sin redondeo binario) y mitad hacia arriba
+    micros = int(np.rint(segundos * 1e6).astype(np.int64).sum())
+    dias = Decimal(micros) / Decimal(segundos.size * 86_400_000_000)
+    return dias.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def calcular_tiempo_fuera(schema: str, faena: str = "", tipo: str = "", equipo: str = "") -> list[dict]:
+    """
+    Mismo resultado que la consulta SQL de get_tiempo_fuera() (sin paginar):
+    por equipo, cantidad de períodos fuera y promedio de días hasta el próximo turno.
+    """
+    datos = _asegurar(schema)
+    turnos = datos["turnos_faena"].get(faena, {}) if faena else datos["turnos"]
+    fallas = datos["fallas"]
+    candidatos = [equipo] if equipo else fallas.keys()
+
+    out = []
+    for codigo in candidatos:
+        f = fallas.get(codigo)
+        t = turnos.get(codigo)
+        if f is None or t is None:
+            continue
+
+        idx = np.searchsorted(t, f, side="left")
+        validos = idx < t.size
+        n = int(np.count_nonzero(validos))
+        if not n:
+            continue
+
+        # El SQL hace LEFT JOIN con el mapa equipo->tipo: sin filtro de tipo,
+        # un equipo con varios tipos suma una fila por cada uno.
+        tipos = datos["tipos"].get(codigo, ())
+        if tipo:
+            if tipo not in tipos:
+                continue
+            mult = 1
+        else:
+            mult = len(tipos) or 1
+
+        out.append({
+            "equipo_codigo": codigo,
+            "total_periodos_fuera_servicio": n * mult,
+            "promedio_dias_fuera_servicio": _promedio_dias(t[idx[validos]] - f[validos]),
+        })
+
+    out.sort(key=lambda r: r["equipo_codigo"])
+    out.sort(key=lambda r: r["promedio_dias_fuera_servicio"], reverse=True)
+    return out
@@ -0,0 +1,61 @@
+# backend/tests/conftest.py
+"""
+Configuración común de los tests.
+
+Los tests de paridad SQL necesitan un Postgres real: se usa TEST_PG_DSN si
+está definido, si no un servidor local efímero con `pgserver`; sin ninguno
+de los dos esos tests se omiten.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND))
+
+# database/erp.py exige estas variables al importarse; los tests que van al
+# ERP apuntan el pool a la base de prueba (fixture `erp_pg`).
+for _var in ("ERP_DB_HOST", "ERP_DB_NAME", "ERP_DB_USER", "ERP_DB_PASSWORD",
+             "DB_HOST", "DB_NAME", "DB_USER", "DB_PASSWORD"):
+    os.environ.setdefault(_var, "test")
+
+
+@pytest.fixture(scope="session")
+def pg_dsn(tmp_path_factory):
+    dsn = os.getenv("TEST_PG_DSN")
+    if dsn:
+        yield dsn
+        return
+    pgserver = pytest.importorskip("pgserver")
+    srv = pgserver.get_server(tmp_path_factory.mktemp("pg"), cleanup_mode="stop")
+    try:
+        yield srv.get_uri()
+    finally:
+        srv.cleanup()
+
+
+@pytest.fixture
+def pg(pg_dsn):
+    """Conexión autocommit a la base de prueba (para crear fixtures)."""
+    import psycopg2
+
+    conn = psycopg2.connect(pg_dsn)
+    conn.autocommit = True
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def erp_pg(pg_dsn, monkeypatch):
+    """Los pools ERP (database.erp) apuntan a la base de prueba."""
+    from database import erp
+
+    monkeypatch.setattr(erp, "ERP_DSN", pg_dsn)
+    monkeypatch.setattr(erp, "_pools", {})
+    yield erp
+    for p in erp._pools.values():
+        p.cerrar()
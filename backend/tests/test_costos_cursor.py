@@ -0,0 +1,193 @@
+# backend/tests/test_costos_cursor.py
+"""
+Paginación por cursor de get_costos() contra un Postgres de prueba con las
+vistas del ERP que lee la consulta (consultas_cgo_ext).
+
+Los ítems de una misma solicitud empatan en (id_programa_otm, numero_otm,
+fecha_solicitud): sin el desempate fila_id el cursor dependía del orden en
+que Postgres devolviera esos empates.
+"""
+import pytest
+
+SCHEMA = "consultas_cgo_ext"
+
+VISTAS_REGISTRO = [
+    "v_registro_diario_anglo_export", "v_registro_diario_cgo_andina_export",
+    "v_registro_diario_cgo_cumet_ventanas_export", "v_registro_diario_cucons_export",
+    "v_registro_diario_eteo_export", "v_registro_diario_kdm_export",
+    "v_registro_diario_tc_export", "v_registro_diario_catodo_export",
+    "v_registro_diario_spot_export",
+]
+
+COLUMNAS_PROGRAMA = (
+    "id_programa_otm int, otm text, equipo text, codigo_tarea text, horometro_referencia numeric, "
+    "disponibilidad_insumos text, instrucciones_especiales text, fecha_limite date, "
+    "cantidad_reprogramaciones int, usuario_programacion text, nombre_prioridad_otm text, "
+    "fecha_ejecucion_otm date, horometro_planificacion numeric, ultimo_horometro numeric, "
+    "fecha_ultimo_horometro date, usuario_ultimo_horometro text, fecha_log timestamp, "
+    "fecha_hora_inicio timestamp, fecha_hora_fin timestamp, estado_programa text"
+)
+
+COLUMNAS_ITEMS = (
+    "numero_solicitud text, fecha_solicitud timestamp, ot text, tipo_solicitud text, equipo text, "
+    "solicitante text, estado_solicitud text, faena text, cuenta_contable text, centro_costos text, "
+    "proveedor_seleccionado text, fecha_cotizacion date, condicion_pago text, monto_neto numeric, "
+    "valor_total numeric, plazo_entrega text, motivo_compra text, orden_compra text, "
+    "fecha_orden_compra date, fecha_emision_factura date, monto_total_factura numeric, "
+    "item_material_o_servicio text, item_cantidad numeric, item_unidad text, item_monto_total numeric, "
+    "estado_recepcion text, fecha_aceptado date, fecha_aceptado_gerencia date, validador text, "
+    "validador_gerencia text"
+)
+
+N_PROGRAMAS = 12
+ITEMS_POR_OT = 5
+N_FILAS = N_PROGRAMAS * ITEMS_POR_OT * 2
+
+
+@pytest.fixture
+def vistas_costos(pg, erp_pg):
+    with pg.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"CREATE TABLE {SCHEMA}.v_programa_otm ({COLUMNAS_PROGRAMA})")
+        cur.execute(f"CREATE TABLE {SCHEMA}.v_sol_items_otm_otr ({COLUMNAS_ITEMS})")
+        for v in VISTAS_REGISTRO:
+            cur.execute(f"CREATE TABLE {SCHEMA}.{v} (equipo_codigo text, equipo text)")
+        # El mismo equipo en dos vistas con distinta descripción: cada ítem sale dos veces
+        cur.execute(
+            f"INSERT INTO {SCHEMA}.v_registro_diario_anglo_export VALUES "
+            f"('CAM-01', 'CAM-01 CAMIONETA - Toyota - Hilux')"
+        )
+        cur.execute(
+            f"INSERT INTO {SCHEMA}.v_registro_diario_kdm_export VALUES "
+            f"('CAM-01', 'CAM-01 CAMIONETA 4X4 - Toyota - Hilux')"
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {SCHEMA}.v_programa_otm (id_programa_otm, otm, equipo, estado_programa)
+            SELECT g, 'OT' || g, 'CAM-01 ', 'EJECUTADO' FROM generate_series(1, {N_PROGRAMAS}) g
+            """
+        )
+        # Todos los ítems de una OT comparten solicitud y fecha (y algunas OT no tienen fecha)
+        cur.execute(
+            f"""
+            INSERT INTO {SCHEMA}.v_sol_items_otm_otr
+                (numero_solicitud, fecha_solicitud, ot, faena, item_material_o_servicio,
+                 item_cantidad, item_monto_total, cuenta_contable, proveedor_seleccionado, item_unidad)
+            SELECT 'S' || g, CASE WHEN g % 4 = 0 THEN NULL ELSE timestamp '2024-01-01' + g * interval '1 day' END,
+                   'OT' || g, 'ANGLO', 'ITEM ' || i, i, 100 * i, '5101: Repuestos',
+                   '76.000.000-0 - Proveedor', 'UN - Unidad'
+            FROM generate_series(1, {N_PROGRAMAS}) g, generate_series(1, {ITEMS_POR_OT}) i
+            """
+        )
+    yield SCHEMA
+    with pg.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+def _paginas(campos, limit):
+    from endpoints.query.costos import costos
+    from services.paginacion import cursor as cursor_pag
+
+    filas, token = [], ""
+    while True:
+        pred, params_cursor, anterior = cursor_pag.desde_token(
+            token, [e for e, _ in costos._CLAVES], [False] * len(costos._CLAVES), lambda n: f"%({n})s"
+        )
+        params = {"faena": "ANGLO", "equipo": "CAM-01", "limit": limit,
+                  "offset": anterior[1] if anterior else 0, **params_cursor}
+        sql = costos._sql_pagina(f"AND {pred}" if pred else "", campos)
+        pagina = costos._consultar(sql, params, preparar=campos is None)
+        filas += pagina
+        token = cursor_pag.siguiente(
+            [tuple(r[c] for _, c in costos._CLAVES) for r in pagina], limit, anterior
+        )
+        if token is None:
+            return filas
+
+
+def _todas(campos):
+    from endpoints.query.costos import costos
+
+    with costos._get_conn() as conn, conn.cursor() as cur:
+        cur.execute(costos._sql_costos("", campos), {"faena": "ANGLO", "equipo": "CAM-01"})
+        return cur.fetchall()
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, N_FILAS])
+def test_cursor_recorre_todas_las_filas_una_vez(vistas_costos, limit):
+    filas = _paginas(None, limit)
+    todas = _todas(None)
+
+    assert len(todas) == N_FILAS
+    assert [r["fila_id"] for r in filas] == [r["fila_id"] for r in todas]
+    assert len({r["fila_id"] for r in filas}) == len(filas)
+
+
+@pytest.mark.parametrize("campos", [
+    ("id_programa_otm", "otm_numero", "compra_fecha_solicitud"),
+    ("id_programa_otm", "otm_numero", "compra_fecha_solicitud", "compra_item"),
+    ("id_programa_otm", "otm_numero", "compra_fecha_solicitud", "equipo_tipo"),
+])
+def test_proyeccion_solo_quita_columnas(vistas_costos, campos):
+    completas = _todas(None)
+    filas = _paginas(campos, 4)
+
+    # mismas filas, en el mismo orden, que sin ?fields= (no se juntan por el DISTINCT
+    # ni se pierden las que aporta el JOIN con equipo)
+    assert [r["fila_id"] for r in filas] == [r["fila_id"] for r in completas]
+    assert set(filas[0]) == set(campos) | {"fila_id"}
+
+
+@pytest.fixture
+def cliente_costos(vistas_costos):
+    from flask import Flask
+    from endpoints.query.costos.costos import costos_bp
+
+    app = Flask(__name__)
+    app.register_blueprint(costos_bp)
+    return app.test_client()
+
+
+def _recorrer(cliente, query):
+    filas, token = [], ""
+    while True:
+        datos = cliente.get(f"/query/costos?faena=ANGLO&equipo=CAM-01&limit=7{query}&cursor={token}").get_json()
+        filas += datos["data"]["rows"] if "columnar" in query else datos["data"]
+        token = datos["next_cursor"]
+        if token is None:
+            return datos, filas
+
+
+@pytest.mark.parametrize("query", ["", "&format=columnar", "&fields=compra_item"])
+def test_respuesta_sin_fila_id(cliente_costos, query):
+    datos, filas = _recorrer(cliente_costos, query)
+
+    assert len(filas) == N_FILAS
+    columnas = datos["data"]["columns"] if "columnar" in query else list(filas[0])
+    assert "fila_id" not in columnas
+
+
+def test_fila_id_si_se_pide(cliente_costos):
+    _, filas = _recorrer(cliente_costos, "&fields=fila_id")
+
+    assert [r["fila_id"] for r in filas] == [r["fila_id"] for r in _todas(None)]
+
+
+def test_export_sin_fila_id(vistas_costos):
+    from endpoints.query.costos import costos
+
+    filas = list(costos.filas_export({"faena": "ANGLO", "equipo": "CAM-01"}))
+    assert len(filas) == N_FILAS
+    assert "fila_id" not in filas[0]
+
+
+def test_filtros_con_las_vistas_de_registro(pg, vistas_costos):
+    from endpoints.query.costos import costos
+
+    with pg.cursor() as cur:
+        cur.execute(f"UPDATE {SCHEMA}.v_sol_items_otm_otr SET equipo = 'CAM-01'")
+    assert costos._tipos("ANGLO") == ["CAMIONETA", "CAMIONETA 4X4"]
+    assert costos._equipos("ANGLO", "CAMIONETA 4X4") == ["CAM-01"]
+    assert costos._arbol() == costos.arbol(
+        [("ANGLO", "CAMIONETA", "CAM-01"), ("ANGLO", "CAMIONETA 4X4", "CAM-01")]
+    )
@@ -0,0 +1,272 @@
+# backend/tests/test_dashboard_paridad.py
+"""
+Paridad de services/dashboard/agregacion.agregar_dashboard() con el cálculo
+por filas que tenía el endpoint /dashboard antes de pasar a columnas
+(_payload_anterior, copiado tal cual salvo las tendencias y el SQL).
+
+Las filas de prueba cubren Decimal/None/str en los montos, date y datetime
+mezclados, duraciones negativas, filas sin máquina, empates de fecha en
+recientes, más de N_RECIENTES filas y fechas fuera del rango de
+datetime64[ns] (9999-12-31, "sin fecha" en el ERP).
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from services.dashboard.agregacion import N_RECIENTES, agregar_dashboard
+
+COLUMNAS = [
+    "id_programa_otm", "equipo", "codigo_tarea", "descripcion", "fecha_limite",
+    "fecha_ejecucion_otm", "fecha_hora_inicio", "fecha_hora_fin", "fecha_log",
+    "equipo_codigo", "tipo_equipo", "marca", "modelo",
+    "nombre_faena", "actividad", "tipo_actividad", "estado_actividad", "fecha_inicio", "numero_otm",
+    "tipo_solicitud", "valor_total", "monto_total_factura", "monto_neto", "fecha_solicitud",
+]
+
+
+# ---------- cálculo anterior (por filas) ----------
+def to_float(x):
+    if x is None:
+        return 0.0
+    if isinstance(x, Decimal):
+        return float(x)
+    try:
+        return float(x)
+    except Exception:
+        return 0.0
+
+def to_iso(dt):
+    if isinstance(dt, (datetime, date)):
+        return dt.isoformat()
+    return None
+
+def hours_between(a, b):
+    if not a or not b:
+        return 0.0
+    if isinstance(a, date) and not isinstance(a, datetime):
+        a = datetime.combine(a, datetime.min.time())
+    if isinstance(b, date) and not isinstance(b, datetime):
+        b = datetime.combine(b, datetime.min.time())
+    delta = b - a
+    return max(delta.total_seconds() / 3600.0, 0.0)
+
+def month_key(dt):
+    if not isinstance(dt, (datetime, date)):
+        return None
+    return f"{dt.year}-{dt.month:02d}"
+
+def to_datetime(v):
+    if isinstance(v, datetime):
+        return v
+    if isinstance(v, date):
+        return datetime.combine(v, datetime.min.time())
+    return None
+
+def best_date(r):
+    return r.get("fecha_solicitud") or r.get("fecha_inicio") or r.get("fecha_ejecucion_otm") or r.get("fecha_log")
+
+def best_date_dt(r):
+    return to_datetime(best_date(r)) or datetime.min
+
+
+def _payload_anterior(res, date_from, date_to):
+    def row_cost(r):
+        return to_float(r.get("monto_total_factura")) or to_float(r.get("valor_total")) or to_float(r.get("monto_neto"))
+
+    def row_downtime_hours(r):
+        return hours_between(r.get("fecha_hora_inicio"), r.get("fecha_hora_fin"))
+
+    def is_otr(r):
+        ts = (r.get("tipo_solicitud") or "").upper()
+        ta = (r.get("tipo_actividad") or "").upper()
+        return ("OTR" in ts) or ("REPAR" in ta)
+
+    cost_total = sum(row_cost(r) for r in res)
+    downtime_total = sum(row_downtime_hours(r) for r in res)
+    mttr_numer = 0.0
+    mttr_den = 0
+    for r in res:
+        if is_otr(r):
+            h = row_downtime_hours(r)
+            if h > 0:
+                mttr_numer += h
+                mttr_den += 1
+    mttr = (mttr_numer / mttr_den) if mttr_den else 0.0
+
+    period_hours = max((date_to - date_from).total_seconds() / 3600.0, 1.0)
+    otr_count_by_machine = defaultdict(int)
+    for r in res:
+        if is_otr(r):
+            m = r.get("equipo_codigo") or r.get("equipo")
+            if m:
+                otr_count_by_machine[m] += 1
+    mtbf_vals = [period_hours / c if c else period_hours for c in otr_count_by_machine.values()]
+    mtbf = (sum(mtbf_vals) / len(mtbf_vals)) if mtbf_vals else 0.0
+
+    cost_by_month = defaultdict(float)
+    for r in res:
+        base_date = r.get("fecha_solicitud") or r.get("fecha_inicio") or r.get("fecha_log") or r.get("fecha_ejecucion_otm")
+        key = month_key(base_date)
+        if key:
+            cost_by_month[key] += row_cost(r)
+    cost_monthly = [{"month": k, "cost": v} for k, v in sorted(cost_by_month.items())]
+
+    cost_by_cause = defaultdict(float)
+    for r in res:
+        cause = r.get("actividad") or "Sin causa"
+        cost_by_cause[cause] += row_cost(r)
+    pareto_items = sorted(cost_by_cause.items(), key=lambda kv: kv[1], reverse=True)
+    cum = 0.0
+    total = sum(v for _, v in pareto_items) or 1.0
+    cause_pareto = []
+    for cause, val in pareto_items:
+        cum += val
+        cause_pareto.append({"cause": cause, "cost": val, "cumPct": min(cum / total * 100.0, 100.0)})
+
+    dt_by_machine = defaultdict(float)
+    for r in res:
+        mach = r.get("equipo_codigo") or r.get("equipo") or "N/D"
+        dt_by_machine[mach] += row_downtime_hours(r)
+    downtime_by_machine = [{"machine": k, "hours": v} for k, v in sorted(dt_by_machine.items(), key=lambda kv: kv[1], reverse=True)]
+
+    mttr_by_machine_n = defaultdict(float)
+    mttr_by_machine_d = defaultdict(int)
+    for r in res:
+        if is_otr(r):
+            m = r.get("equipo_codigo") or r.get("equipo") or "N/D"
+            h = row_downtime_hours(r)
+            if h > 0:
+                mttr_by_machine_n[m] += h
+                mttr_by_machine_d[m] += 1
+    mttr_mtbf_by_machine = []
+    for m in set(list(dt_by_machine.keys()) + list(otr_count_by_machine.keys())):
+        m_mttr = (mttr_by_machine_n[m] / mttr_by_machine_d[m]) if mttr_by_machine_d[m] else 0.0
+        m_mtbf = (period_hours / otr_count_by_machine[m]) if otr_count_by_machine[m] else 0.0
+        mttr_mtbf_by_machine.append({"machine": m, "mttr": m_mttr, "mtbf": m_mtbf})
+
+    sorted_res = sorted(res, key=best_date_dt, reverse=True)
+    recent = []
+    for r in sorted_res[:50]:
+        recent.append({
+            "ot": r.get("numero_otm") or r.get("tipo_solicitud") or "N/D",
+            "fecha": to_iso(best_date(r)) or "",
+            "maquina": r.get("equipo_codigo") or r.get("equipo") or "N/D",
+            "causa": r.get("actividad") or (r.get("tipo_actividad") or "N/D"),
+            "costo": row_cost(r),
+            "estado": r.get("estado_actividad") or r.get("tipo_solicitud") or "N/D",
+        })
+
+    sites = sorted({r.get("nombre_faena") for r in res if r.get("nombre_faena")}) or []
+    machines = sorted({(r.get("equipo_codigo") or r.get("equipo")) for r in res if (r.get("equipo_codigo") or r.get("equipo"))}) or []
+
+    return {
+        "sites": sites,
+        "machines": machines,
+        "kpis": {
+            "cost_total": cost_total,
+            "downtime_total": downtime_total,
+            "mttr": mttr,
+            "mtbf": mtbf,
+            "wo_closed": len([r for r in res if (r.get("estado_actividad") or "").upper() in ("CERRADA", "CERRADO")]),
+        },
+        "charts": {
+            "cost_monthly": cost_monthly,
+            "cause_pareto": cause_pareto,
+            "downtime_by_machine": downtime_by_machine,
+            "mttr_mtbf_by_machine": mttr_mtbf_by_machine,
+        },
+        "recent": recent,
+    }
+
+
+# ---------- filas de prueba ----------
+def _fila(i, **valores):
+    base = dict.fromkeys(COLUMNAS)
+    base.update(id_programa_otm=i, numero_otm=f"M{i:05d}")
+    base.update(valores)
+    return tuple(base[c] for c in COLUMNAS)
+
+
+def _filas():
+    maquinas = ["CAM-01", "CAM-02", "GRU-01", "", None]
+    filas = []
+    inicio = datetime(2024, 1, 1, 8, 0)
+    for i in range(120):
+        m = maquinas[i % len(maquinas)]
+        ini = inicio + timedelta(hours=13 * i)
+        filas.append(_fila(
+            i,
+            equipo=f"EQ-{i % 7}" if i % 3 else None,
+            equipo_codigo=m,
+            nombre_faena=["ANGLO", "KDM", "", None][i % 4],
+            actividad=["Cambio aceite", "Reparación motor", None, ""][i % 4],
+            tipo_actividad=["REPARACION", "PREVENTIVA", None][i % 3],
+            estado_actividad=["CERRADA", "abierta", "Cerrado", None][i % 4],
+            tipo_solicitud=["OTM", "OTR", None][i % 3],
+            monto_total_factura=[Decimal("1500.50"), None, Decimal("0")][i % 3],
+            valor_total=[None, Decimal("320.25"), 77][i % 3],
+            monto_neto=[Decimal("10"), "no-numero", None][i % 3],
+            fecha_hora_inicio=ini if i % 5 else None,
+            # duraciones positivas, negativas (se recortan a 0) y con date sin hora
+            fecha_hora_fin=(ini + timedelta(hours=(i % 9) - 2)) if i % 4 else (ini.date() + timedelta(days=1)),
+            fecha_solicitud=[ini.date(), None, ini][i % 3],
+            fecha_inicio=ini if i % 2 else None,
+            fecha_log=ini - timedelta(days=3),
+            # empates de fecha para el top-N de recientes
+            fecha_ejecucion_otm=date(2024, 3, 1),
+        ))
+    return filas
+
+
+def _filas_fuera_de_rango():
+    # El ERP usa 9999-12-31 como "sin fecha de término"; datetime64[ns] llega solo a 2262
+    return [
+        _fila(900, equipo_codigo="CAM-01", tipo_solicitud="OTR", monto_total_factura=Decimal("99.99"),
+              fecha_solicitud=date(9999, 12, 31), fecha_hora_inicio=datetime(2024, 2, 1, 8),
+              fecha_hora_fin=datetime(9999, 12, 31, 23, 59), actividad="Sin término"),
+        _fila(901, equipo_codigo="CAM-02", valor_total=Decimal("5"),
+              fecha_inicio=datetime(9999, 12, 31), fecha_hora_inicio=date(1, 1, 1),
+              fecha_hora_fin=datetime(2024, 2, 1)),
+        _fila(902, equipo_codigo="GRU-01", monto_neto=Decimal("1"),
+              fecha_log=datetime(1, 1, 1), estado_actividad="CERRADA"),
+    ]
+
+
+DESDE = datetime(2024, 1, 1)
+HASTA = datetime(2024, 3, 31)
+
+
+def _comparar(filas):
+    nuevo = agregar_dashboard(COLUMNAS, filas, DESDE, HASTA)
+    viejo = _payload_anterior([dict(zip(COLUMNAS, f)) for f in filas], DESDE, HASTA)
+
+    assert nuevo["sites"] == viejo["sites"]
+    assert nuevo["machines"] == viejo["machines"]
+    assert nuevo["kpis"] == pytest.approx(viejo["kpis"])
+    for grafico in ("cost_monthly", "cause_pareto", "downtime_by_machine"):
+        assert nuevo["charts"][grafico] == pytest.approx(viejo["charts"][grafico]), grafico
+    # antes salía en orden de un set; ahora en el orden de downtime_by_machine
+    por_maquina = lambda xs: sorted(xs, key=lambda x: x["machine"])  # noqa: E731
+    assert por_maquina(nuevo["charts"]["mttr_mtbf_by_machine"]) == pytest.approx(
+        por_maquina(viejo["charts"]["mttr_mtbf_by_machine"])
+    )
+    assert nuevo["recent"] == viejo["recent"]
+    return nuevo
+
+
+def test_paridad_con_calculo_por_filas():
+    nuevo = _comparar(_filas())
+    assert len(nuevo["recent"]) == N_RECIENTES
+
+
+def test_paridad_con_fechas_fuera_de_rango():
+    nuevo = _comparar(_filas() + _filas_fuera_de_rango())
+    # las filas de 9999 siguen contando: mes propio y primeras en recientes
+    assert {"month": "9999-12", "cost": pytest.approx(99.99 + 5)} in nuevo["charts"]["cost_monthly"]
+    assert nuevo["recent"][0]["fecha"] == "9999-12-31"
+
+
+def test_sin_filas():
+    _comparar([])
@@ -0,0 +1,196 @@
+# backend/tests/test_dashboard_rollup.py
+"""
+Sync del rollup del dashboard (ejecutar_proceso_dashboard) contra un Postgres
+de prueba: tablas creadas desde models.models, eventos leídos por lotes con
+cursor del lado del servidor y rollup diario consistente con los eventos. Un
+error en el rollup no corta el sync ni se salta el post-sync. Un ?modo=
+desconocido en /dashboard cae al modo por defecto.
+"""
+from datetime import datetime
+
+import pytest
+
+N_EVENTOS = 1000
+
+# Eventos sintéticos con las columnas de SQL_EVENTOS que usa el sync
+SQL_EVENTOS_PRUEBA = f"""
+SELECT (date '2024-01-01' + g % 90)                       AS fecha_evento,
+       timestamp '2024-01-01' + g * interval '1 hour'      AS fecha_orden,
+       'F' || g % 3                                       AS faena,
+       CASE WHEN g % 11 = 0 THEN NULL ELSE 'EQ-' || g % 5 END AS maquina,
+       g % 11 <> 0                                        AS con_equipo,
+       'C' || g % 4                                       AS causa,
+       to_char(date '2024-01-01' + g % 90, 'YYYY-MM')     AS mes,
+       (g % 10)::float8                                   AS costo,
+       (g % 7)::float8                                    AS horas,
+       g % 2 = 0                                          AS es_otr,
+       g % 3 = 0                                          AS cerrada,
+       'M' || g                                            AS numero_otm,
+       'OTM'                                               AS tipo_solicitud,
+       timestamp '2024-01-01' + g * interval '1 hour'      AS fecha_solicitud,
+       NULL::timestamp AS fecha_inicio, NULL::date AS fecha_ejecucion_otm, NULL::timestamp AS fecha_log,
+       CASE WHEN g % 11 = 0 THEN NULL ELSE 'EQ-' || g % 5 END AS equipo_codigo,
+       NULL::text AS equipo,
+       'C' || g % 4                                       AS actividad,
+       NULL::text AS tipo_actividad,
+       'CERRADA'                                           AS estado_actividad
+FROM generate_series(1, {N_EVENTOS}) g
+"""
+
+
+@pytest.fixture
+def destino(pg_dsn, pg):
+    from sqlalchemy import create_engine
+
+    from extensions import db
+    from models.models import DashboardDiario, DashboardEvento
+
+    tablas = [DashboardEvento.__table__, DashboardDiario.__table__]
+    engine = create_engine(pg_dsn.replace("postgresql://", "postgresql+psycopg2://", 1))
+    db.metadata.drop_all(engine, tables=tablas)
+    db.metadata.create_all(engine, tables=tablas)
+    yield engine
+    engine.dispose()
+
+
+def test_sync_por_lotes_y_rollup(destino, pg_dsn, pg, monkeypatch):
+    import psycopg2
+    from sqlalchemy import text
+
+    from services.actualizar import actualizar
+    from services.dashboard.consultas import (
+        SQL_ROLLUP_AGREGADOS, SQL_ROLLUP_RECIENTES, filtros_rollup,
+    )
+
+    monkeypatch.setattr(actualizar, "SQL_EVENTOS", SQL_EVENTOS_PRUEBA)
+    monkeypatch.setattr(actualizar, "LOTE_EVENTOS", 64)
+
+    conn_src = psycopg2.connect(pg_dsn)
+    conn_dst = psycopg2.connect(pg_dsn)
+    try:
+        res = actualizar.ejecutar_proceso_dashboard(conn_src, conn_dst)
+    finally:
+        conn_src.close()
+        conn_dst.close()
+
+    assert res["eventos_insertados"] == N_EVENTOS
+    with pg.cursor() as cur:
+        cur.execute("SELECT count(*), sum(costo), sum(horas) FROM public.dashboard_evento")
+        n, costo, horas = cur.fetchone()
+        cur.execute("SELECT count(*), sum(filas), sum(costo), sum(horas) FROM public.dashboard_diario")
+        dias, filas, costo_d, horas_d = cur.fetchone()
+        cur.execute("SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_dashboard_evento_orden'")
+        (indice,) = cur.fetchone()
+    assert (n, filas) == (N_EVENTOS, N_EVENTOS)
+    assert res["filas_rollup"] == dias < N_EVENTOS
+    assert (costo_d, horas_d) == pytest.approx((costo, horas))
+    assert "DESC NULLS LAST" in indice
+
+    # Las consultas del modo rollup sobre las tablas recién cargadas
+    desde, hasta = datetime(2024, 1, 1), datetime(2024, 3, 31)
+    where, params = filtros_rollup(desde, hasta, None, None, "dia")
+    with destino.connect() as c:
+        agregados = c.execute(text(SQL_ROLLUP_AGREGADOS.format(where_clause=where)), params).mappings().all()
+        where, params = filtros_rollup(desde, hasta, "F1", "EQ-2", "fecha_evento")
+        recientes = c.execute(
+            text(SQL_ROLLUP_RECIENTES.format(where_clause=where, limite=5)), params
+        ).mappings().all()
+    (total,) = [r for r in agregados if r["g_mes"] and r["g_causa"] and r["g_maquina"] and r["g_faena"]]
+    assert total["filas"] == N_EVENTOS
+    assert len(recientes) == 5
+    assert all(r["maquina"] == "EQ-2" for r in recientes)
+    assert [r["fecha"] for r in recientes] == sorted((r["fecha"] for r in recientes), reverse=True)
+
+
+def test_sync_crea_las_tablas_si_faltan(pg_dsn, pg, monkeypatch):
+    import psycopg2
+
+    from services.actualizar import actualizar
+
+    with pg.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS public.dashboard_evento, public.dashboard_diario")
+    monkeypatch.setattr(actualizar, "SQL_EVENTOS", SQL_EVENTOS_PRUEBA)
+
+    conn_src = psycopg2.connect(pg_dsn)
+    conn_dst = psycopg2.connect(pg_dsn)
+    try:
+        res = actualizar.ejecutar_proceso_dashboard(conn_src, conn_dst)
+    finally:
+        conn_src.close()
+        conn_dst.close()
+
+    assert res["eventos_insertados"] == N_EVENTOS
+    with pg.cursor() as cur:
+        cur.execute("SELECT indexname FROM pg_indexes WHERE tablename LIKE 'dashboard_%' ORDER BY 1")
+        indices = [r[0] for r in cur.fetchall()]
+    assert {"ix_dashboard_evento_orden", "ix_dashboard_evento_maquina", "ix_dashboard_diario_dia"} <= set(indices)
+
+
+PROCEDIMIENTOS = (
+    "insertar_modelos_desde_remoto", "insertar_marcas_desde_remoto", "insertar_tipos_equipo_desde_remoto",
+    "insertar_equipos_desde_remoto", "insertar_proximo_mantenimiento_desde_remoto",
+    "insertar_programas_desde_remoto", "insertar_orden_man_desde_remoto",
+)
+
+
+@pytest.fixture
+def sync_local(pg_dsn, pg, erp_pg, monkeypatch):
+    """ejecutar_proceso() contra la base de prueba: procedimientos de carga vacíos y post-sync espiado."""
+    from services.actualizar import actualizar
+
+    with pg.cursor() as cur:
+        for nombre in PROCEDIMIENTOS:
+            cur.execute(f"CREATE OR REPLACE PROCEDURE public.{nombre}() LANGUAGE sql AS $$ SELECT 1 $$")
+    llamadas = []
+    monkeypatch.setattr(actualizar, "DB_DESTINO", pg_dsn)
+    monkeypatch.setattr(actualizar, "_post_sync", [lambda: llamadas.append("post_sync")])
+    monkeypatch.setattr(actualizar, "ejecutar_proceso_reprogramacion", lambda *a: {"ok": 1})
+    monkeypatch.setattr(actualizar, "ejecutar_proceso_compras", lambda *a: {"ok": 1})
+    yield actualizar, llamadas
+    with pg.cursor() as cur:
+        for nombre in PROCEDIMIENTOS:
+            cur.execute(f"DROP PROCEDURE IF EXISTS public.{nombre}()")
+
+
+def test_error_en_rollup_no_corta_el_sync(sync_local, monkeypatch):
+    actualizar, llamadas = sync_local
+    monkeypatch.setattr(actualizar, "SQL_EVENTOS", "SELECT 1 / 0 AS fecha_evento")
+
+    res = actualizar.ejecutar_proceso()
+
+    assert res["status"] == "parcial"
+    assert "division by zero" in res["dashboard"]["error"]
+    assert llamadas == ["post_sync"]
+
+
+def test_error_tras_confirmar_corre_post_sync(sync_local, monkeypatch):
+    actualizar, llamadas = sync_local
+
+    def falla(*_):
+        raise RuntimeError("compras")
+
+    monkeypatch.setattr(actualizar, "ejecutar_proceso_compras", falla)
+    with pytest.raises(RuntimeError, match="compras"):
+        actualizar.ejecutar_proceso()
+    assert llamadas == ["post_sync"]
+
+
+@pytest.mark.parametrize("pedido,usado", [
+    ("rollup", "rollup"), (" SQL ", "sql"), ("", "python"), ("xyz", "python"), ("rollup2", "python"),
+])
+def test_modo_desconocido_usa_el_por_defecto(monkeypatch, pedido, usado):
+    from flask import Flask
+    from routes.home import home
+
+    calculados = []
+    monkeypatch.setattr(home, "calcular_dashboard", lambda *a: calculados.append(a[-1]) or {"modo": a[-1]})
+    home._cache_dashboard.invalidar()
+    app = Flask(__name__)
+    app.config["DASHBOARD_MODO"] = "python"
+    app.register_blueprint(home.home_bp)
+
+    resp = app.test_client().get("/dashboard", query_string={"modo": pedido})
+    assert resp.get_json() == {"modo": usado}
+    assert calculados == [usado]
+    assert [clave[-1] for clave in home._cache_dashboard.claves()] == [usado]
+    home._cache_dashboard.invalidar()
@@ -0,0 +1,51 @@
+# backend/tests/test_diagnostics_benchmarks.py
+"""
+Benchmarks de /endpoints/home (json, compresion, sesiones y
+preparadas/planificacion): sin autenticación, así que van detrás de
+DIAGNOSTICO_BENCHMARKS y con topes bajos.
+"""
+import pytest
+from flask import Flask
+
+
+def _cliente(habilitados):
+    from routes.home.diagnostics import home_diag_bp
+
+    app = Flask(__name__)
+    app.config["DIAGNOSTICO_BENCHMARKS"] = habilitados
+    app.register_blueprint(home_diag_bp, url_prefix="/endpoints/home")
+    return app.test_client()
+
+
+@pytest.mark.parametrize("ruta", ["/json", "/compresion", "/sesiones", "/preparadas/planificacion"])
+def test_apagados_por_defecto(ruta):
+    resp = _cliente(False).get(f"/endpoints/home{ruta}")
+    assert resp.status_code == 404
+
+
+def test_json_con_tope():
+    resp = _cliente(True).get("/endpoints/home/json?filas=10000000&n=1000")
+    assert resp.status_code == 200
+    datos = resp.get_json()
+    assert (datos["filas"], datos["repeticiones"]) == (50000, 5)
+
+
+def test_compresion_solo_rutas_permitidas():
+    cliente = _cliente(True)
+    assert cliente.get("/endpoints/home/compresion?ruta=/query/actualizar/sync").status_code == 400
+    assert cliente.get("/endpoints/home/compresion?ruta=/endpoints/home/dashboard%3Ffrom%3D1900-01-01").status_code == 400
+
+
+def test_sesiones_engancha_listeners_solo_al_medir():
+    from sqlalchemy import event
+    from routes.home import diagnostics
+
+    def enganchados():
+        return [event.contains(o, ev, fn) for o, ev, fn in diagnostics._escuchas()]
+
+    assert not any(enganchados())
+    with diagnostics._contando_idas():
+        with diagnostics._contando_idas():
+            assert all(enganchados())
+        assert all(enganchados())
+    assert not any(enganchados())
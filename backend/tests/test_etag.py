@@ -0,0 +1,199 @@
+# backend/tests/test_etag.py
+"""
+GET condicional (services/cache/etag.py): 304 solo en rutas cuyos datos
+sigue la versión del sync; las que leen el ERP en vivo nunca responden 304.
+La versión es compartida entre procesos y el sync la mueve también después
+del calentamiento, así las listas del catálogo no quedan con un ETag nuevo y
+datos viejos.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+from flask import Blueprint, Flask, jsonify, request
+
+
+@pytest.fixture(autouse=True)
+def marca(tmp_path, monkeypatch):
+    from services.cache import etag
+
+    ruta = tmp_path / "etag_version"
+    monkeypatch.setattr(etag, "ETAG_MARCA", str(ruta))
+    monkeypatch.setattr(etag, "_en_memoria", None)
+    return ruta
+
+
+@pytest.fixture
+def cliente():
+    from services.cache import etag
+
+    app = Flask(__name__)
+    local = Blueprint("proxmtto_api", __name__)
+    erp = Blueprint("costos_api", __name__)
+    home = Blueprint("home_bp", __name__)
+
+    local.get("/local")(lambda: jsonify({"ok": True}))
+    erp.get("/erp")(lambda: jsonify({"ok": True}))
+
+    @home.get("/dashboard")
+    def dashboard():
+        return jsonify({"modo": request.args.get("modo")})
+
+    for bp in (local, erp, home):
+        app.register_blueprint(bp)
+    etag.iniciar(app)
+    etag.solo_si("home_bp.dashboard", lambda: request.args.get("modo") == "rollup")
+    yield app.test_client()
+    etag._condiciones.pop("home_bp.dashboard", None)
+
+
+def _revalidar(cliente, ruta):
+    primera = cliente.get(ruta)
+    valor = primera.headers.get("ETag")
+    if valor is None:
+        return primera, None
+    return primera, cliente.get(ruta, headers={"If-None-Match": valor})
+
+
+def test_datos_locales_responden_304(cliente):
+    primera, segunda = _revalidar(cliente, "/local")
+    assert primera.status_code == 200
+    assert segunda.status_code == 304
+
+
+def test_sync_invalida_el_etag(cliente):
+    from services.cache import etag
+
+    valor = cliente.get("/local").headers["ETag"]
+    etag.nueva_version()
+    assert cliente.get("/local", headers={"If-None-Match": valor}).status_code == 200
+
+
+def test_erp_en_vivo_sin_etag(cliente):
+    primera, segunda = _revalidar(cliente, "/erp")
+    assert primera.status_code == 200
+    assert segunda is None
+    assert cliente.get("/erp", headers={"If-None-Match": "*"}).status_code == 200
+
+
+@pytest.mark.parametrize("modo,con_etag", [("rollup", True), ("sql", False), ("python", False)])
+def test_dashboard_solo_en_rollup(cliente, modo, con_etag):
+    primera, segunda = _revalidar(cliente, f"/dashboard?modo={modo}")
+    assert ("ETag" in primera.headers) is con_etag
+    if con_etag:
+        assert segunda.status_code == 304
+
+
+def test_version_compartida_entre_procesos(cliente, marca):
+    from services.cache import etag
+
+    valor = cliente.get("/local").headers["ETag"]
+    # otro worker termina un sync: este proceso deja de reconocer el ETag anterior
+    codigo = (
+        "from services.cache import etag; "
+        f"etag.ETAG_MARCA = {str(marca)!r}; etag.nueva_version()"
+    )
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", codigo], check=True, cwd=raiz)
+    assert etag.version() == str(marca.stat().st_mtime_ns)
+    assert cliente.get("/local", headers={"If-None-Match": valor}).status_code == 200
+
+
+# ---------- sync -> calentamiento -> If-None-Match ----------
+@pytest.fixture
+def catalogo_local(monkeypatch):
+    """App con una lista del catálogo leída de la "base local" (una lista en memoria)."""
+    from services.actualizar import actualizar
+    from services.cache import etag
+    from services.cache.cache import con_encabezados, invalidar_todas
+    from services.calentamiento import calentamiento
+    from services.catalogo import catalogo
+
+    base = {"faenas": ["ANGLO"], "falla": False}
+
+    def cargar():
+        if base["falla"]:
+            raise RuntimeError("base local no responde")
+        return list(base["faenas"])
+
+    monkeypatch.setattr(catalogo, "_cargadores", {})
+    monkeypatch.setattr(catalogo, "_por_defecto", {})
+    monkeypatch.setattr(catalogo, "_locales", set())
+    catalogo._cache.invalidar()
+    catalogo.registrar("prueba", "faenas", cargar, calentar=lambda: [()], base_local=True)
+    monkeypatch.setattr(calentamiento, "_generadores", {"catalogo": catalogo.tareas_calentamiento})
+    monkeypatch.setattr(actualizar, "_post_sync", [invalidar_todas, etag.nueva_version])
+    monkeypatch.setattr(actualizar, "_fin_sync", [etag.nueva_version])
+
+    app = Flask(__name__)
+    bp = Blueprint("proxmtto_api", __name__)
+
+    @bp.get("/filters/faenas")
+    def faenas():
+        data, edad, estado = catalogo.obtener("prueba", "faenas")
+        return con_encabezados(jsonify(data), edad, estado)
+
+    app.register_blueprint(bp)
+    etag.iniciar(app)
+    yield app, base
+    catalogo._cache.invalidar()
+
+
+def _sync(app, base, **cambios):
+    from services.actualizar import actualizar
+
+    base.update(cambios)
+    with app.app_context():
+        return actualizar.refrescar_tras_sync()
+
+
+def test_sync_calentamiento_y_revalidacion(catalogo_local):
+    app, base = catalogo_local
+    cliente = app.test_client()
+
+    antes = cliente.get("/filters/faenas")
+    assert antes.get_json() == ["ANGLO"]
+
+    res = _sync(app, base, faenas=["ANGLO", "KDM"])
+    assert res["calentamiento"]["ok"] == 1
+    nueva = cliente.get("/filters/faenas", headers={"If-None-Match": antes.headers["ETag"]})
+    assert nueva.status_code == 200
+    assert nueva.get_json() == ["ANGLO", "KDM"]
+    assert cliente.get("/filters/faenas", headers={"If-None-Match": nueva.headers["ETag"]}).status_code == 304
+
+
+def test_respuesta_entre_post_sync_y_calentamiento_no_sobrevive(catalogo_local):
+    from services.actualizar import actualizar
+    from services.calentamiento import calentamiento
+
+    app, base = catalogo_local
+    cliente = app.test_client()
+    cliente.get("/filters/faenas")
+
+    # datos nuevos confirmados y post-sync corrido, el catálogo todavía con la lista anterior
+    base["faenas"] = ["KDM"]
+    actualizar.ejecutar_post_sync()
+    entre_medio = cliente.get("/filters/faenas")
+    assert entre_medio.get_json() == ["ANGLO"]
+
+    with app.app_context():
+        calentamiento.ejecutar()
+    actualizar.ejecutar_fin_sync()
+    despues = cliente.get("/filters/faenas", headers={"If-None-Match": entre_medio.headers["ETag"]})
+    assert despues.status_code == 200
+    assert despues.get_json() == ["KDM"]
+
+
+def test_recalculo_fallido_no_deja_lista_vieja_con_etag_nuevo(catalogo_local):
+    app, base = catalogo_local
+    cliente = app.test_client()
+    vieja = cliente.get("/filters/faenas")
+
+    res = _sync(app, base, faenas=["KDM"], falla=True)
+    assert res["calentamiento"]["errores"]
+
+    base["falla"] = False
+    resp = cliente.get("/filters/faenas", headers={"If-None-Match": vieja.headers["ETag"]})
+    assert resp.status_code == 200
+    assert resp.get_json() == ["KDM"]
@@ -0,0 +1,71 @@
+# backend/tests/test_json_rapido.py
+"""
+Formato de services/serializacion/json_rapido.JSONRapido, con y sin orjson:
+los blueprints de JSON_COMPAT responden igual que el proveedor por defecto de
+Flask (Decimal exacto, fechas RFC 822); el resto, Decimal como número e ISO.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from flask import Blueprint, Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+FILA = {
+    "monto": Decimal("1234567890.10"),
+    "cantidad": Decimal("2.50"),
+    "fecha": date(2024, 3, 1),
+    "fecha_hora": datetime(2024, 3, 1, 8, 30, 15),
+    "equipo": "CAM-01",
+    "nulo": None,
+}
+
+
+def _app(provider):
+    app = Flask(__name__)
+    if provider is not None:
+        app.json = provider(app)
+    for nombre in ("costos_api", "tfuera_api", "home_bp"):
+        bp = Blueprint(nombre, __name__, url_prefix=f"/{nombre}")
+        bp.get("/filas")(lambda: jsonify({"ok": True, "data": [FILA], "columns": ["a"], "rows": [[FILA["monto"]]]}))
+        app.register_blueprint(bp)
+    return app.test_client()
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def rapido(request, monkeypatch):
+    from services.serializacion import json_rapido
+
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(json_rapido, "orjson", None)
+        monkeypatch.setattr(json_rapido, "_OPCIONES", 0)
+        monkeypatch.setattr(json_rapido, "_OPCIONES_COMPAT", 0)
+    return _app(json_rapido.JSONRapido)
+
+
+@pytest.mark.parametrize("ruta", ["/costos_api/filas", "/tfuera_api/filas"])
+def test_compat_igual_al_proveedor_de_flask(rapido, ruta):
+    antes = _app(DefaultJSONProvider).get(ruta).get_json()
+    ahora = rapido.get(ruta).get_json()
+
+    assert ahora == antes
+    assert ahora["data"][0]["cantidad"] == "2.50"
+    assert ahora["data"][0]["monto"] == "1234567890.10"
+    assert ahora["data"][0]["fecha_hora"] == "Fri, 01 Mar 2024 08:30:15 GMT"
+
+
+def test_resto_numeros_e_iso(rapido):
+    fila = rapido.get("/home_bp/filas").get_json()["data"][0]
+
+    assert fila["cantidad"] == 2.5
+    assert fila["fecha"] == "2024-03-01"
+    assert fila["fecha_hora"] == "2024-03-01T08:30:15"
+
+
+def test_fuera_de_request_sin_compat():
+    from services.serializacion import json_rapido
+
+    assert json.loads(json_rapido.dumps_bytes(FILA))["fecha"] == "2024-03-01"
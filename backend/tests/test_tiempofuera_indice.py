@@ -0,0 +1,50 @@
+# backend/tests/test_tiempofuera_indice.py
+"""Índice faena -> equipos: carga fuera del lock, compartida y descartada si hubo sync."""
+import threading
+import time
+
+from services.tiempofuera import indice
+
+
+def _indice_falso(schema, faenas):
+    return {"schema": schema, "cargado": time.time(), "faenas": faenas}
+
+
+def test_carga_concurrente_se_comparte_y_no_toma_el_lock(monkeypatch):
+    cargas = []
+    liberar = threading.Event()
+
+    def cargar(schema):
+        cargas.append(schema)
+        # mientras se carga, el lock del índice está libre
+        assert indice._lock.acquire(blocking=False)
+        indice._lock.release()
+        liberar.wait(2)
+        return _indice_falso(schema, {"ANGLO": ["CAM-01"]})
+
+    monkeypatch.setattr(indice, "_cargar", cargar)
+    monkeypatch.setattr(indice, "_indice", None)
+
+    res = []
+    hilos = [threading.Thread(target=lambda: res.append(indice.equipos_de_faena("s", "ANGLO"))) for _ in range(5)]
+    for h in hilos:
+        h.start()
+    time.sleep(0.1)
+    liberar.set()
+    for h in hilos:
+        h.join()
+
+    assert cargas == ["s"]
+    assert res == [["CAM-01"]] * 5
+
+
+def test_sync_durante_la_carga_no_instala_indice_viejo(monkeypatch):
+    def cargar(schema):
+        indice.invalidar()  # llega un sync mientras se lee el ERP
+        return _indice_falso(schema, {"ANGLO": ["VIEJO"]})
+
+    monkeypatch.setattr(indice, "_cargar", cargar)
+    monkeypatch.setattr(indice, "_indice", None)
+
+    assert indice.equipos_de_faena("s", "ANGLO") == ["VIEJO"]
+    assert indice._indice is None
@@ -0,0 +1,143 @@
+# backend/tests/test_tiempofuera_paridad.py
+"""
+Paridad del motor en memoria (services/tiempofuera/motor.py) con la consulta
+SQL de get_tiempo_fuera(), sobre un esquema de prueba con las mismas vistas.
+
+Los datos cubren códigos y distritos con espacios al final (el SQL los
+compara sin TRIM), equipos con más de un tipo, fallas sin turno posterior,
+promedios justo en el medio de dos centésimas y motivos que no son falla.
+"""
+import itertools
+
+import pytest
+
+SCHEMA = "tf_paridad"
+
+# (vista, equipo_codigo, equipo, distrito, fecha_inicio)
+TURNOS = [
+    ("anglo",  "CAM-01",  "CAM-01 CAMIONETA - Toyota Hilux", "ANGLO",  "2024-01-02 08:00"),
+    ("anglo",  "CAM-01",  "CAM-01 CAMIONETA - Toyota Hilux", "ANGLO",  "2024-01-05 08:00"),
+    ("catodo", "CAM-01",  "CAM-01 CAMIONETA - Toyota Hilux", "CATODO", "2024-01-09 08:00"),
+    ("kdm",    "CAM-02 ", "CAM-02 CAMIONETA - Nissan",       "ANGLO ", "2024-01-03 10:00"),
+    ("kdm",    "CAM-02 ", "CAM-02 CAMIONETA - Nissan",       "ANGLO ", "2024-01-06 10:00"),
+    ("spot",   "CAM-02",  "CAM-02 CAMIONETA - Nissan",       "ANGLO",  "2024-01-04 09:00"),
+    ("eteo",   "GRU-01",  "GRU-01 GRUA HORQUILLA - Linde",   "ANGLO",  "2024-02-02 00:00"),
+    ("eteo",   "GRU-01",  "GRU-01 GRUA - Linde",             "ANGLO",  "2024-02-03 00:14:25"),
+    ("cucons", "BUS-01",  "BUS-01 BUS - Mercedes",           "KDM",    "2024-03-01 12:00"),
+    ("cucons", "BUS-01",  "BUS-01 BUS - Mercedes",           "KDM",    "2024-03-04 00:00"),
+    ("cucons", "BUS-01",  None,                              "KDM",    "2024-03-10 00:00"),
+]
+
+# (codigo_interno, fecha, motivo)
+NOTIFICACIONES = [
+    ("CAM-01",  "2024-01-01 08:00", "FALLA - DAÑO"),
+    ("CAM-01",  "2024-01-04 20:00", "FALLA - DAÑO"),
+    ("CAM-01",  "2024-01-06 08:00", "FALLA - DAÑO"),
+    ("CAM-01",  "2024-01-20 08:00", "FALLA - DAÑO"),   # sin turno posterior
+    ("CAM-01",  "2024-01-03 08:00", "PREVENTIVO"),
+    ("CAM-02 ", "2024-01-02 10:00", "FALLA - DAÑO"),
+    ("CAM-02",  "2024-01-01 09:00", "FALLA - DAÑO"),
+    ("GRU-01",  "2024-02-01 00:00", "FALLA - DAÑO"),   # 1 día
+    ("GRU-01",  "2024-02-02 00:00:01", "FALLA - DAÑO"),  # 1.01 días → promedio 1.005
+    ("BUS-01",  "2024-02-28 12:00", "FALLA - DAÑO"),
+    ("BUS-01",  "2024-03-05 06:00", "FALLA - DAÑO"),
+    ("SIN-TURNOS", "2024-01-01 00:00", "FALLA - DAÑO"),
+    (None,      "2024-01-01 00:00", "FALLA - DAÑO"),
+]
+
+VISTAS = {
+    "anglo": "v_registro_diario_anglo_export",
+    "catodo": "v_registro_diario_catodo_export",
+    "andina": "v_registro_diario_cgo_andina_export",
+    "ventanas": "v_registro_diario_cgo_cumet_ventanas_export",
+    "cucons": "v_registro_diario_cucons_export",
+    "eteo": "v_registro_diario_eteo_export",
+    "kdm": "v_registro_diario_kdm_export",
+    "spot": "v_registro_diario_spot_export",
+}
+
+
+@pytest.fixture
+def esquema(pg, erp_pg):
+    from services.tiempofuera import indice, motor
+
+    with pg.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+        for v in VISTAS.values():
+            cur.execute(
+                f"CREATE TABLE {SCHEMA}.{v} (equipo_codigo varchar(20), equipo varchar(80), "
+                f"distrito varchar(40), fecha_inicio timestamp)"
+            )
+        for vista, codigo, equipo, distrito, fecha in TURNOS:
+            cur.execute(
+                f"INSERT INTO {SCHEMA}.{VISTAS[vista]} VALUES (%s, %s, %s, %s)",
+                (codigo, equipo, distrito, fecha),
+            )
+        cur.execute(
+            f"CREATE TABLE {SCHEMA}.v_notificacion_reporte "
+            f"(codigo_interno varchar(20), fecha timestamp, motivo varchar(40))"
+        )
+        cur.executemany(f"INSERT INTO {SCHEMA}.v_notificacion_reporte VALUES (%s, %s, %s)", NOTIFICACIONES)
+
+    motor._datos = None
+    indice._indice = None
+    yield SCHEMA
+    motor._datos = None
+    indice._indice = None
+
+
+def _sql(schema, faena, tipo, equipo):
+    import psycopg2.extensions
+    from database import erp
+    from endpoints.query.tiempofuera.tiempofuera import _sql_tiempo_fuera
+    from services.tiempofuera import indice
+
+    params = {
+        "faena": faena, "tipo": tipo, "equipo": equipo,
+        "equipos_faena": indice.equipos_de_faena(schema, faena) if faena else [],
+    }
+    with erp.conexion("reportes") as conn:
+        with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+            cur.execute(_sql_tiempo_fuera(schema), params)
+            return cur.fetchall()
+
+
+def _motor(schema, faena, tipo, equipo):
+    from services.tiempofuera import motor
+
+    return [
+        (r["equipo_codigo"], r["total_periodos_fuera_servicio"], r["promedio_dias_fuera_servicio"])
+        for r in motor.calcular_tiempo_fuera(schema, faena=faena, tipo=tipo, equipo=equipo)
+    ]
+
+
+FILTROS = list(itertools.product(
+    ["", "ANGLO", "ANGLO ", "KDM", "CATODO", "NO-EXISTE"],
+    ["", "CAMIONETA", "GRUA", "GRUA HORQUILLA", "BUS"],
+    ["", "CAM-01", "CAM-02", "CAM-02 ", "GRU-01"],
+))
+
+
+@pytest.mark.parametrize("faena,tipo,equipo", FILTROS)
+def test_motor_igual_a_sql(esquema, faena, tipo, equipo):
+    sql = _sql(esquema, faena, tipo, equipo)
+    mem = _motor(esquema, faena, tipo, equipo)
+
+    # sin faena el SQL agrupa también las fallas con código NULL (sin turnos: no suman)
+    assert all(r[0] is not None for r in sql)
+    assert sorted(mem) == sorted(sql)
+    # mismo orden por promedio (el desempate por código depende de la collation)
+    assert [r[2] for r in mem] == [r[2] for r in sql]
+
+
+def test_codigos_con_espacios_no_se_mezclan(esquema):
+    filas = {r[0]: r for r in _motor(esquema, "", "", "")}
+    assert "CAM-02" in filas and "CAM-02 " in filas
+    # el mapa de tipos usa TRIM(equipo_codigo): "CAM-02 " no tiene tipo y no se multiplica
+    assert filas["CAM-02 "][1] == 1
+    assert _motor(esquema, "ANGLO", "", "") != _motor(esquema, "ANGLO ", "", "")
+
+
+def test_promedio_redondea_mitad_hacia_arriba(esquema):
+    (fila,) = [r for r in _motor(esquema, "", "GRUA", "GRU-01")]
+    assert str(fila[2]) == "1.01"